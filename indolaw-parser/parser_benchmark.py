@@ -0,0 +1,635 @@
+import argparse
+import io
+import json
+import os
+import platform
+import re
+import sys
+import resource
+import subprocess
+import time
+import timeit
+import tracemalloc
+from contextlib import redirect_stdout
+from multiprocessing import Pool
+from os import path
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+from parser_corpus import BUILD_DIRECTORY, get_law_filename
+from parser_decisions import (
+    DecisionJournal,
+    get_decision_journal_filename,
+    set_decision_journal,
+)
+from parser_is_start_of_x import (
+    HEADING_PATTERNS,
+    HEADING_REGEXES,
+    STRUCTURE_DETECTORS,
+    is_heading,
+    is_start_of_structure,
+)
+from parser_main import PARSER_ENGINES, STRUCTURE_PARSERS, parse_law_tree, parse_structure
+from parser_types import ComplexNode, Structure
+from parser_utils import (
+    LAWS_DIRECTORY,
+    convert_tree_to_json,
+    extract_metadata_from_tree,
+    get_clean_law_filenames,
+    get_ketentuan_umum_list,
+    read_clean_law,
+)
+
+
+def get_largest_laws(n: int, directory: str = LAWS_DIRECTORY) -> List[Tuple[str, List[str]]]:
+    """Returns the n cleaned laws in directory with the most lines, largest first
+    """
+    laws = [(filename, read_clean_law(filename))
+            for filename in get_clean_law_filenames(directory)]
+    laws.sort(key=lambda l: len(l[1]), reverse=True)
+    return laws[:n]
+
+
+def time_per_line(fn: Callable[[str], None], law: List[str], repeat: int) -> float:
+    """Returns the best-of-repeat cost of calling fn on every line of law,
+    in microseconds per line
+    """
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for line in law:
+            fn(line)
+        best = min(best, time.perf_counter() - start)
+
+    return best / max(len(law), 1) * 1e6
+
+
+def benchmark_heading(num_laws: int, repeat: int):
+    """Compares the cost of checking a line against every heading regex using
+    (1) the old approach, where is_heading built the pattern string and called re.match
+    on every call, and (2) the precompiled HEADING_PATTERNS registry
+    """
+    regexes = list(HEADING_REGEXES.values())
+    patterns = list(HEADING_PATTERNS.values())
+
+    def classify_uncompiled(line: str):
+        for regex in regexes:
+            re.match(r'^[\s]*' + regex + r'[\s]*$', line)
+
+    def classify_uncompiled_cold(line: str):
+        # Simulates the regex module cache being evicted by other patterns
+        re.purge()
+        classify_uncompiled(line)
+
+    def classify_compiled(line: str):
+        for pattern in patterns:
+            is_heading(pattern, line)
+
+    print(f'{"law":<40}{"lines":>8}{"cold µs/line":>15}'
+          f'{"before µs/line":>16}{"after µs/line":>15}{"speedup":>9}')
+    for filename, law in get_largest_laws(num_laws):
+        cold = time_per_line(classify_uncompiled_cold, law, 1)
+        before = time_per_line(classify_uncompiled, law, repeat)
+        after = time_per_line(classify_compiled, law, repeat)
+        print(f'{path.basename(filename):<40}{len(law):>8}{cold:>15.2f}'
+              f'{before:>16.2f}{after:>15.2f}{before / after:>8.1f}x')
+
+
+def benchmark_dispatch(number: int, repeat: int):
+    """Reports the cost of dispatching a structure to its is_start_of_x & parse_x
+    function through STRUCTURE_DETECTORS & STRUCTURE_PARSERS. Every registered
+    function is swapped for 1 that does nothing while this runs, so that only the
+    dispatch itself is timed.
+    """
+    detectors = dict(STRUCTURE_DETECTORS)
+    parsers = dict(STRUCTURE_PARSERS)
+    for structure in detectors:
+        STRUCTURE_DETECTORS[structure] = lambda law, start_index: False
+    for structure in parsers:
+        STRUCTURE_PARSERS[structure] = (lambda parent, law, start_index: start_index, False)
+
+    law = ['Pasal 1']
+    parent = ComplexNode(type=Structure.PASAL)
+    try:
+        detector_seconds = min(timeit.repeat(
+            lambda: [is_start_of_structure(s, law, 0) for s in detectors],
+            number=number,
+            repeat=repeat,
+        ))
+        parser_seconds = min(timeit.repeat(
+            lambda: [parse_structure(parent, s, law, 0) for s in parsers],
+            number=number,
+            repeat=repeat,
+        ))
+    finally:
+        STRUCTURE_DETECTORS.update(detectors)
+        STRUCTURE_PARSERS.update(parsers)
+
+    print(f'is_start_of_structure: '
+          f'{detector_seconds / (number * len(detectors)) * 1e9:.0f}ns per call')
+    print(f'parse_structure: '
+          f'{parser_seconds / (number * len(parsers)) * 1e9:.0f}ns per call')
+
+
+def benchmark_import(repeat: int):
+    """Reports how long a fresh process (like a corpus worker) takes to import
+    parser_main, and which of the modules only needed once the user is asked something
+    it imported
+    """
+    code = '; '.join([
+        'import sys, time',
+        'start = time.perf_counter()',
+        'import parser_main',
+        'print(time.perf_counter() - start)',
+        'print(" ".join(m for m in ["pyperclip", "termcolor", "colorama"] if m in sys.modules))',
+    ])
+
+    best = float('inf')
+    ui_modules = ''
+    for _ in range(repeat):
+        result = subprocess.run(
+            [sys.executable, '-c', code],
+            cwd=path.dirname(path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True,
+        )
+        seconds, ui_modules = result.stdout.split('\n')[:2]
+        best = min(best, float(seconds))
+
+    print(f'import parser_main: {best * 1e3:.0f}ms')
+    print(f'UI modules imported: {ui_modules or "none"}')
+
+
+class LawMemoryUsage(NamedTuple):
+    law_id: str
+    num_lines: int
+    num_nodes: int
+    # memory allocated while parsing that is still held by the tree
+    tree_bytes: int
+    peak_rss_kb: int
+    # None if the law was parsed successfully
+    error: Optional[str]
+
+
+def count_nodes(root: ComplexNode) -> int:
+    num_nodes = 0
+    stack = [root]
+    while len(stack) > 0:
+        node = stack.pop()
+        num_nodes += 1
+        if isinstance(node, ComplexNode):
+            stack.extend(node.children)
+
+    return num_nodes
+
+
+def get_tree_depth(root: ComplexNode) -> int:
+    """The no. of nodes on the longest path from root to a leaf
+    """
+    max_depth = 0
+    stack = [(root, 1)]
+    while len(stack) > 0:
+        node, depth = stack.pop()
+        max_depth = max(max_depth, depth)
+        if isinstance(node, ComplexNode):
+            stack.extend((child, depth + 1) for child in node.children)
+
+    return max_depth
+
+
+def measure_law_memory(clean_filename: str) -> LawMemoryUsage:
+    """Parses a law & measures the memory its tree takes up. Runs in a fresh process
+    so that peak RSS only reflects this law.
+    """
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+
+    law = read_clean_law(clean_filename)
+    tracemalloc.start()
+    start_bytes, _ = tracemalloc.get_traced_memory()
+    try:
+        with redirect_stdout(io.StringIO()):
+            root = parse_law_tree(law)
+    except Exception as e:
+        return LawMemoryUsage(law_id, len(law), 0, 0, 0, f'{type(e).__name__}: {e}')
+
+    tree_bytes = tracemalloc.get_traced_memory()[0] - start_bytes
+    tracemalloc.stop()
+
+    return LawMemoryUsage(
+        law_id,
+        len(law),
+        count_nodes(root),
+        tree_bytes,
+        # kilobytes on Linux
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        None,
+    )
+
+
+def benchmark_memory(num_laws: int):
+    """Reports the bytes per node of the law tree & the peak RSS of parsing, for the
+    num_laws largest laws that can be parsed without asking the user anything
+    """
+    clean_filenames = get_clean_law_filenames()
+    clean_filenames.sort(key=lambda filename: path.getsize(filename), reverse=True)
+
+    print(f'{"law":<40}{"lines":>8}{"nodes":>10}{"tree KB":>10}'
+          f'{"bytes/node":>12}{"peak RSS KB":>13}')
+    num_measured = 0
+    with Pool(processes=1, maxtasksperchild=1) as pool:
+        for clean_filename in clean_filenames:
+            usage = pool.apply(measure_law_memory, (clean_filename,))
+            if usage.error is not None:
+                continue
+
+            print(f'{usage.law_id:<40}{usage.num_lines:>8}{usage.num_nodes:>10}'
+                  f'{usage.tree_bytes / 1024:>10.1f}'
+                  f'{usage.tree_bytes / usage.num_nodes:>12.1f}{usage.peak_rss_kb:>13}')
+
+            num_measured += 1
+            if num_measured == num_laws:
+                break
+
+
+'''
+The phases of turning a cleaned law into JSON that benchmark_corpus times separately:
+parse_law_tree (i.e parse_undang_undang), extract_metadata_from_tree & convert_tree_to_json
+'''
+BENCHMARK_PHASES = ['parse', 'metadata', 'convert']
+BENCHMARK_PERCENTILES = [10, 50, 90, 99]
+BENCHMARK_FILENAME = path.join(BUILD_DIRECTORY, 'benchmark.json')
+
+
+class LawBenchmark(NamedTuple):
+    law_id: str
+    num_lines: int
+    num_nodes: int
+    # best-of-repeat seconds of each phase in BENCHMARK_PHASES
+    seconds: Dict[str, float]
+    # None if the law was parsed successfully
+    error: Optional[str]
+
+
+def benchmark_law(clean_filename: str, repeat: int) -> LawBenchmark:
+    """Times each phase in BENCHMARK_PHASES for a law, replaying any decisions needed
+    from the law's journal
+    """
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+
+    law = read_clean_law(clean_filename)
+    seconds = {phase: float('inf') for phase in BENCHMARK_PHASES}
+    num_nodes = 0
+    try:
+        for _ in range(repeat):
+            # the parser prints context for debugging whenever it crashes
+            with redirect_stdout(io.StringIO()):
+                start = time.perf_counter()
+                root = parse_law_tree(law)
+                parsed = time.perf_counter()
+                metadata = extract_metadata_from_tree(root)
+                extracted = time.perf_counter()
+                convert_tree_to_json(root, get_ketentuan_umum_list(metadata))
+                converted = time.perf_counter()
+
+            for phase, phase_seconds in zip(
+                BENCHMARK_PHASES,
+                [parsed - start, extracted - parsed, converted - extracted],
+            ):
+                seconds[phase] = min(seconds[phase], phase_seconds)
+
+            num_nodes = count_nodes(root)
+    except Exception as e:
+        return LawBenchmark(law_id, len(law), 0, {}, f'{type(e).__name__}: {e}')
+    finally:
+        set_decision_journal(None)
+
+    return LawBenchmark(law_id, len(law), num_nodes, seconds, None)
+
+
+def get_percentile(values: List[float], percentile: float) -> float:
+    """Linearly interpolates between the closest ranks e.g the 50th percentile of
+    [1, 2, 3, 4] is 2.5
+    """
+    values = sorted(values)
+    rank = (len(values) - 1) * percentile / 100
+    lower = int(rank)
+    upper = min(lower + 1, len(values) - 1)
+    return values[lower] + (values[upper] - values[lower]) * (rank - lower)
+
+
+def summarize_benchmarks(benchmarks: List[LawBenchmark]) -> Dict[str, Any]:
+    """Total seconds & percentiles of lines/sec and nodes/sec across laws of each phase
+    """
+    summary: Dict[str, Any] = {}
+    for phase in BENCHMARK_PHASES:
+        # a law can be parsed too quickly for perf_counter to measure
+        seconds = [max(b.seconds[phase], 1e-9) for b in benchmarks]
+        lines_per_sec = [b.num_lines / s for b, s in zip(benchmarks, seconds)]
+        nodes_per_sec = [b.num_nodes / s for b, s in zip(benchmarks, seconds)]
+
+        summary[phase] = {
+            'seconds': sum(b.seconds[phase] for b in benchmarks),
+            'lines_per_sec': {
+                f'p{p}': get_percentile(lines_per_sec, p) for p in BENCHMARK_PERCENTILES
+            },
+            'nodes_per_sec': {
+                f'p{p}': get_percentile(nodes_per_sec, p) for p in BENCHMARK_PERCENTILES
+            },
+        }
+
+    return summary
+
+
+def compare_benchmarks(
+    benchmarks: Dict[str, Any],
+    baseline: Dict[str, Any],
+    threshold: float,
+) -> List[str]:
+    """Compares the total seconds of each phase over the laws benchmarked in both runs
+
+    Args:
+        benchmarks: results saved by benchmark_corpus
+        baseline: results saved by an earlier benchmark_corpus
+        threshold: how much slower a phase may get before it counts as a regression
+        e.g 0.1 for 10%
+
+    Returns:
+        List[str]: the phases that got slower by more than threshold
+    """
+    law_ids = [
+        law_id for law_id in benchmarks['laws'].keys() if law_id in baseline['laws']
+    ]
+
+    print(f'compared to {len(law_ids)} laws in the baseline')
+    print(f'{"phase":<12}{"baseline s":>12}{"current s":>12}{"change":>10}')
+    regressions = []
+    for phase in BENCHMARK_PHASES:
+        baseline_seconds = sum(
+            baseline['laws'][law_id]['seconds'][phase] for law_id in law_ids)
+        current_seconds = sum(
+            benchmarks['laws'][law_id]['seconds'][phase] for law_id in law_ids)
+        change = current_seconds / max(baseline_seconds, 1e-9) - 1
+
+        is_regression = change > threshold
+        if is_regression:
+            regressions.append(phase)
+
+        print(f'{phase:<12}{baseline_seconds:>12.3f}{current_seconds:>12.3f}'
+              f'{change * 100:>9.1f}%{"  REGRESSION" if is_regression else ""}')
+
+    return regressions
+
+
+def benchmark_corpus(
+    clean_filenames: List[str],
+    repeat: int,
+    output_filename: str,
+    baseline_filename: Optional[str] = None,
+    threshold: float = 0.1,
+) -> bool:
+    """Times each phase in BENCHMARK_PHASES for every law in clean_filenames that can be
+    parsed without asking the user anything, saves the results to output_filename and
+    compares them with baseline_filename (the output_filename of an earlier run) if given
+
+    Returns:
+        bool: False if a phase got slower than the baseline by more than threshold
+    """
+    benchmarks = []
+    num_failed = 0
+    for clean_filename in clean_filenames:
+        benchmark = benchmark_law(clean_filename, repeat)
+        if benchmark.error is None:
+            benchmarks.append(benchmark)
+        else:
+            num_failed += 1
+
+    if len(benchmarks) == 0:
+        raise Exception('None of the laws could be parsed without asking the user')
+
+    summary = summarize_benchmarks(benchmarks)
+    results = {
+        'python': platform.python_version(),
+        'repeat': repeat,
+        'summary': summary,
+        'laws': {
+            b.law_id: {
+                'lines': b.num_lines,
+                'nodes': b.num_nodes,
+                'seconds': b.seconds,
+            }
+            for b in benchmarks
+        },
+    }
+
+    output_directory = path.dirname(output_filename)
+    if output_directory != '':
+        os.makedirs(output_directory, exist_ok=True)
+    with open(output_filename, 'w') as outfile:
+        json.dump(results, outfile, indent=2)
+
+    print(f'{len(benchmarks)} laws benchmarked, {num_failed} skipped since they failed to '
+          f'parse (usually a decision missing from their journal)')
+    print(f'{"phase":<12}{"seconds":>10}' + ''.join(
+        f'{f"lines/s p{p}":>15}' for p in BENCHMARK_PERCENTILES) + ''.join(
+        f'{f"nodes/s p{p}":>15}' for p in BENCHMARK_PERCENTILES))
+    for phase in BENCHMARK_PHASES:
+        print(f'{phase:<12}{summary[phase]["seconds"]:>10.3f}' + ''.join(
+            f'{summary[phase]["lines_per_sec"][f"p{p}"]:>15.0f}' for p in BENCHMARK_PERCENTILES) + ''.join(
+            f'{summary[phase]["nodes_per_sec"][f"p{p}"]:>15.0f}' for p in BENCHMARK_PERCENTILES))
+    print(f'results saved to {output_filename}')
+
+    if baseline_filename is None:
+        return True
+
+    print()
+    with open(baseline_filename) as file:
+        baseline = json.load(file)
+    return len(compare_benchmarks(results, baseline, threshold)) == 0
+
+
+class LawEngineBenchmark(NamedTuple):
+    law_id: str
+    num_lines: int
+    tree_depth: int
+    # best-of-repeat seconds of parse_law_tree with each engine in PARSER_ENGINES
+    seconds: Dict[str, float]
+    # whether every engine built the same tree
+    is_same_tree: bool
+    # None if the law was parsed successfully
+    error: Optional[str]
+
+
+def benchmark_law_engines(clean_filename: str, repeat: int) -> LawEngineBenchmark:
+    """Parses a law with each engine in PARSER_ENGINES, timing each & checking they all
+    build the same tree
+    """
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+
+    law = read_clean_law(clean_filename)
+    seconds = {engine: float('inf') for engine in PARSER_ENGINES}
+    trees: Dict[str, Any] = {}
+    try:
+        for _ in range(repeat):
+            for engine in PARSER_ENGINES:
+                with redirect_stdout(io.StringIO()):
+                    start = time.perf_counter()
+                    root = parse_law_tree(law, engine=engine)
+                    seconds[engine] = min(seconds[engine], time.perf_counter() - start)
+
+                trees[engine] = root
+    except Exception as e:
+        return LawEngineBenchmark(law_id, len(law), 0, {}, False, f'{type(e).__name__}: {e}')
+    finally:
+        set_decision_journal(None)
+
+    tree_jsons = [convert_tree_to_json(root, []) for root in trees.values()]
+    return LawEngineBenchmark(
+        law_id,
+        len(law),
+        get_tree_depth(root),
+        seconds,
+        all(tree_json == tree_jsons[0] for tree_json in tree_jsons),
+        None,
+    )
+
+
+def benchmark_engines(clean_filenames: List[str], repeat: int) -> bool:
+    """Compares the parse time of every engine in PARSER_ENGINES on every law in
+    clean_filenames that can be parsed without asking the user anything
+
+    Returns:
+        bool: False if the engines built different trees for any law
+    """
+    benchmarks = []
+    num_failed = 0
+    for clean_filename in clean_filenames:
+        benchmark = benchmark_law_engines(clean_filename, repeat)
+        if benchmark.error is None:
+            benchmarks.append(benchmark)
+        else:
+            num_failed += 1
+
+    if len(benchmarks) == 0:
+        raise Exception('None of the laws could be parsed without asking the user')
+
+    print(f'{len(benchmarks)} laws benchmarked, {num_failed} skipped since they failed to '
+          f'parse (usually a decision missing from their journal)')
+    print(f'{"engine":<12}{"seconds":>10}' + ''.join(
+        f'{f"lines/s p{p}":>15}' for p in BENCHMARK_PERCENTILES))
+    total_seconds = {}
+    for engine in PARSER_ENGINES:
+        # a law can be parsed too quickly for perf_counter to measure
+        lines_per_sec = [
+            b.num_lines / max(b.seconds[engine], 1e-9) for b in benchmarks]
+        total_seconds[engine] = sum(b.seconds[engine] for b in benchmarks)
+        print(f'{engine:<12}{total_seconds[engine]:>10.3f}' + ''.join(
+            f'{get_percentile(lines_per_sec, p):>15.0f}' for p in BENCHMARK_PERCENTILES))
+
+    deepest = max(benchmarks, key=lambda b: b.tree_depth)
+    print(f'stack / recursive: {total_seconds["stack"] / total_seconds["recursive"]:.2f}x; '
+          f'deepest tree: {deepest.tree_depth} nodes ({deepest.law_id})')
+
+    different_trees = [b.law_id for b in benchmarks if not b.is_same_tree]
+    if len(different_trees) > 0:
+        print(f'the engines built different trees for: {", ".join(different_trees)}')
+
+    return len(different_trees) == 0
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmarks for indolaw-parser')
+    subparsers = parser.add_subparsers(dest='benchmark', required=True)
+
+    heading_parser = subparsers.add_parser(
+        'heading',
+        help='per-line cost of matching every heading regex, before & after precompiling',
+    )
+    heading_parser.add_argument('--laws', type=int, default=5)
+    heading_parser.add_argument('--repeat', type=int, default=5)
+
+    dispatch_parser = subparsers.add_parser(
+        'dispatch',
+        help='cost of dispatching a structure to its is_start_of_x & parse_x function',
+    )
+    dispatch_parser.add_argument('--number', type=int, default=1000)
+    dispatch_parser.add_argument('--repeat', type=int, default=5)
+
+    import_parser = subparsers.add_parser(
+        'import',
+        help='time taken by a fresh process to import parser_main',
+    )
+    import_parser.add_argument('--repeat', type=int, default=5)
+
+    memory_parser = subparsers.add_parser(
+        'memory',
+        help='bytes per node of the law tree & peak RSS of parsing the largest laws',
+    )
+    memory_parser.add_argument('--laws', type=int, default=5)
+
+    corpus_parser = subparsers.add_parser(
+        'corpus',
+        help='lines/sec & nodes/sec of parsing, extracting metadata from & converting every law to JSON',
+    )
+    corpus_parser.add_argument(
+        'laws',
+        nargs='*',
+        help='cleaned laws to benchmark e.g laws/uu-2008-14-mod-clean.txt; defaults to every cleaned law',
+    )
+    corpus_parser.add_argument('--repeat', type=int, default=3)
+    corpus_parser.add_argument('-o', '--output', default=BENCHMARK_FILENAME)
+    corpus_parser.add_argument(
+        '--baseline',
+        help='results of an earlier run to compare against; exits with 1 if a phase got slower by more than --threshold',
+    )
+    corpus_parser.add_argument('--threshold', type=float, default=0.1)
+
+    engines_parser = subparsers.add_parser(
+        'engines',
+        help='parse time of the recursive & stack parser engines on every law; exits with 1 if they build different trees',
+    )
+    engines_parser.add_argument(
+        'laws',
+        nargs='*',
+        help='cleaned laws to benchmark e.g laws/uu-2008-14-mod-clean.txt; defaults to every cleaned law',
+    )
+    engines_parser.add_argument('--repeat', type=int, default=3)
+
+    args = parser.parse_args()
+    if args.benchmark == 'heading':
+        benchmark_heading(args.laws, args.repeat)
+    elif args.benchmark == 'dispatch':
+        benchmark_dispatch(args.number, args.repeat)
+    elif args.benchmark == 'import':
+        benchmark_import(args.repeat)
+    elif args.benchmark == 'memory':
+        benchmark_memory(args.laws)
+    elif args.benchmark == 'corpus':
+        clean_filenames = args.laws or get_clean_law_filenames()
+        if not benchmark_corpus(
+            clean_filenames,
+            args.repeat,
+            args.output,
+            args.baseline,
+            args.threshold,
+        ):
+            sys.exit(1)
+    elif args.benchmark == 'engines':
+        if not benchmark_engines(args.laws or get_clean_law_filenames(), args.repeat):
+            sys.exit(1)
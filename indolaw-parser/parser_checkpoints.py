@@ -0,0 +1,155 @@
+import hashlib
+import json
+import os
+from contextlib import contextmanager
+from os import path
+from typing import IO, Dict, Iterator, List, Optional
+
+
+def hash_law(law: List[str]) -> str:
+    return hashlib.sha1('\n'.join(law).encode('utf-8')).hexdigest()
+
+
+class CheckpointStore:
+    """Keeps the law as it was after each cleaning stage (see CleaningStageOrder), so the
+    user can go back & redo a stage, and so an interrupted cleaning session can resume
+    from the last stage it completed instead of from the 1st stage.
+
+    Each stage's output is saved to its own file in the checkpoint directory e.g
+    '3-clean_maybe_squashed_headings.txt', with an index of
+    - the hash of the law the stage was run on
+    - the hash of the law the stage output
+
+    A checkpoint is only used if its file still has the same hash and it was run on the
+    output of the checkpoint before it (or the law being cleaned, for the 1st stage), so
+    editing the law or a checkpoint file by hand throws away the checkpoints after it.
+
+    Args:
+        directory: directory the checkpoints are saved to; if None, the checkpoints are
+        only kept in memory
+    """
+
+    INDEX_FILENAME = 'checkpoints.json'
+
+    def __init__(self, directory: Optional[str]):
+        self.directory = directory
+        self.index: Dict[str, Dict[str, str]] = {}
+        self.laws: Dict[int, List[str]] = {}
+
+        if directory is not None and path.isfile(self.get_index_filename()):
+            with open(self.get_index_filename(), mode='r', encoding='utf-8') as file:
+                self.index = json.load(file)
+
+    def get_index_filename(self) -> str:
+        assert self.directory is not None
+        return path.join(self.directory, CheckpointStore.INDEX_FILENAME)
+
+    def get_filename(self, stage: int) -> str:
+        assert self.directory is not None
+        return path.join(self.directory, f'{stage}-{self.index[str(stage)]["name"]}.txt')
+
+    def save(self, stage: int, name: str, input_law: List[str], law: List[str]):
+        self.index[str(stage)] = {
+            'name': name.lower(),
+            'input_hash': hash_law(input_law),
+            'output_hash': hash_law(law),
+        }
+
+        if self.directory is None:
+            self.laws[stage] = law
+            return
+
+        os.makedirs(self.directory, exist_ok=True)
+        write_atomically(self.get_filename(stage), '\n'.join(law))
+        write_atomically(
+            self.get_index_filename(),
+            json.dumps(self.index, indent=2, sort_keys=True),
+        )
+
+    def load(self, stage: int, input_law: List[str]) -> Optional[List[str]]:
+        """Returns the law saved after stage, if stage was run on input_law & its
+        checkpoint hasn't changed since; None otherwise
+        """
+        checkpoint = self.index.get(str(stage))
+        if checkpoint is None or checkpoint['input_hash'] != hash_law(input_law):
+            return None
+
+        if self.directory is None:
+            return self.laws[stage]
+
+        if not path.isfile(self.get_filename(stage)):
+            return None
+
+        with open(self.get_filename(stage), mode='r', encoding='utf-8') as file:
+            law = file.read().split('\n')
+
+        if hash_law(law) != checkpoint['output_hash']:
+            return None
+
+        return law
+
+    def load_all(self, law: List[str], stages: List[int]) -> Dict[int, List[str]]:
+        """Returns the saved output of each stage in stages (in order) that can still be
+        used, starting from law; stops at the 1st stage without a usable checkpoint
+        """
+        laws: Dict[int, List[str]] = {}
+        for stage in stages:
+            stage_law = self.load(stage, law)
+            if stage_law is None:
+                break
+
+            laws[stage] = law = stage_law
+
+        return laws
+
+    def delete(self, stages: List[int]):
+        for stage in stages:
+            if str(stage) not in self.index:
+                continue
+
+            if self.directory is None:
+                del self.laws[stage]
+            elif path.isfile(self.get_filename(stage)):
+                os.remove(self.get_filename(stage))
+
+            del self.index[str(stage)]
+
+        if self.directory is not None and path.isdir(self.directory):
+            write_atomically(
+                self.get_index_filename(),
+                json.dumps(self.index, indent=2, sort_keys=True),
+            )
+
+
+def get_checkpoint_directory(filename: str) -> str:
+    """e.g 'laws/uu-2008-14-mod' -> 'laws/uu-2008-14-mod-checkpoints'
+    """
+    return f'{filename}-checkpoints'
+
+
+def write_atomically(filename: str, text: str):
+    # write to a temporary file first so an interrupted run can't corrupt a checkpoint
+    with open_atomically(filename, encoding='utf-8') as outfile:
+        outfile.write(text)
+
+
+@contextmanager
+def open_atomically(filename: str, mode: str = 'w', encoding: Optional[str] = None) -> Iterator[IO]:
+    """Opens a temporary file to write the new contents of filename to. filename is only
+    replaced once the with block finishes; if it raises, the temporary file is deleted
+    & filename is left as it was.
+
+    Examples:
+        >>> with open_atomically('laws/uu-2008-14-mod.json') as outfile:
+        ...     write_law(law, outfile)
+    """
+    temp_filename = filename + '.tmp'
+    try:
+        with open(temp_filename, mode=mode, encoding=encoding) as outfile:
+            yield outfile
+    except BaseException:
+        if path.isfile(temp_filename):
+            os.remove(temp_filename)
+        raise
+
+    os.replace(temp_filename, filename)
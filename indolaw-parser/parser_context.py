@@ -0,0 +1,78 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import TYPE_CHECKING, Iterator, List, Optional
+
+from parser_types import ComplexNode
+
+if TYPE_CHECKING:
+    from parser_decisions import DecisionJournal
+    from parser_main import ParseError
+
+
+class ParseContext:
+    """Everything that belongs to the law currently being cleaned/parsed. It's kept in a
+    ContextVar rather than in module globals, so laws cleaned/parsed at the same time
+    (e.g from different threads, see parser_main.parse_law) each only see their own.
+
+    Args:
+        journal: see DecisionJournal; if None, every question is asked & nothing is
+        recorded
+
+        interactive: if False, the user is never asked anything; a question without a
+        recorded decision raises MissingDecisionError instead. Nothing is printed or
+        copied to the clipboard, and crash() doesn't dump the law tree.
+    """
+
+    def __init__(self, journal: Optional['DecisionJournal'] = None, interactive: bool = True):
+        self.journal = journal
+        self.interactive = interactive
+
+        '''
+        The root node of the law tree being parsed. Having access to it makes it easy to
+        print out a snapshot of the current state of the law tree at any point during
+        parsing e.g before crashing, to provide useful debugging clues.
+        '''
+        self.root: Optional[ComplexNode] = None
+
+        '''
+        Set while a law is parsed with errors recovered (see parser_main.parse_law_tree);
+        every ParseError the parser recovers from is added to it. None when the parser
+        stops at the 1st error.
+        '''
+        self.parse_errors: Optional[List['ParseError']] = None
+
+
+CONTEXT: ContextVar[ParseContext] = ContextVar('parse_context')
+
+
+def get_context() -> ParseContext:
+    """Returns the context of the law being cleaned/parsed. The 1st call in a thread
+    (outside of use_context) creates an interactive context without a journal, i.e how
+    parser_main.py is run from the command line.
+    """
+    context = CONTEXT.get(None)
+    if context is None:
+        context = ParseContext()
+        CONTEXT.set(context)
+
+    return context
+
+
+@contextmanager
+def use_context(context: ParseContext) -> Iterator[ParseContext]:
+    """Makes context the context of the law being cleaned/parsed until the end of the
+    with block
+
+    Examples:
+        >>> with use_context(ParseContext(journal, interactive=False)):
+        ...     root = parse_law_tree(law)
+    """
+    token = CONTEXT.set(context)
+    try:
+        yield context
+    finally:
+        CONTEXT.reset(token)
+
+
+def is_interactive() -> bool:
+    return get_context().interactive
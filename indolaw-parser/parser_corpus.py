@@ -0,0 +1,627 @@
+import argparse
+import glob
+import gzip
+import hashlib
+import io
+import json
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from contextlib import redirect_stdout
+from os import path
+from typing import Any, Dict, List, NamedTuple, Optional
+
+import parser_main
+from parser_checkpoints import open_atomically
+from parser_decisions import (
+    DecisionJournal,
+    get_decision_journal_filename,
+    set_decision_journal,
+)
+from parser_utils import (
+    LAWS_DIRECTORY,
+    get_clean_law_filenames,
+    read_clean_law,
+)
+
+PARSER_DIRECTORY = path.dirname(path.abspath(__file__))
+BUILD_DIRECTORY = path.join(PARSER_DIRECTORY, 'build')
+MANIFEST_FILENAME = 'manifest.json'
+
+
+class OutputFormat(NamedTuple):
+    # see parser_utils.write_law_json
+    compact: bool = False
+    short_keys: bool = False
+    # also write e.g uu-2008-14-mod.json.gz next to uu-2008-14-mod.json
+    gzip: bool = False
+
+
+class LawBuildResult(NamedTuple):
+    law_id: str
+    seconds: float
+    # None if the law was built successfully
+    error: Optional[str]
+    input_hash: str
+    # hash of the JSON written to the output directory; None if the build failed
+    output_hash: Optional[str]
+    # in bytes; None if the build failed, or for gzip_size if there's no gzip sidecar
+    output_size: Optional[int]
+    gzip_size: Optional[int]
+
+
+def hash_bytes(*contents: bytes) -> str:
+    sha = hashlib.sha256()
+    for content in contents:
+        sha.update(hashlib.sha256(content).digest())
+    return sha.hexdigest()
+
+
+def read_bytes(filename: str) -> bytes:
+    if not path.isfile(filename):
+        return b''
+
+    with open(filename, mode='rb') as file:
+        return file.read()
+
+
+def get_parser_source_filenames() -> List[str]:
+    """Every parser_*.py module that can change the output of the build
+    """
+    return [
+        filename
+        for filename in sorted(glob.glob(path.join(PARSER_DIRECTORY, 'parser_*.py')))
+        if path.basename(filename) not in ['parser_test.py', 'parser_benchmark.py', 'parser_profiler.py']
+    ]
+
+
+def get_parser_hash() -> str:
+    return hash_bytes(*[
+        read_bytes(filename) for filename in get_parser_source_filenames()
+    ])
+
+
+def get_input_hash(clean_filename: str) -> str:
+    """Hashes the cleaned law & its decision journal, since the journal holds the
+    answers to questions asked while parsing
+    """
+    journal_filename = get_decision_journal_filename(
+        get_law_filename(clean_filename))
+    return hash_bytes(read_bytes(clean_filename), read_bytes(journal_filename))
+
+
+def load_manifest(output_directory: str) -> Dict[str, Any]:
+    """The manifest records, for each law in the last build of output_directory, the
+    hashes of its input, of the parser & of its output e.g
+    {
+        'uu-2008-14-mod': {
+            'input_hash': '9f2c...',
+            'parser_hash': '07ab...',
+            'output_hash': '5e1d...',
+            'seconds': 0.42,
+            'error': None,
+        },
+        ...
+    }
+    """
+    filename = path.join(output_directory, MANIFEST_FILENAME)
+    if not path.isfile(filename):
+        return {}
+
+    with open(filename, mode='r', encoding='utf-8') as file:
+        return json.load(file)
+
+
+def save_manifest(manifest: Dict[str, Any], output_directory: str):
+    with open(path.join(output_directory, MANIFEST_FILENAME), mode='w', encoding='utf-8') as outfile:
+        json.dump(manifest, outfile, indent=2, sort_keys=True)
+
+
+def is_up_to_date(
+    manifest: Dict[str, Any],
+    law_id: str,
+    input_hash: str,
+    parser_hash: str,
+    output_directory: str,
+    output_format: OutputFormat = OutputFormat(),
+) -> bool:
+    if law_id not in manifest:
+        return False
+
+    entry = manifest[law_id]
+    if entry['input_hash'] != input_hash or entry['parser_hash'] != parser_hash:
+        return False
+
+    if OutputFormat(*entry.get('output_format', [])) != output_format:
+        return False
+
+    # a failed build has no output of its own (the last good output is kept), so there's
+    # nothing to go missing
+    if entry['error'] is not None:
+        return True
+
+    output_filename = path.join(output_directory, f'{law_id}.json')
+    return path.isfile(output_filename) and \
+        (not output_format.gzip or path.isfile(output_filename + '.gz'))
+
+
+def get_law_filename(clean_filename: str) -> str:
+    """e.g 'laws/uu-2008-14-mod-clean.txt' -> 'laws/uu-2008-14-mod'
+    i.e the filename parser_main.py is run with
+    """
+    for suffix in ['-clean.txt', '_clean.txt']:
+        if clean_filename.endswith(suffix):
+            return clean_filename[:-len(suffix)]
+
+    raise Exception(f'{clean_filename} is not a cleaned law')
+
+
+def build_law_file(
+    clean_filename: str,
+    output_directory: str,
+    output_format: OutputFormat = OutputFormat(),
+) -> LawBuildResult:
+    """Parses a cleaned law & writes its JSON to output_directory. Runs in a worker
+    process, so any decisions needed while parsing are replayed from the law's decision
+    journal instead of asking the user.
+
+    Returns:
+        LawBuildResult: how long the law took to build, and why it failed if it did
+    """
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    input_hash = get_input_hash(clean_filename)
+
+    start = time.perf_counter()
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+    parser_main.CRASH_FILENAME = path.join(
+        output_directory, f'{law_id}-crash.json')
+
+    output_filename = path.join(output_directory, f'{law_id}.json')
+    gzip_filename = output_filename + '.gz'
+    error = None
+    output_hash = None
+    output_size = None
+    gzip_size = None
+    try:
+        # the parser prints context for debugging whenever it crashes. If the law can't be
+        # parsed, the output of the last build that succeeded is kept
+        with redirect_stdout(io.StringIO()), open_atomically(output_filename) as outfile:
+            parser_main.write_law(
+                read_clean_law(clean_filename),
+                outfile,
+                compact=output_format.compact,
+                short_keys=output_format.short_keys,
+            )
+
+        output = read_bytes(output_filename)
+        output_hash = hash_bytes(output)
+        output_size = len(output)
+
+        if output_format.gzip:
+            # mtime=0 so the same JSON always gzips to the same bytes
+            with open_atomically(gzip_filename, 'wb') as gzip_file:
+                gzip_file.write(gzip.compress(output, mtime=0))
+            gzip_size = path.getsize(gzip_filename)
+        elif path.isfile(gzip_filename):
+            os.remove(gzip_filename)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        set_decision_journal(None)
+
+    return LawBuildResult(
+        law_id,
+        time.perf_counter() - start,
+        error,
+        input_hash,
+        output_hash,
+        output_size,
+        gzip_size,
+    )
+
+
+def build_corpus(
+    clean_filenames: List[str],
+    output_directory: str = BUILD_DIRECTORY,
+    jobs: Optional[int] = None,
+    force: bool = False,
+    output_format: OutputFormat = OutputFormat(),
+) -> Dict[str, Any]:
+    """Builds every law in clean_filenames across a pool of jobs processes
+    (defaults to the no. of cores). Laws whose input & the parser are unchanged
+    since the last build are skipped, unless force is True.
+
+    Returns:
+        Dict[str, Any]: the previous manifest (see load_manifest)
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    previous_manifest = load_manifest(output_directory)
+    manifest = dict(previous_manifest)
+    parser_hash = get_parser_hash()
+
+    outdated_filenames = [
+        clean_filename for clean_filename in clean_filenames
+        if force or not is_up_to_date(
+            previous_manifest,
+            path.basename(get_law_filename(clean_filename)),
+            get_input_hash(clean_filename),
+            parser_hash,
+            output_directory,
+            output_format,
+        )
+    ]
+    print(f'{len(clean_filenames) - len(outdated_filenames)} laws are up to date; '
+          f'building {len(outdated_filenames)}')
+
+    num_built = 0
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(build_law_file, clean_filename, output_directory, output_format)
+            for clean_filename in outdated_filenames
+        ]
+        for future in as_completed(futures):
+            result = future.result()
+            num_built += 1
+            status = 'ok' if result.error is None else 'FAILED'
+            print(f'[{num_built}/{len(futures)}] '
+                  f'{result.law_id} {result.seconds:.2f}s {status}')
+
+            manifest[result.law_id] = {
+                'input_hash': result.input_hash,
+                'parser_hash': parser_hash,
+                'output_hash': result.output_hash,
+                'output_format': list(output_format),
+                'output_size': result.output_size,
+                'gzip_size': result.gzip_size,
+                'seconds': result.seconds,
+                'error': result.error,
+            }
+            # save as we go so an interrupted build doesn't redo finished laws
+            save_manifest(manifest, output_directory)
+
+    return previous_manifest
+
+
+def get_changed_laws(previous_manifest: Dict[str, Any], manifest: Dict[str, Any]) -> List[str]:
+    """Returns the laws whose output differs between two builds, including laws that
+    started or stopped failing
+    """
+    return sorted(
+        law_id for law_id, entry in manifest.items()
+        if law_id not in previous_manifest
+        or previous_manifest[law_id]['output_hash'] != entry['output_hash']
+    )
+
+
+def format_size(size: Optional[int]) -> str:
+    return '-' if size is None else f'{size / 1024:.1f}K'
+
+
+def print_summary(manifest: Dict[str, Any], law_ids: List[str], wall_seconds: float):
+    """Prints the per-law timings, output sizes & failures of law_ids, as of their last build
+    """
+    entries = [(law_id, manifest[law_id]) for law_id in law_ids]
+    failures = [(law_id, entry) for law_id, entry in entries if entry['error'] is not None]
+    total_seconds = sum(entry['seconds'] for _, entry in entries)
+
+    print()
+    print(f'{"law":<40}{"seconds":>10}{"json":>12}{"gzip":>12}')
+    for law_id, entry in sorted(entries, key=lambda e: e[1]['seconds'], reverse=True):
+        print(f'{law_id:<40}{entry["seconds"]:>10.2f}'
+              f'{format_size(entry.get("output_size")):>12}'
+              f'{format_size(entry.get("gzip_size")):>12}')
+
+    if len(failures) > 0:
+        print()
+        print(f'{len(failures)} failed:')
+        for law_id, entry in failures:
+            print(f'{law_id}: {entry["error"]}')
+
+    total_output_size = sum(entry.get('output_size') or 0 for _, entry in entries)
+    total_gzip_size = sum(entry.get('gzip_size') or 0 for _, entry in entries)
+    print()
+    print(f'{"total":<50}{format_size(total_output_size):>12}'
+          f'{format_size(total_gzip_size if total_gzip_size > 0 else None):>12}')
+
+    print()
+    print(f'{len(entries) - len(failures)} / {len(entries)} laws built; '
+          f'this build took {wall_seconds:.2f}s '
+          f'(all laws take {total_seconds:.2f}s to build in 1 process)')
+
+
+class LawCheckResult(NamedTuple):
+    law_id: str
+    seconds: float
+    # why the law couldn't be checked e.g it failed to parse; None if it was checked
+    error: Optional[str]
+    # the first difference from the stored JSON (see find_first_difference); None if
+    # there is none or the law couldn't be checked
+    difference: Optional[str]
+
+
+def get_child_paths(children: List[Any]) -> List[str]:
+    """The path segment of each child node, which is either its id (e.g 'pasal-12') or
+    its type, followed by its index among the siblings of the same type if it has any
+    (e.g 'LIST_ITEM[2]' for the 3rd LIST_ITEM)
+    """
+    type_counts: Dict[str, int] = {}
+    for child in children:
+        if isinstance(child, dict) and 'type' in child:
+            type_counts[child['type']] = type_counts.get(child['type'], 0) + 1
+
+    child_paths = []
+    type_indexes: Dict[str, int] = {}
+    for i, child in enumerate(children):
+        if not isinstance(child, dict) or 'type' not in child:
+            child_paths.append(f'[{i}]')
+            continue
+
+        type_index = type_indexes.get(child['type'], 0)
+        type_indexes[child['type']] = type_index + 1
+
+        if child.get('id'):
+            child_paths.append(child['id'])
+        elif type_counts[child['type']] > 1:
+            child_paths.append(f'{child["type"]}[{type_index}]')
+        else:
+            child_paths.append(child['type'])
+
+    return child_paths
+
+
+def shorten(value: Any, max_length: int = 60) -> str:
+    string = json.dumps(value, ensure_ascii=False)
+    if len(string) > max_length:
+        return string[:max_length - 3] + '...'
+    return string
+
+
+def describe_difference(expected: Any, actual: Any) -> str:
+    """e.g 'expected "...dengan alasan yang sah", got "...dengan alasan yang tidak sah"',
+    where long strings are shown starting a little before the 1st character that differs
+    """
+    if isinstance(expected, str) and isinstance(actual, str):
+        i = 0
+        while i < min(len(expected), len(actual)) and expected[i] == actual[i]:
+            i += 1
+
+        start = max(i - 20, 0)
+        if start > 0:
+            return f'expected "...{shorten(expected[start:])[1:]}, ' \
+                f'got "...{shorten(actual[start:])[1:]}'
+
+    return f'expected {shorten(expected)}, got {shorten(actual)}'
+
+
+def find_first_difference(expected: Any, actual: Any, node_path: str = '') -> Optional[str]:
+    """Compares 2 laws in the JSON format built by parser_main.build_law, node by node in
+    the order they appear in the law
+
+    Returns:
+        Optional[str]: the path of the first node that differs & how it differs e.g
+        'bab-3/pasal-12/LIST/LIST_ITEM[2]: text: expected "a.", got "b."'; None if
+        the laws are the same
+    """
+    def join(*segments: str) -> str:
+        return '/'.join(segment for segment in segments if segment != '')
+
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        is_node = 'type' in expected
+        for key in list(expected.keys()) + [k for k in actual.keys() if k not in expected]:
+            if key not in actual:
+                return f'{node_path}: {key}: missing'
+            if key not in expected:
+                return f'{node_path}: {key}: unexpected {shorten(actual[key])}'
+
+            if isinstance(expected[key], (dict, list)):
+                # a node's children are part of the path of each child instead
+                child_path = node_path if is_node else join(node_path, key)
+                difference = find_first_difference(
+                    expected[key], actual[key], child_path)
+                if difference is not None:
+                    return difference
+            elif expected[key] != actual[key] and is_node:
+                return f'{node_path}: {key}: {describe_difference(expected[key], actual[key])}'
+            elif expected[key] != actual[key]:
+                return f'{join(node_path, key)}: {describe_difference(expected[key], actual[key])}'
+
+        return None
+
+    if isinstance(expected, list) and isinstance(actual, list):
+        for child_path, expected_child, actual_child in zip(
+                get_child_paths(expected), expected, actual):
+            difference = find_first_difference(
+                expected_child, actual_child, join(node_path, child_path))
+            if difference is not None:
+                return difference
+
+        if len(expected) != len(actual):
+            return f'{node_path}: expected {len(expected)} children, got {len(actual)}'
+
+        return None
+
+    if expected != actual:
+        return f'{node_path}: {describe_difference(expected, actual)}'
+
+    return None
+
+
+def check_law_file(clean_filename: str) -> LawCheckResult:
+    """Parses a cleaned law & compares it with the JSON stored next to it (e.g
+    laws/uu-2008-14-mod.json). Runs in a worker process; see build_law_file.
+    """
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    golden_filename = law_filename + '.json'
+
+    start = time.perf_counter()
+    if not path.isfile(golden_filename):
+        return LawCheckResult(law_id, 0, f'{golden_filename} does not exist', None)
+
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+    parser_main.CRASH_FILENAME = os.devnull
+
+    try:
+        # the parser prints context for debugging whenever it crashes
+        with redirect_stdout(io.StringIO()):
+            law = parser_main.build_law(read_clean_law(clean_filename))
+    except Exception as e:
+        return LawCheckResult(
+            law_id, time.perf_counter() - start, f'{type(e).__name__}: {e}', None)
+    finally:
+        set_decision_journal(None)
+
+    try:
+        with open(golden_filename, mode='r', encoding='utf-8') as file:
+            golden_law = json.load(file)
+    except ValueError as e:
+        return LawCheckResult(
+            law_id, time.perf_counter() - start, f'{golden_filename} is not valid JSON: {e}', None)
+
+    return LawCheckResult(
+        law_id,
+        time.perf_counter() - start,
+        None,
+        find_first_difference(golden_law, law),
+    )
+
+
+def check_corpus(clean_filenames: List[str], jobs: Optional[int] = None) -> List[LawCheckResult]:
+    """Re-parses every law in clean_filenames across a pool of jobs processes & compares
+    each with its stored JSON, so a change to the parser can be checked against every
+    law that has been parsed before
+    """
+    results = []
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        futures = [
+            executor.submit(check_law_file, clean_filename)
+            for clean_filename in clean_filenames
+        ]
+        for future in as_completed(futures):
+            results.append(future.result())
+
+    return sorted(results, key=lambda result: result.law_id)
+
+
+def print_check_summary(results: List[LawCheckResult]):
+    differences = [result for result in results if result.difference is not None]
+    errors = [result for result in results if result.error is not None]
+
+    if len(differences) > 0:
+        print(f'{len(differences)} differ from their stored JSON:')
+        for result in differences:
+            print(f'{result.law_id}: {result.difference}')
+        print()
+
+    if len(errors) > 0:
+        print(f'{len(errors)} could not be checked:')
+        for result in errors:
+            print(f'{result.law_id}: {result.error}')
+        print()
+
+    print(f'{len(results) - len(differences) - len(errors)} / {len(results)} laws '
+          f'match their stored JSON; {len(differences)} differ; {len(errors)} not checked')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Parses every cleaned law into the JSON served by indolaw-nextjs')
+    parser.add_argument(
+        'laws',
+        nargs='*',
+        help='only build these laws e.g uu-2008-14-mod (default: every law)',
+    )
+    parser.add_argument('--laws-directory', default=LAWS_DIRECTORY)
+    parser.add_argument('-o', '--output', default=BUILD_DIRECTORY)
+    parser.add_argument(
+        '-f',
+        '--force',
+        action='store_true',
+        help='rebuild every law, even if its input & the parser are unchanged',
+    )
+    parser.add_argument(
+        '--diff',
+        action='store_true',
+        help='only list the laws whose JSON changed in this build',
+    )
+    parser.add_argument(
+        '--compact',
+        action='store_true',
+        help='write minified JSON',
+    )
+    parser.add_argument(
+        '--short-keys',
+        action='store_true',
+        help='shorten the type, id, children & text keys of every node to t, i, c & x',
+    )
+    parser.add_argument(
+        '--gzip',
+        action='store_true',
+        help='also write a gzipped copy of each law',
+    )
+    parser.add_argument(
+        '--check',
+        action='store_true',
+        help='compare each law with the JSON stored next to it (e.g laws/uu-2008-14-mod.json) '
+        'instead of building it; exits with 1 if any law differs',
+    )
+    parser.add_argument(
+        '-j',
+        '--jobs',
+        type=int,
+        default=None,
+        help='no. of processes (default: no. of cores)',
+    )
+    args = parser.parse_args()
+
+    clean_filenames = get_clean_law_filenames(args.laws_directory)
+    if len(args.laws) > 0:
+        clean_filenames = [
+            clean_filename for clean_filename in clean_filenames
+            if path.basename(get_law_filename(clean_filename)) in args.laws
+        ]
+
+    if args.check:
+        check_results = check_corpus(clean_filenames, args.jobs)
+        print_check_summary(check_results)
+        if any(result.difference is not None for result in check_results):
+            sys.exit(1)
+        sys.exit(0)
+
+    start = time.perf_counter()
+    previous_manifest = build_corpus(
+        clean_filenames,
+        args.output,
+        args.jobs,
+        args.force,
+        OutputFormat(args.compact, args.short_keys, args.gzip),
+    )
+    manifest = load_manifest(args.output)
+    law_ids = sorted(path.basename(get_law_filename(clean_filename))
+                     for clean_filename in clean_filenames)
+
+    if args.diff:
+        changed_law_ids = [
+            law_id for law_id in get_changed_laws(previous_manifest, manifest)
+            if law_id in law_ids
+        ]
+        print()
+        print(f'{len(changed_law_ids)} laws changed:')
+        for law_id in changed_law_ids:
+            print(law_id)
+    else:
+        print_summary(manifest, law_ids, time.perf_counter() - start)
+
+    if any(manifest[law_id]['error'] is not None for law_id in law_ids):
+        sys.exit(1)
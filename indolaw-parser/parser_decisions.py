@@ -0,0 +1,187 @@
+import hashlib
+import json
+import os
+from os import path
+from typing import Callable, Dict, List, Optional
+
+from parser_context import get_context
+
+
+class MissingDecisionError(Exception):
+    """Raised in batch mode when the journal has no recorded answer for a decision,
+    since there is no user to ask
+    """
+
+    def __init__(self, key: str):
+        super().__init__(f'No recorded decision for "{key}"')
+        self.key = key
+
+
+class DecisionJournal:
+    """Records every answer the user gives to the yes/no (or multiple choice) questions
+    asked while cleaning & parsing a law, so that a later run can replay them instead
+    of asking again.
+
+    Each decision is stored against a key made of
+    - the law id e.g 'uu-2008-14-mod'
+    - the stage asking the question e.g 'get_squashed_list_item'
+    - a hash of the line(s) the question is about
+    - the offset in the line the question is about e.g where a squashed list item starts
+    - the no. of times the same question has already been asked during this run of the
+      stage, since the same line can appear more than once in a law (e.g 'Pasal 5' in
+      a perubahan section & in the UU being amended) and the answers can differ
+
+    The key doesn't use line numbers, so decisions still apply after lines are added
+    or removed elsewhere in the law.
+
+    Args:
+        filename: JSON file the journal is loaded from & saved to after every new
+        decision; if None, the journal is only kept in memory
+
+        law_id: see above
+
+        replay_only: if True, raise MissingDecisionError instead of asking the user
+        when there is no recorded answer
+    """
+
+    def __init__(self, filename: Optional[str], law_id: str, replay_only: bool = False):
+        self.filename = filename
+        self.law_id = law_id
+        self.replay_only = replay_only
+        self.decisions: Dict[str, str] = {}
+        self.occurrences: Dict[str, int] = {}
+
+        if filename is not None and path.isfile(filename):
+            with open(filename, mode='r', encoding='utf-8') as file:
+                self.decisions = json.load(file)['decisions']
+
+    def get_key(self, stage: str, text: str, offset: Optional[int] = None) -> str:
+        """Returns the key of the next question asked by stage about text. Calling this
+        again with the same arguments returns the key of the following occurrence.
+        """
+        text_hash = hashlib.sha1(text.encode('utf-8')).hexdigest()[:12]
+        key = f'{self.law_id}:{stage}:{text_hash}:{"" if offset is None else offset}'
+
+        occurrence = self.occurrences.get(key, 0)
+        self.occurrences[key] = occurrence + 1
+
+        return f'{key}:{occurrence}'
+
+    def reset_occurrences(self):
+        """Called at the start of each stage so re-running a stage produces the same keys
+        """
+        self.occurrences.clear()
+
+    def forget(self, stages: List[str]):
+        """Deletes every decision made by stages e.g when the user wants to redo them
+        """
+        self.decisions = {
+            key: answer for key, answer in self.decisions.items()
+            if key.split(':')[1] not in stages
+        }
+        self.save()
+
+    def record(self, key: str, answer: str):
+        self.decisions[key] = answer
+        self.save()
+
+    def save(self):
+        if self.filename is None:
+            return
+
+        # write to a temporary file first so an interrupted run can't corrupt the journal
+        temp_filename = self.filename + '.tmp'
+        with open(temp_filename, mode='w', encoding='utf-8') as outfile:
+            json.dump(
+                {
+                    'law_id': self.law_id,
+                    'decisions': self.decisions,
+                },
+                outfile,
+                indent=2,
+                ensure_ascii=False,
+                sort_keys=True,
+            )
+        os.replace(temp_filename, self.filename)
+
+
+def get_decision_journal_filename(filename: str) -> str:
+    """e.g 'laws/uu-2008-14-mod' -> 'laws/uu-2008-14-mod-decisions.json'
+    """
+    return f'{filename}-decisions.json'
+
+
+def get_decision_journal() -> Optional[DecisionJournal]:
+    """Returns the journal of the law currently being cleaned/parsed (see ParseContext).
+    If None, every question is asked & nothing is recorded.
+    """
+    return get_context().journal
+
+
+def set_decision_journal(journal: Optional[DecisionJournal]):
+    get_context().journal = journal
+
+
+def is_batch_mode() -> bool:
+    context = get_context()
+    if not context.interactive:
+        return True
+
+    return context.journal is not None and context.journal.replay_only
+
+
+def reset_decision_occurrences():
+    journal = get_decision_journal()
+    if journal is not None:
+        journal.reset_occurrences()
+
+
+def forget_decisions(stages: List[str]):
+    journal = get_decision_journal()
+    if journal is not None:
+        journal.forget(stages)
+
+
+def ask(
+    stage: str,
+    text: str,
+    show_question: Callable[[], None],
+    offset: Optional[int] = None,
+    valid_answers: Optional[List[str]] = None,
+) -> str:
+    """Returns the recorded answer to a question if there is one; otherwise asks the
+    user and records the answer.
+
+    Args:
+        stage: name of the stage asking the question e.g 'clean_split_plaintext'
+        text: the line(s) the question is about; see DecisionJournal
+        show_question: prints the question & any context the user needs to answer it
+        offset: see DecisionJournal
+        valid_answers: answers that should be recorded. Other answers are returned
+        without being recorded, so the caller can reject them as before.
+
+    Returns:
+        str: the answer, exactly as the user typed it
+    """
+    context = get_context()
+    journal = context.journal
+    if journal is None:
+        if not context.interactive:
+            raise MissingDecisionError(stage)
+
+        show_question()
+        return input()
+
+    key = journal.get_key(stage, text, offset)
+    if key in journal.decisions:
+        return journal.decisions[key]
+
+    if journal.replay_only or not context.interactive:
+        raise MissingDecisionError(key)
+
+    show_question()
+    answer = input()
+    if valid_answers is None or answer in valid_answers:
+        journal.record(key, answer)
+
+    return answer
@@ -1,14 +1,36 @@
-from typing import Dict, List, Union
+from array import array
+from typing import Callable, Dict, List, Pattern, Tuple, Union
 import re
-from parser_types import ListIndexDefinition, Structure
-from parser_ui import print_line, print_yes_no
-import pyperclip
+from parser_decisions import ask
+from parser_types import Line, ListIndexDefinition, Structure
+from parser_ui import copy_to_clipboard, print_line, print_yes_no
 
 
 def group(regex, name):
     return fr'(?P<{name}>{regex})'
 
 
+HEADING_PATTERN_CACHE: Dict[str, Pattern] = {}
+
+
+def compile_heading(regex: str) -> Pattern:
+    """Compiles regex into the pattern used by is_heading i.e regex with only whitespace
+    allowed on either side. Compiled patterns are cached, so calling this repeatedly
+    with the same regex is cheap.
+
+    Args:
+        regex: regex string e.g 'BAB [0-9]+'
+
+    Returns:
+        Pattern: compiled pattern to be passed to is_heading
+    """
+    pattern = HEADING_PATTERN_CACHE.get(regex)
+    if pattern is None:
+        pattern = re.compile(r'^[\s]*' + regex + r'[\s]*$')
+        HEADING_PATTERN_CACHE[regex] = pattern
+    return pattern
+
+
 OPEN_QUOTE_CHAR = '“'
 CLOSE_QUOTE_CHAR = '”'
 
@@ -30,6 +52,11 @@ FORMATTED_MATH_ROW_SPLIT_REGEX = group(
     fr'(=\s*)?{CURRENCY_WITH_PLUS_MINUS_REGEX}$', 'full')
 
 PENJELASAN_PASAL_DEMI_PASAL_REGEX = r'((II\.? )?((PENJELASAN )?PASAL DEMI PASAL|Pasal Demi Pasal))'
+PENJELASAN_UMUM_TITLE_REGEX = r'((I\. )?UMUM|PENJELASAN UMUM)'
+UU_TITLE_YEAR_AND_NUMBER_REGEX = r'NOMOR [0-9]+ TAHUN [0-9]{4}'
+LEMBARAN_NUMBER_REGEX = r'LEMBARAN NEGARA REPUBLIK INDONESIA TAHUN [0-9]{4} NOMOR [0-9]+'
+# \u2212 is the minus sign
+UNORDERED_LIST_INDEX_REGEX = r'(\u2212|-)'
 
 LINE_ENDING_REGEXES = [
     r'(;)',
@@ -144,6 +171,109 @@ PENJELASAN_LIST_INDEX_STRUCTURES = set(filter(
 FIRST_LIST_INDEXES = set([e['first_list_index']
                          for e in LIST_INDEX_DEFINITIONS.values()])
 
+'''
+Regexes of every structure that is detected by checking whether a single line is a
+heading. PERUBAHAN_* and PENJELASAN_PERUBAHAN_* structures map to the open quote
+variant, since the plain variant is already covered by e.g PASAL_NUMBER.
+'''
+HEADING_REGEXES: Dict[Structure, str] = {
+    Structure.UU_TITLE_YEAR_AND_NUMBER: UU_TITLE_YEAR_AND_NUMBER_REGEX,
+    Structure.PASAL_NUMBER: PASAL_NUMBER_REGEX,
+    Structure.PERUBAHAN_PASAL: PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.PENJELASAN_PERUBAHAN_PASAL: PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.BAB_NUMBER: BAB_NUMBER_REGEX,
+    Structure.PERUBAHAN_BAB: BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.PENJELASAN_PERUBAHAN_BAB: BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.BAGIAN_NUMBER: BAGIAN_NUMBER_REGEX,
+    Structure.PERUBAHAN_BAGIAN: BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.PENJELASAN_PERUBAHAN_BAGIAN: BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    Structure.PARAGRAF_NUMBER: PARAGRAF_NUMBER_REGEX,
+    Structure.LEMBARAN_NUMBER: LEMBARAN_NUMBER_REGEX,
+    Structure.PENJELASAN_UMUM_TITLE: PENJELASAN_UMUM_TITLE_REGEX,
+    Structure.PENJELASAN_PASAL_DEMI_PASAL_TITLE: PENJELASAN_PASAL_DEMI_PASAL_REGEX,
+    Structure.UNORDERED_LIST_INDEX: UNORDERED_LIST_INDEX_REGEX,
+}
+for structure, definition in LIST_INDEX_DEFINITIONS.items():
+    regex = definition['regex']
+    assert isinstance(regex, str)
+    HEADING_REGEXES[structure] = regex
+
+HEADING_PATTERNS: Dict[Structure, Pattern] = {
+    structure: compile_heading(regex) for structure, regex in HEADING_REGEXES.items()
+}
+
+LIST_INDEX_PATTERNS: List[Pattern] = [
+    HEADING_PATTERNS[structure] for structure in LIST_INDEX_DEFINITIONS.keys()
+]
+PENJELASAN_LIST_INDEX_PATTERNS: List[Pattern] = [
+    HEADING_PATTERNS[structure] for structure in PENJELASAN_LIST_INDEX_DEFINITIONS.keys()
+]
+START_OF_PERUBAHAN_SECTION_PATTERNS: List[Pattern] = [
+    compile_heading(regex) for regex in START_OF_PERUBAHAN_SECTION_REGEXES
+]
+
+# Lines that make up the start of a PENJELASAN_TITLE structure
+PENJELASAN_HEADING_PATTERN = compile_heading(r'PENJELASAN')
+ATAS_HEADING_PATTERN = compile_heading(r'ATAS')
+UU_REPUBLIK_INDONESIA_HEADING_PATTERN = compile_heading(
+    r'UNDANG-UNDANG REPUBLIK INDONESIA')
+RANCANGAN_UU_REPUBLIK_INDONESIA_HEADING_PATTERN = compile_heading(
+    r'RANCANGAN UNDANG-UNDANG REPUBLIK INDONESIA')
+UU_NUMBER_AND_YEAR_HEADING_PATTERN = compile_heading(
+    r'UNDANG-UNDANG NOMOR [0-9]+ TAHUN [0-9]{4}')
+
+
+def remove_group_names(regex: str) -> str:
+    """Turns named groups e.g (?P<number>[0-9]+) into plain groups, so that regexes which
+    use the same group names can be combined into 1 regex
+    """
+    return re.sub(r'\(\?P<[a-zA-Z_][a-zA-Z0-9_]*>', '(', regex)
+
+
+'''
+Used by is_start_of_any_other_structure to check a line against every heading in
+HEADING_REGEXES in 1 regex call. UNORDERED_LIST_INDEX is left out since it's checked
+against the 1st word of the line rather than the whole line.
+'''
+ANY_HEADING_PATTERN = compile_heading('(' + '|'.join([
+    '(' + remove_group_names(regex) + ')'
+    for structure, regex in HEADING_REGEXES.items()
+    if structure != Structure.UNORDERED_LIST_INDEX
+]) + ')')
+# Same as is_start_of_unordered_list_index, without splitting the line into words
+UNORDERED_LIST_INDEX_START_PATTERN = re.compile(
+    r'^[\s]*' + UNORDERED_LIST_INDEX_REGEX + r'([\s]|$)')
+# Numbers that are followed by a title on the next line
+TITLED_NUMBER_PATTERN = compile_heading('(' + '|'.join([
+    '(' + BAB_NUMBER_REGEX + ')',
+    '(' + BAGIAN_NUMBER_REGEX + ')',
+    '(' + PARAGRAF_NUMBER_REGEX + ')',
+]) + ')')
+
+
+'''
+The is_start_of_x function of each structure. Functions are added with the
+register_detector decorator, placed above each function.
+'''
+STRUCTURE_DETECTORS: Dict[Structure, Callable[[List[str], int], bool]] = {}
+
+
+def register_detector(*structures: Structure):
+    """Decorator that registers the decorated function as the is_start_of_x function of
+    structures, so is_start_of_structure can dispatch to it.
+
+    Examples:
+        >>> @register_detector(Structure.BAB)
+        ... def is_start_of_bab(law: List[str], start_index: int) -> bool:
+        ...     ...
+    """
+    def decorator(detector: Callable[[List[str], int], bool]):
+        for structure in structures:
+            STRUCTURE_DETECTORS[structure] = detector
+        return detector
+
+    return decorator
+
 
 def is_start_of_structure(structure: Structure, law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a structure.
@@ -170,122 +300,112 @@ def is_start_of_structure(structure: Structure, law: List[str], start_index: int
         >>> is_start_of_structure(Structure.UU_TITLE_TOPIC, law, 0)
         False
     """
-    # LIST INDEXES
-    if structure in LIST_INDEX_STRUCTURES:
-        regex = LIST_INDEX_DEFINITIONS[structure]['regex']
-        assert isinstance(regex, str)
-        return is_heading(
-            regex,
-            law[start_index]
-        )
-    # UNDANG UNDANG
-    elif structure == Structure.UNDANG_UNDANG:
-        return is_start_of_undang_undang(law, start_index)
-    # AGREEMENT
-    elif structure == Structure.OPENING:
-        return is_start_of_opening(law, start_index)
-    elif structure == Structure.UU_TITLE:
-        return is_start_of_uu_title(law, start_index)
-    elif structure == Structure.UU_TITLE_YEAR_AND_NUMBER:
-        return is_start_of_uu_title_year_and_number(law, start_index)
-    elif structure == Structure.UU_TITLE_TOPIC:
-        return is_start_of_uu_title_topic(law, start_index)
-    elif structure == Structure.PREFACE:
-        return is_start_of_preface(law, start_index)
-    elif structure == Structure.CONSIDERATIONS:
-        return is_start_of_considerations(law, start_index)
-    elif structure == Structure.PRINCIPLES:
-        return is_start_of_principles(law, start_index)
-    elif structure == Structure.AGREEMENT:
-        return is_start_of_agreement(law, start_index)
-    # BAB
-    elif structure == Structure.BAB:
-        return is_start_of_bab(law, start_index)
-    elif structure == Structure.BAB_NUMBER:
-        return is_start_of_bab_number(law, start_index)
-    elif structure == Structure.BAB_TITLE:
-        return is_start_of_bab_title(law, start_index)
-    # PASAL
-    elif structure == Structure.PASAL:
-        return is_start_of_pasal(law, start_index)
-    elif structure == Structure.PASAL_NUMBER:
-        return is_start_of_pasal_number(law, start_index)
-    # BAGIAN
-    elif structure == Structure.BAGIAN:
-        return is_start_of_bagian(law, start_index)
-    elif structure == Structure.BAGIAN_NUMBER:
-        return is_start_of_bagian_number(law, start_index)
-    elif structure == Structure.BAGIAN_TITLE:
-        return is_start_of_bagian_title(law, start_index)
-    # PARAGRAF
-    elif structure == Structure.PARAGRAF:
-        return is_start_of_paragraf(law, start_index)
-    elif structure == Structure.PARAGRAF_NUMBER:
-        return is_start_of_paragraf_number(law, start_index)
-    elif structure == Structure.PARAGRAF_TITLE:
-        return is_start_of_paragraf_title(law, start_index)
-    # PERUBAHAN SECTION
-    elif structure == Structure.PERUBAHAN_SECTION:
-        return is_start_of_perubahan_section(law, start_index)
-    elif structure == Structure.PERUBAHAN_PASAL:
-        return is_start_of_perubahan_pasal(law, start_index)
-    elif structure == Structure.PERUBAHAN_BAB:
-        return is_start_of_perubahan_bab(law, start_index)
-    elif structure == Structure.PERUBAHAN_BAGIAN:
-        return is_start_of_perubahan_bagian(law, start_index)
-    elif structure == Structure.PENJELASAN_PERUBAHAN_SECTION:
-        return is_start_of_penjelasan_perubahan_section(law, start_index)
-    elif structure == Structure.PENJELASAN_PERUBAHAN_PASAL:
-        return is_start_of_penjelasan_perubahan_pasal(law, start_index)
-    elif structure == Structure.PENJELASAN_PERUBAHAN_BAB:
-        return is_start_of_penjelasan_perubahan_bab(law, start_index)
-    elif structure == Structure.PENJELASAN_PERUBAHAN_BAGIAN:
-        return is_start_of_penjelasan_perubahan_bagian(law, start_index)
-    # LIST
-    elif structure == Structure.LIST:
-        return is_start_of_list(law, start_index)
-    elif structure == Structure.LIST_ITEM:
-        return is_start_of_list_item(law, start_index)
-    elif structure == Structure.LIST_INDEX:
-        return is_start_of_list_index(law, start_index)
-    # CLOSING
-    elif structure == Structure.CLOSING:
-        return is_start_of_closing(law, start_index)
-    elif structure == Structure.LEMBARAN_NUMBER:
-        return is_start_of_lembaran_number(law, start_index)
-    # PENJELASAN
-    elif structure == Structure.PENJELASAN:
-        return is_start_of_penjelasan(law, start_index)
-    elif structure == Structure.PENJELASAN_TITLE:
-        return is_start_of_penjelasan_title(law, start_index)
-    elif structure == Structure.PENJELASAN_UMUM:
-        return is_start_of_penjelasan_umum(law, start_index)
-    elif structure == Structure.PENJELASAN_UMUM_TITLE:
-        return is_start_of_penjelasan_umum_title(law, start_index)
-    elif structure == Structure.PENJELASAN_PASAL_DEMI_PASAL:
-        return is_start_of_penjelasan_pasal_demi_pasal(law, start_index)
-    elif structure == Structure.PENJELASAN_PASAL_DEMI_PASAL_TITLE:
-        return is_start_of_penjelasan_pasal_demi_pasal_title(law, start_index)
-    elif structure == Structure.PENJELASAN_PASAL:
-        return is_start_of_penjelasan_pasal(law, start_index)
-    elif structure == Structure.PENJELASAN_LIST_ITEM:
-        return is_start_of_penjelasan_list_index_str(law[start_index])
-    elif structure == Structure.UNORDERED_LIST:
-        return is_start_of_unordered_list(law, start_index)
-    elif structure == Structure.UNORDERED_LIST_ITEM:
-        return is_start_of_unordered_list_item(law, start_index)
-    elif structure == Structure.UNORDERED_LIST_INDEX:
-        return is_start_of_unordered_list_index(law, start_index)
-    elif structure == Structure.FORMATTED_MATH_ROW:
-        return is_start_of_formatted_math_row(law, start_index)
-    # OTHERS
-    elif structure == Structure.PLAINTEXT:
-        return is_start_of_plaintext(law, start_index)
-    else:
+    if isinstance(law, ClassifiedLaw):
+        return law.is_start_of(structure, start_index)
+
+    return detect_structure(structure, law, start_index)
+
+
+def detect_structure(structure: Structure, law: List[str], start_index: int) -> bool:
+    """Same as is_start_of_structure, except that it always runs the is_start_of_x function
+    of the structure instead of looking up the result in a ClassifiedLaw
+    """
+    detector = STRUCTURE_DETECTORS.get(structure)
+    if detector is None:
         function_name = '_'.join(structure.value.lower().split(' '))
         raise Exception('is_start_of_' + function_name +
                         ' function does not exist')
 
+    return detector(law, start_index)
+
+
+'''
+Bit that represents each structure in a ClassifiedLaw
+'''
+STRUCTURE_BITS: Dict[Structure, int] = {
+    structure: 1 << i for i, structure in enumerate(Structure)
+}
+assert len(STRUCTURE_BITS) <= 64
+
+'''
+Structures that can't be classified ahead of time.
+- FORMATTED_MATH_ROW asks the user to confirm, so we should only ask when the parser
+  actually needs to know
+- PLAINTEXT depends on FORMATTED_MATH_ROW
+'''
+UNCLASSIFIABLE_STRUCTURES = [Structure.FORMATTED_MATH_ROW, Structure.PLAINTEXT]
+CLASSIFIABLE_STRUCTURES = [
+    s for s in Structure if s not in UNCLASSIFIABLE_STRUCTURES]
+FORMATTED_MATH_ROW_BIT = STRUCTURE_BITS[Structure.FORMATTED_MATH_ROW]
+PLAINTEXT_BIT = STRUCTURE_BITS[Structure.PLAINTEXT]
+
+
+class ClassifiedLaw(list):
+    """The lines of a law, along with a bitset per line of every structure that
+    the line marks the start of. The bitsets are computed once on creation so that
+    is_start_of_structure can look up the answer instead of re-running regexes
+    every time the parser checks the same line for a different structure.
+
+    Detectors that raise an exception on a line (e.g when checking past the end of
+    the law) are recorded separately, and are re-run on lookup so the exception is
+    raised as before.
+
+    Examples:
+        >>> law = ClassifiedLaw(['BAB X', 'GUGATAN KE PENGADILAN', 'Pasal 23'])
+
+        >>> law.is_start_of(Structure.BAB_NUMBER, 0)
+        True
+
+        >>> law.get_structures(2)
+        [Structure.PASAL, Structure.PASAL_NUMBER, Structure.PERUBAHAN_PASAL, ...]
+    """
+
+    def __init__(self, law: List[str]):
+        super().__init__(law)
+
+        # Use a plain list so the detectors don't try to read the unfilled bitsets. Each
+        # line is checked by every classifier (& again as its neighbours' previous/next
+        # line), so the detectors get Lines that only split/lowercase themselves once
+        lines = [Line.of(line) for line in law]
+        self.matches = array('Q', [0]) * len(lines)
+        self.errors = array('Q', [0]) * len(lines)
+
+        for i in range(len(lines)):
+            matches = 0
+            errors = 0
+            for bit, classifier in CLASSIFIERS:
+                try:
+                    if classifier(lines, i):
+                        matches |= bit
+                except Exception:
+                    errors |= bit
+
+            self.matches[i] = matches
+            self.errors[i] = errors
+
+    def is_start_of(self, structure: Structure, start_index: int) -> bool:
+        if not 0 <= start_index < len(self):
+            return detect_structure(structure, self, start_index)
+
+        bit = STRUCTURE_BITS[structure]
+        if self.errors[start_index] & bit:
+            return detect_structure(structure, self, start_index)
+
+        if bit == PLAINTEXT_BIT:
+            return is_start_of_plaintext(self, start_index)
+        elif bit == FORMATTED_MATH_ROW_BIT:
+            return is_start_of_formatted_math_row(self, start_index)
+
+        return (self.matches[start_index] & bit) != 0
+
+    def get_structures(self, start_index: int) -> List[Structure]:
+        """Returns the classifiable structures that law[start_index] marks the start of
+        """
+        return [
+            s for s in CLASSIFIABLE_STRUCTURES
+            if self.matches[start_index] & STRUCTURE_BITS[s]
+        ]
+
 
 def is_start_of_any(structures: List[Structure], law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of any one of a list of structure enums
@@ -321,6 +441,7 @@ def is_start_of_any(structures: List[Structure], law: List[str], start_index: in
     return False
 
 
+@register_detector(Structure.UNDANG_UNDANG)
 def is_start_of_undang_undang(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of an UNDANG_UNDANG structure.
     An UNDANG_UNDANG structure always begin with an OPENING structure, so the first line
@@ -350,6 +471,7 @@ def is_start_of_undang_undang(law: List[str], start_index: int) -> bool:
     return is_start_of_opening(law, start_index)
 
 
+@register_detector(Structure.OPENING)
 def is_start_of_opening(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of an OPENING structure.
     The first line of an OPENING structure is always an UU_TITLE structure
@@ -378,6 +500,7 @@ def is_start_of_opening(law: List[str], start_index: int) -> bool:
     return is_start_of_uu_title(law, start_index)
 
 
+@register_detector(Structure.UU_TITLE)
 def is_start_of_uu_title(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a UU_TITLE structure.
 
@@ -405,6 +528,7 @@ def is_start_of_uu_title(law: List[str], start_index: int) -> bool:
     return 'UNDANG-UNDANG REPUBLIK INDONESIA' in law[start_index]
 
 
+@register_detector(Structure.UU_TITLE_YEAR_AND_NUMBER)
 def is_start_of_uu_title_year_and_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a UU_TITLE_YEAR_AND_NUMBER structure.
 
@@ -429,9 +553,10 @@ def is_start_of_uu_title_year_and_number(law: List[str], start_index: int) -> bo
         >>> is_start_of_uu_title_year_and_number(law, 1)
         True
     """
-    return is_heading('NOMOR [0-9]+ TAHUN [0-9]{4}', law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.UU_TITLE_YEAR_AND_NUMBER], law[start_index])
 
 
+@register_detector(Structure.UU_TITLE_TOPIC)
 def is_start_of_uu_title_topic(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a UU_TITLE_TOPIC structure. 
     The line right after a UU_TITLE_TOPIC structure is always a PREFACE structure, and 
@@ -462,6 +587,7 @@ def is_start_of_uu_title_topic(law: List[str], start_index: int) -> bool:
         is_start_of_preface(law, start_index+1)
 
 
+@register_detector(Structure.PREFACE)
 def is_start_of_preface(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PREFACE structure.
 
@@ -487,6 +613,7 @@ def is_start_of_preface(law: List[str], start_index: int) -> bool:
     return 'DENGAN RAHMAT TUHAN YANG MAHA ESA' in law[start_index]
 
 
+@register_detector(Structure.CONSIDERATIONS)
 def is_start_of_considerations(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a CONSIDERATIONS structure.
 
@@ -512,6 +639,7 @@ def is_start_of_considerations(law: List[str], start_index: int) -> bool:
     return 'Menimbang:' in law[start_index]
 
 
+@register_detector(Structure.PRINCIPLES)
 def is_start_of_principles(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PRINCIPLES structure.
 
@@ -535,6 +663,7 @@ def is_start_of_principles(law: List[str], start_index: int) -> bool:
     return 'Mengingat:' in law[start_index]
 
 
+@register_detector(Structure.AGREEMENT)
 def is_start_of_agreement(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a AGREEMENT structure.
 
@@ -560,7 +689,7 @@ def is_start_of_agreement(law: List[str], start_index: int) -> bool:
         >>> is_start_of_agreement(law, 0)
         True
     """
-    line = law[start_index].lower()
+    line = Line.of(law[start_index]).lowercase
     return line in [
         'dengan persetujuan',
         'dengan persetujuan:',
@@ -569,6 +698,7 @@ def is_start_of_agreement(law: List[str], start_index: int) -> bool:
     ]
 
 
+@register_detector(Structure.PASAL)
 def is_start_of_pasal(law: List[str], start_index: int, ) -> bool:
     """Checks if law[start_index] marks the start of a PASAL structure. The first line of a
     PASAL structure always begins with a PASAL_NUMBER structure.
@@ -594,6 +724,7 @@ def is_start_of_pasal(law: List[str], start_index: int, ) -> bool:
     return is_start_of_pasal_number(law, start_index)
 
 
+@register_detector(Structure.PASAL_NUMBER)
 def is_start_of_pasal_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PASAL_NUMBER structure.
 
@@ -616,23 +747,27 @@ def is_start_of_pasal_number(law: List[str], start_index: int) -> bool:
         >>> is_start_of_pasal_number(law, 2)
         True
     """
-    return is_heading(PASAL_NUMBER_REGEX, law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.PASAL_NUMBER], law[start_index])
 
 
+@register_detector(Structure.PERUBAHAN_PASAL)
 def is_start_of_perubahan_pasal(law: List[str], start_index: int) -> bool:
     return is_start_of_pasal(law, start_index) or \
-        is_heading(PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PERUBAHAN_PASAL], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN_PERUBAHAN_PASAL)
 def is_start_of_penjelasan_perubahan_pasal(law: List[str], start_index: int) -> bool:
     return is_start_of_pasal(law, start_index) or \
-        is_heading(PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PENJELASAN_PERUBAHAN_PASAL], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN_PASAL)
 def is_start_of_penjelasan_pasal(law: List[str], start_index: int, ) -> bool:
     return is_start_of_pasal(law, start_index)
 
 
+@register_detector(Structure.PERUBAHAN_SECTION)
 def is_start_of_perubahan_section(law: List[str], start_index: int) -> bool:
     '''
     TODO what if open/quote chars occur naturally in line
@@ -641,10 +776,12 @@ def is_start_of_perubahan_section(law: List[str], start_index: int) -> bool:
     return line[0] == OPEN_QUOTE_CHAR and CLOSE_QUOTE_CHAR not in line
 
 
+@register_detector(Structure.PENJELASAN_PERUBAHAN_SECTION)
 def is_start_of_penjelasan_perubahan_section(law: List[str], start_index: int) -> bool:
     return is_start_of_perubahan_section(law, start_index)
 
 
+@register_detector(Structure.BAGIAN)
 def is_start_of_bagian(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAGIAN structure. The first line of a
     BAGIAN structure always begins with a BAGIAN_NUMBER structure.
@@ -671,6 +808,7 @@ def is_start_of_bagian(law: List[str], start_index: int) -> bool:
     return is_start_of_bagian_number(law, start_index)
 
 
+@register_detector(Structure.BAGIAN_NUMBER)
 def is_start_of_bagian_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAGIAN_NUMBER structure.
 
@@ -699,9 +837,10 @@ def is_start_of_bagian_number(law: List[str], start_index: int) -> bool:
     however on rare occasions the 1st bagian can be 'pertama' instead
     of 'kesatu'
     '''
-    return is_heading(BAGIAN_NUMBER_REGEX, law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.BAGIAN_NUMBER], law[start_index])
 
 
+@register_detector(Structure.BAGIAN_TITLE)
 def is_start_of_bagian_title(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAGIAN_TITLE structure.
     The line right before a BAGIAN_TITLE structure is always a BAGIAN_NUMBER.
@@ -728,16 +867,19 @@ def is_start_of_bagian_title(law: List[str], start_index: int) -> bool:
     return is_start_of_bagian_number(law, start_index-1)
 
 
+@register_detector(Structure.PERUBAHAN_BAGIAN)
 def is_start_of_perubahan_bagian(law: List[str], start_index: int) -> bool:
     return is_start_of_bagian(law, start_index) or \
-        is_heading(BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PERUBAHAN_BAGIAN], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN_PERUBAHAN_BAGIAN)
 def is_start_of_penjelasan_perubahan_bagian(law: List[str], start_index: int) -> bool:
     return is_start_of_bagian(law, start_index) or \
-        is_heading(BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PENJELASAN_PERUBAHAN_BAGIAN], law[start_index])
 
 
+@register_detector(Structure.PARAGRAF)
 def is_start_of_paragraf(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PARAGRAF structure. The first line of a
     PARAGRAF structure always begins with a PARAGRAF_NUMBER structure.
@@ -764,6 +906,7 @@ def is_start_of_paragraf(law: List[str], start_index: int) -> bool:
     return is_start_of_paragraf_number(law, start_index)
 
 
+@register_detector(Structure.PARAGRAF_NUMBER)
 def is_start_of_paragraf_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PARAGRAF_NUMBER structure.
 
@@ -786,9 +929,10 @@ def is_start_of_paragraf_number(law: List[str], start_index: int) -> bool:
         >>> is_start_of_paragraf_number(law, 1)
         True
     """
-    return is_heading(PARAGRAF_NUMBER_REGEX, law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.PARAGRAF_NUMBER], law[start_index])
 
 
+@register_detector(Structure.PARAGRAF_TITLE)
 def is_start_of_paragraf_title(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PARAGRAF_TITLE structure.
     The line right before a PARAGRAF_TITLE structure is always a PARAGRAF_NUMBER.
@@ -815,6 +959,7 @@ def is_start_of_paragraf_title(law: List[str], start_index: int) -> bool:
     return is_start_of_paragraf_number(law, start_index-1)
 
 
+@register_detector(Structure.BAB)
 def is_start_of_bab(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAB structure. The first line of a 
     BAB structure always begins with a BAB_NUMBER structure.
@@ -841,6 +986,7 @@ def is_start_of_bab(law: List[str], start_index: int) -> bool:
     return is_start_of_bab_number(law, start_index)
 
 
+@register_detector(Structure.BAB_NUMBER)
 def is_start_of_bab_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAB_NUMBER structure.
 
@@ -862,9 +1008,10 @@ def is_start_of_bab_number(law: List[str], start_index: int) -> bool:
         >>> is_start_of_bab_number(law, 0)
         True
     """
-    return is_heading(BAB_NUMBER_REGEX, law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.BAB_NUMBER], law[start_index])
 
 
+@register_detector(Structure.BAB_TITLE)
 def is_start_of_bab_title(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a BAB_TITLE structure.
     The line right before a BAB_TITLE structure is always a BAB_NUMBER.
@@ -892,16 +1039,19 @@ def is_start_of_bab_title(law: List[str], start_index: int) -> bool:
     return is_start_of_bab_number(law, start_index-1)
 
 
+@register_detector(Structure.PERUBAHAN_BAB)
 def is_start_of_perubahan_bab(law: List[str], start_index: int) -> bool:
     return is_start_of_bab(law, start_index) or \
-        is_heading(BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PERUBAHAN_BAB], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN_PERUBAHAN_BAB)
 def is_start_of_penjelasan_perubahan_bab(law: List[str], start_index: int) -> bool:
     return is_start_of_bab(law, start_index) or \
-        is_heading(BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX, law[start_index])
+        is_heading(HEADING_PATTERNS[Structure.PENJELASAN_PERUBAHAN_BAB], law[start_index])
 
 
+@register_detector(Structure.CLOSING)
 def is_start_of_closing(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a CLOSING structure.
 
@@ -933,14 +1083,16 @@ def is_start_of_closing(law: List[str], start_index: int) -> bool:
         >>> is_start_of_closing(law, 1)
         True
     """
-    return 'Lembaran Negara Republik Indonesia'.lower() in law[start_index-1].lower() and\
-        (
-            'Disahkan Di Jakarta'.lower() in law[start_index].lower() or
-            'Diundangkan Di Jakarta'.lower() in law[start_index].lower() or
-            'Ditetapkan Di Jakarta'.lower() in law[start_index].lower()
-    )
+    if 'Lembaran Negara Republik Indonesia'.lower() not in Line.of(law[start_index-1]).lowercase:
+        return False
+
+    line = Line.of(law[start_index]).lowercase
+    return 'Disahkan Di Jakarta'.lower() in line or \
+        'Diundangkan Di Jakarta'.lower() in line or \
+        'Ditetapkan Di Jakarta'.lower() in line
 
 
+@register_detector(Structure.LEMBARAN_NUMBER)
 def is_start_of_lembaran_number(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a LEMBARAN_NUMBER structure.
 
@@ -961,12 +1113,10 @@ def is_start_of_lembaran_number(law: List[str], start_index: int) -> bool:
         >>> is_start_of_lembaran_number(law, 0)
         True
     """
-    return is_heading(
-        r'LEMBARAN NEGARA REPUBLIK INDONESIA TAHUN [0-9]{4} NOMOR [0-9]+',
-        law[start_index]
-    )
+    return is_heading(HEADING_PATTERNS[Structure.LEMBARAN_NUMBER], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN)
 def is_start_of_penjelasan(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PENJELASAN structure.
     A PENJELASAN structure always begin with a PENJELASAN_TITLE structure, and the first line
@@ -995,14 +1145,17 @@ def is_start_of_penjelasan(law: List[str], start_index: int) -> bool:
     return is_start_of_penjelasan_title(law, start_index)
 
 
+@register_detector(Structure.PENJELASAN_UMUM)
 def is_start_of_penjelasan_umum(law: List[str], start_index: int) -> bool:
     return is_start_of_penjelasan_umum_title(law, start_index)
 
 
+@register_detector(Structure.PENJELASAN_UMUM_TITLE)
 def is_start_of_penjelasan_umum_title(law: List[str], start_index: int) -> bool:
-    return is_heading(r'(I\. )?UMUM', law[start_index]) or is_heading(r'PENJELASAN UMUM', law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.PENJELASAN_UMUM_TITLE], law[start_index])
 
 
+@register_detector(Structure.PENJELASAN_TITLE)
 def is_start_of_penjelasan_title(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a PENJELASAN_TITLE structure.
 
@@ -1026,35 +1179,37 @@ def is_start_of_penjelasan_title(law: List[str], start_index: int) -> bool:
         >>> is_start_of_penjelasan_title(law, 0)
         True
     """
-    heuristic_1 = is_heading(r'PENJELASAN', law[start_index]) and \
-        is_heading(r'UNDANG-UNDANG REPUBLIK INDONESIA', law[start_index+1])
+    heuristic_1 = is_heading(PENJELASAN_HEADING_PATTERN, law[start_index]) and \
+        is_heading(UU_REPUBLIK_INDONESIA_HEADING_PATTERN, law[start_index+1])
 
-    heuristic_2 = is_heading(r'PENJELASAN', law[start_index]) and \
-        is_heading(r'ATAS', law[start_index+1]) and \
-        is_heading(r'UNDANG-UNDANG REPUBLIK INDONESIA', law[start_index+2])
+    heuristic_2 = is_heading(PENJELASAN_HEADING_PATTERN, law[start_index]) and \
+        is_heading(ATAS_HEADING_PATTERN, law[start_index+1]) and \
+        is_heading(UU_REPUBLIK_INDONESIA_HEADING_PATTERN, law[start_index+2])
 
-    heuristic_3 = is_heading(r'PENJELASAN', law[start_index]) and \
+    heuristic_3 = is_heading(PENJELASAN_HEADING_PATTERN, law[start_index]) and \
         is_heading(
-            r'RANCANGAN UNDANG-UNDANG REPUBLIK INDONESIA',
+            RANCANGAN_UU_REPUBLIK_INDONESIA_HEADING_PATTERN,
             law[start_index+1],
     )
 
-    heuristic_4 = is_heading(r'PENJELASAN', law[start_index]) and \
-        is_heading(r'ATAS', law[start_index+1]) and \
-        is_heading(
-            r'UNDANG-UNDANG NOMOR [0-9]+ TAHUN [0-9]{4}', law[start_index+2])
+    heuristic_4 = is_heading(PENJELASAN_HEADING_PATTERN, law[start_index]) and \
+        is_heading(ATAS_HEADING_PATTERN, law[start_index+1]) and \
+        is_heading(UU_NUMBER_AND_YEAR_HEADING_PATTERN, law[start_index+2])
 
     return heuristic_1 or heuristic_2 or heuristic_3 or heuristic_4
 
 
+@register_detector(Structure.PENJELASAN_PASAL_DEMI_PASAL)
 def is_start_of_penjelasan_pasal_demi_pasal(law: List[str], start_index: int) -> bool:
     return is_start_of_penjelasan_pasal_demi_pasal_title(law, start_index)
 
 
+@register_detector(Structure.PENJELASAN_PASAL_DEMI_PASAL_TITLE)
 def is_start_of_penjelasan_pasal_demi_pasal_title(law: List[str], start_index: int) -> bool:
-    return is_heading(PENJELASAN_PASAL_DEMI_PASAL_REGEX, law[start_index])
+    return is_heading(HEADING_PATTERNS[Structure.PENJELASAN_PASAL_DEMI_PASAL_TITLE], law[start_index])
 
 
+@register_detector(Structure.LIST)
 def is_start_of_list(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a LIST structure.
 
@@ -1088,6 +1243,7 @@ def is_start_of_list(law: List[str], start_index: int) -> bool:
     return is_start_of_first_list_index(law[start_index])
 
 
+@register_detector(Structure.LIST_ITEM)
 def is_start_of_list_item(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a LIST_ITEM structure.
 
@@ -1118,6 +1274,7 @@ def is_start_of_list_item(law: List[str], start_index: int) -> bool:
     return is_start_of_list_index(law, start_index)
 
 
+@register_detector(Structure.LIST_INDEX)
 def is_start_of_list_index(law: List[str], start_index: int) -> bool:
     """Checks if law[start_index] marks the start of a LIST_INDEX structure.
 
@@ -1158,48 +1315,64 @@ def is_start_of_list_index_str(list_index_str: str) -> bool:
     """
     See is_start_of_list_index
     """
-    for list_index_definition in LIST_INDEX_DEFINITIONS.values():
-        regex = list_index_definition['regex']
-        assert isinstance(regex, str)
-
-        if is_heading(regex, list_index_str):
+    for pattern in LIST_INDEX_PATTERNS:
+        if is_heading(pattern, list_index_str):
             return True
 
     return False
 
 
+def make_list_index_detector(structure: Structure) -> Callable[[List[str], int], bool]:
+    pattern = HEADING_PATTERNS[structure]
+
+    def is_start_of_list_index_structure(law: List[str], start_index: int) -> bool:
+        return is_heading(pattern, law[start_index])
+
+    return is_start_of_list_index_structure
+
+
+for list_index_structure in LIST_INDEX_DEFINITIONS.keys():
+    register_detector(list_index_structure)(
+        make_list_index_detector(list_index_structure))
+
+
+@register_detector(Structure.PENJELASAN_LIST_ITEM)
+def is_start_of_penjelasan_list_item(law: List[str], start_index: int) -> bool:
+    return is_start_of_penjelasan_list_index_str(law[start_index])
+
+
 def is_start_of_penjelasan_list_index_str(list_index_str: str) -> bool:
     """
     See is_start_of_list_index
     """
-    for list_index_definition in PENJELASAN_LIST_INDEX_DEFINITIONS.values():
-        regex = list_index_definition['regex']
-        assert isinstance(regex, str)
-
-        if is_heading(regex, list_index_str):
+    for pattern in PENJELASAN_LIST_INDEX_PATTERNS:
+        if is_heading(pattern, list_index_str):
             return True
 
     return False
 
 
+@register_detector(Structure.UNORDERED_LIST)
 def is_start_of_unordered_list(law: List[str], start_index: int) -> bool:
     return is_start_of_unordered_list_index(law, start_index)
 
 
+@register_detector(Structure.UNORDERED_LIST_ITEM)
 def is_start_of_unordered_list_item(law: List[str], start_index: int) -> bool:
     return is_start_of_unordered_list_index(law, start_index)
 
 
+@register_detector(Structure.UNORDERED_LIST_INDEX)
 def is_start_of_unordered_list_index(law: List[str], start_index: int) -> bool:
-    maybe_list_index = law[start_index].split()[0].strip()
+    maybe_list_index = Line.of(law[start_index]).tokens[0].strip()
     return is_start_of_unordered_list_index_str(maybe_list_index)
 
 
 def is_start_of_unordered_list_index_str(string: str) -> bool:
-    # \u2212 is the minus sign
-    return is_heading('\u2212', string) or is_heading('-', string)
+    return is_heading(HEADING_PATTERNS[Structure.UNORDERED_LIST_INDEX], string)
 
 
+@register_detector(Structure.FORMATTED_MATH_ROW)
 def is_start_of_formatted_math_row(law: List[str], start_index: int) -> bool:
     line = law[start_index]
 
@@ -1207,15 +1380,22 @@ def is_start_of_formatted_math_row(law: List[str], start_index: int) -> bool:
     if match is None:
         return False
 
-    print_line()
-    print(line)
-    print_line()
-    print('Is this line a FORMATTED_MATH_ROW?')
+    def show_question():
+        print_line()
+        print(line)
+        print_line()
+        print('Is this line a FORMATTED_MATH_ROW?')
 
-    pyperclip.copy(line)
-    while True:
+        copy_to_clipboard(line)
         print_yes_no()
-        user_input = input()
+
+    while True:
+        user_input = ask(
+            'is_start_of_formatted_math_row',
+            line,
+            show_question,
+            valid_answers=['y', 'n'],
+        )
         if user_input == 'y':
             return True
         elif user_input == 'n':
@@ -1224,18 +1404,79 @@ def is_start_of_formatted_math_row(law: List[str], start_index: int) -> bool:
             print('Invalid input - try again!')
 
 
+@register_detector(Structure.PARSE_ERROR)
+def is_start_of_parse_error(law: List[str], start_index: int) -> bool:
+    """No line marks the start of a PARSE_ERROR; the parser only creates one after it
+    fails to parse a line (see parser_main.recover_from_parse_error)
+    """
+    return False
+
+
+@register_detector(Structure.PLAINTEXT)
 def is_start_of_plaintext(law: List[str], start_index: int) -> bool:
-    # TODO: This is hilariously dumb. We should take in a list of the other
-    # child structures as an argument and check against that instead
-    # of literally every other structure
-    all_other_structures = list(
-        filter(lambda s: s != Structure.PLAINTEXT, list(Structure)))
+    """Checks if law[start_index] marks the start of a PLAINTEXT structure i.e it doesn't
+    mark the start of any other structure. FORMATTED_MATH_ROW is checked last since
+    it asks the user.
+    """
+    if is_start_of_any_other_structure(law, start_index):
+        return False
 
-    for structure in all_other_structures:
-        if is_start_of_structure(structure, law, start_index):
-            return False
+    return not is_start_of_formatted_math_row(law, start_index)
+
+
+def is_start_of_any_other_structure(law: List[str], start_index: int) -> bool:
+    """Checks if law[start_index] marks the start of any structure other than PLAINTEXT and
+    FORMATTED_MATH_ROW. Gives the same result as calling is_start_of_structure on each of
+    them in turn, but checks most lines with a handful of regex calls.
+
+    Args:
+        law: ordered list of strings that contain the text of the law we want to parse
+        start_index: law[start_index] indicates the 1st line of the structure we want to check
+
+    Returns:
+        bool: True if law[start_index] marks the start of a non-PLAINTEXT structure
+
+    Examples:
+        >>> is_start_of_any_other_structure(['Pasal 3', 'Setiap orang...', ''], 0)
+        True
 
-    return True
+        >>> is_start_of_any_other_structure(['Pasal 3', 'Setiap orang...', ''], 1)
+        False
+    """
+    if isinstance(law, ClassifiedLaw) and 0 <= start_index < len(law) and \
+            not law.errors[start_index]:
+        return law.matches[start_index] != 0
+
+    '''
+    Some of the is_start_of_x functions raise an exception for blank lines or when
+    looking past the end of the law. Go through the structures 1 by 1 in those cases,
+    so that we return or raise at the same point as before.
+    '''
+    if not 0 <= start_index < len(law) - 2 or not law[start_index].strip():
+        for _, classifier in CLASSIFIERS:
+            if classifier(law, start_index):
+                return True
+        return False
+
+    line = law[start_index]
+
+    # Single line structures
+    if is_heading(ANY_HEADING_PATTERN, line) or \
+            UNORDERED_LIST_INDEX_START_PATTERN.match(line) != None or \
+            is_start_of_first_list_index(line) or \
+            is_start_of_uu_title(law, start_index) or \
+            is_start_of_preface(law, start_index) or \
+            is_start_of_considerations(law, start_index) or \
+            is_start_of_principles(law, start_index) or \
+            is_start_of_agreement(law, start_index) or \
+            is_start_of_perubahan_section(law, start_index):
+        return True
+
+    # Structures that depend on the lines around law[start_index]
+    return is_heading(TITLED_NUMBER_PATTERN, law[start_index-1]) or \
+        is_start_of_uu_title_topic(law, start_index) or \
+        is_start_of_closing(law, start_index) or \
+        is_start_of_penjelasan_title(law, start_index)
 
 
 def is_start_of_first_list_index(string: str) -> bool:
@@ -1281,14 +1522,15 @@ def is_start_of_first_list_index(string: str) -> bool:
     return list_index in FIRST_LIST_INDEXES
 
 
-def is_heading(regex: str, string: str) -> bool:
+def is_heading(regex: Union[str, Pattern], string: str) -> bool:
     """Checks if string matches the pattern regex with only whitespace on either side,
     which is the format that section headings in law PDFs often come in.
 
     If you're not familiar w/ regex (i.e regular expressions) see https://regexone.com/
 
     Args:
-        regex: regex string the string will be checked against e.g 'BAB [0-9]+'
+        regex: regex string the string will be checked against e.g 'BAB [0-9]+', or a
+            pattern returned by compile_heading (see HEADING_PATTERNS)
         string: string to be checked 
 
     Returns:
@@ -1301,4 +1543,15 @@ def is_heading(regex: str, string: str) -> bool:
         >>> is_heading('BAB [0-9]+', 'dengan BAB 23 ')
         False
     """
-    return re.match(r'^[\s]*' + regex + r'[\s]*$', string) != None
+    if isinstance(regex, str):
+        regex = compile_heading(regex)
+    return regex.match(string) != None
+
+
+'''
+The is_start_of_x function of every structure in CLASSIFIABLE_STRUCTURES along with the
+bit that represents it in a ClassifiedLaw, in the same order as Structure
+'''
+CLASSIFIERS: List[Tuple[int, Callable[[List[str], int], bool]]] = [
+    (STRUCTURE_BITS[s], STRUCTURE_DETECTORS[s]) for s in CLASSIFIABLE_STRUCTURES
+]
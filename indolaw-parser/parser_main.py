@@ -1,12 +1,22 @@
 #!/usr/bin/env python3
 import json
+import os
 import sys
-from typing import Any, Dict, List, Tuple, Union
-import pyperclip
+import time
+from os import path
+from functools import partial, wraps
+from typing import Any, Callable, Dict, Generator, List, Optional, TextIO, Tuple
 import re
 
-from termcolor import colored
-
+from parser_checkpoints import open_atomically
+from parser_context import ParseContext, get_context, use_context
+from parser_decisions import (
+    DecisionJournal,
+    ask,
+    get_decision_journal_filename,
+    reset_decision_occurrences,
+    set_decision_journal,
+)
 from parser_types import (
     PlaintextInListItemScenario,
     Structure,
@@ -18,6 +28,7 @@ from parser_types import (
 from parser_is_start_of_x import (
     CLOSE_QUOTE_CHAR,
     FORMATTED_MATH_ROW_SPLIT_REGEX,
+    ClassifiedLaw,
     NORMAL_LIST_INDEX_STRUCTURES,
     PENJELASAN_LIST_INDEX_STRUCTURES,
     is_heading,
@@ -35,26 +46,171 @@ from parser_is_start_of_x import (
     is_start_of_unordered_list_item,
 )
 from parser_utils import (
+    clean_law_stream,
     clean_perubahan_section_quotes,
     convert_tree_to_json,
     extract_metadata_from_tree,
     gen_plaintext_in_list_item_scenario_from_user,
+    get_ketentuan_umum_list,
     get_list_index_type,
     get_perubahan_section_end_index,
     is_next_list_index_number,
     is_x_an_ancestor,
     load_clean_law,
     print_around,
+    write_law_json,
 )
+from parser_profiler import Profiler, format_profile, get_parser_modules
+from parser_ui import colored, copy_to_clipboard
 
 '''
-Global variable that is set to the root node of the law tree. Having global
-access makes it easy to print out a snapshot of the current state of the
-law tree at any point during parsing. This is useful for various use cases,
-the main example of which is printing a snapshot of the law tree before
-crashing to provide useful debugging clues.
+The parse_x function of each structure, along with whether it takes a
+perubahan_section_end_index argument. Functions are added with the register_parser
+decorator, placed above each function.
 '''
-ROOT: Union[ComplexNode, None] = None
+STRUCTURE_PARSERS: Dict[Structure, Tuple[Callable[..., int], bool]] = {}
+
+
+def register_parser(*structures: Structure, takes_perubahan_section_end_index: bool = False):
+    """Decorator that registers the decorated function as the parse_x function of
+    structures, so parse_structure can dispatch to it.
+
+    Examples:
+        >>> @register_parser(Structure.BAB)
+        ... def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> int:
+        ...     ...
+    """
+    def decorator(parse_fn: Callable[..., int]):
+        for structure in structures:
+            STRUCTURE_PARSERS[structure] = (
+                parse_fn, takes_perubahan_section_end_index)
+        return parse_fn
+
+    return decorator
+
+
+'''
+Every parse_x function that parses child structures is written as a generator (a
+"frame"); rather than calling the parse_x function of a child structure, it yields
+call(parse_x, *args) & is sent back the end_index the child returns. This way the
+grammar is written once but can be run by either engine in PARSER_ENGINES:
+
+- recursive: each child is parsed by calling its parse_x function, which runs the
+  child's frame in turn; i.e the Python call stack is the stack of structures being
+  parsed. Used by default.
+- stack: run_on_stack keeps the frames of the structures being parsed in a list
+  instead, so deeply nested laws don't run into the recursion limit.
+
+Calling a parse_x function (e.g parse_bab(parent, law, start_index)) always runs it
+with the recursive engine; parse_law_tree takes the engine to use.
+'''
+ParseCall = Tuple[Callable[..., int], Tuple[Any, ...], Dict[str, Any]]
+ParseFrame = Generator[ParseCall, int, int]
+
+
+def call(parse_fn: Callable[..., int], *args: Any, **kwargs: Any) -> ParseCall:
+    """What a frame yields to have parse_fn(*args, **kwargs) parse a child structure
+    """
+    return parse_fn, args, kwargs
+
+
+def parser_frame(frame_fn: Callable[..., ParseFrame]) -> Callable[..., int]:
+    """Decorator that turns a frame into a parse_x function that runs it with the
+    recursive engine. The frame itself is kept as the .frame attribute of the parse_x
+    function, for run_on_stack.
+
+    Examples:
+        >>> @parser_frame
+        ... def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
+        ...     end_index = yield call(parse_complex_structure, bab_node, law, ...)
+        ...     return end_index
+    """
+    @wraps(frame_fn)
+    def parse_fn(*args: Any, **kwargs: Any) -> int:
+        return run_recursively(frame_fn(*args, **kwargs))
+
+    parse_fn.frame = frame_fn  # type: ignore
+    return parse_fn
+
+
+def run_recursively(frame: ParseFrame) -> int:
+    """Runs frame to completion, parsing each child structure it yields by calling the
+    child's parse_x function. A ParseError raised while parsing a child is raised in
+    frame (at the yield), so frame can recover from it.
+
+    Returns:
+        int: the end_index returned by frame
+    """
+    end_index: Optional[int] = None
+    error: Optional[ParseError] = None
+    try:
+        while True:
+            if error is None:
+                parse_fn, args, kwargs = frame.send(end_index)  # type: ignore
+            else:
+                parse_fn, args, kwargs = frame.throw(error)
+                error = None
+
+            try:
+                end_index = parse_fn(*args, **kwargs)
+            except ParseError as child_error:
+                error = child_error
+    except StopIteration as stop:
+        return stop.value
+
+
+def run_on_stack(frame: ParseFrame) -> int:
+    """Runs frame to completion without recursing: the frame of each child structure
+    frame yields is pushed onto a stack of frames & run until it returns, at which point
+    its end_index is sent to the frame below it. parse_x functions that don't parse
+    child structures (e.g parse_list_index) aren't frames & are just called.
+
+    Like run_recursively, a ParseError raised by a frame is raised in the frame below
+    it, until a frame recovers from it.
+
+    Returns:
+        int: the end_index returned by frame
+    """
+    stack: List[ParseFrame] = [frame]
+    end_index: Optional[int] = None
+    error: Optional[ParseError] = None
+    while True:
+        try:
+            if error is None:
+                parse_fn, args, kwargs = stack[-1].send(end_index)  # type: ignore
+            else:
+                thrown_error, error = error, None
+                parse_fn, args, kwargs = stack[-1].throw(thrown_error)
+        except StopIteration as stop:
+            stack.pop()
+            if len(stack) == 0:
+                return stop.value
+
+            end_index = stop.value
+            continue
+        except ParseError as frame_error:
+            stack.pop()
+            if len(stack) == 0:
+                raise
+
+            error = frame_error
+            continue
+
+        frame_fn = getattr(parse_fn, 'frame', None)
+        if frame_fn is None:
+            try:
+                end_index = parse_fn(*args, **kwargs)
+            except ParseError as child_error:
+                error = child_error
+        else:
+            stack.append(frame_fn(*args, **kwargs))
+            end_index = None
+
+
+PARSER_ENGINES: Dict[str, Callable[[ParseFrame], int]] = {
+    'recursive': run_recursively,
+    'stack': run_on_stack,
+}
 
 '''
 -----------------
@@ -65,7 +221,8 @@ PARSE_X FUNCTIONS
 '''
 
 
-def parse_undang_undang(root: ComplexNode, law: List[str]):
+@parser_frame
+def parse_undang_undang(root: ComplexNode, law: List[str]) -> ParseFrame:
     """
     Construct a tree that represents the law as a hierarchy of nodes.
 
@@ -99,7 +256,10 @@ def parse_undang_undang(root: ComplexNode, law: List[str]):
 
         law: Ordered list of strings that contain the text of the law we want to parse
     """
-    end_index = parse_opening(root, law, 0)
+    if not isinstance(law, ClassifiedLaw):
+        law = ClassifiedLaw(law)
+
+    end_index = yield call(parse_opening, root, law, 0)
     start_index = end_index+1
 
     child_structure = Structure.BAB
@@ -109,7 +269,8 @@ def parse_undang_undang(root: ComplexNode, law: List[str]):
         '''
         child_structure = Structure.PASAL
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         root,
         law,
         start_index,
@@ -120,10 +281,11 @@ def parse_undang_undang(root: ComplexNode, law: List[str]):
 
     start_index = end_index+1
     if start_index < len(law):
-        _ = parse_penjelasan(root, law, start_index)
+        _ = yield call(parse_penjelasan, root, law, start_index)
 
 
-def parse_opening(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@parser_frame
+def parse_opening(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the OPENING section of a law.
 
@@ -187,9 +349,10 @@ def parse_opening(parent: ComplexNode, law: List[str], start_index: int) -> int:
 
     end_index = parse_uu_title(opening_node, law, start_index)
     end_index = parse_preface(opening_node, law, start_index=end_index+1)
-    end_index = parse_considerations(
+    end_index = yield call(
+        parse_considerations,
         opening_node, law, start_index=end_index+1)
-    end_index = parse_principles(opening_node, law, start_index=end_index+1)
+    end_index = yield call(parse_principles, opening_node, law, start_index=end_index+1)
     end_index = parse_agreement(opening_node, law, start_index=end_index+1)
 
     return end_index
@@ -311,7 +474,8 @@ def parse_preface(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_considerations(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@parser_frame
+def parse_considerations(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the CONSIDERATIONS section of a law.
 
@@ -365,7 +529,8 @@ def parse_considerations(parent: ComplexNode, law: List[str], start_index: int)
     considerations_node.add_child(PrimitiveNode(
         type=Structure.PLAINTEXT, text=law[start_index]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         considerations_node,
         law,
         start_index+1,
@@ -378,7 +543,8 @@ def parse_considerations(parent: ComplexNode, law: List[str], start_index: int)
     return end_index
 
 
-def parse_principles(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@parser_frame
+def parse_principles(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the PRINCIPLES section of a law.
 
@@ -426,7 +592,8 @@ def parse_principles(parent: ComplexNode, law: List[str], start_index: int) -> i
     principles_node.add_child(PrimitiveNode(
         type=Structure.PLAINTEXT, text=law[start_index]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         principles_node,
         law,
         start_index+1,
@@ -514,7 +681,9 @@ def parse_agreement(parent: ComplexNode, law: List[str], start_index: int) -> in
     return end_index
 
 
-def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.BAB)
+@parser_frame
+def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the BAB section of a law.
 
@@ -578,7 +747,8 @@ def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> int:
     bab_node.add_child(PrimitiveNode(
         type=Structure.BAB_TITLE, text=law[start_index+1]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         bab_node,
         law,
         start_index+2,
@@ -590,7 +760,9 @@ def parse_bab(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_pasal(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PASAL)
+@parser_frame
+def parse_pasal(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the PASAL section of a law.
 
@@ -646,7 +818,8 @@ def parse_pasal(parent: ComplexNode, law: List[str], start_index: int) -> int:
     pasal_node.add_child(PrimitiveNode(
         type=Structure.PASAL_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         pasal_node,
         law,
         start_index+1,
@@ -663,14 +836,17 @@ def parse_pasal(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_penjelasan_pasal(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN_PASAL)
+@parser_frame
+def parse_penjelasan_pasal(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     pasal_node = ComplexNode(type=Structure.PENJELASAN_PASAL)
     parent.add_child(pasal_node)
 
     pasal_node.add_child(PrimitiveNode(
         type=Structure.PASAL_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         pasal_node,
         law,
         start_index+1,
@@ -687,12 +863,14 @@ def parse_penjelasan_pasal(parent: ComplexNode, law: List[str], start_index: int
     return end_index
 
 
+@register_parser(Structure.PERUBAHAN_BAB, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_perubahan_bab(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     perubahan_bab_node = ComplexNode(type=Structure.PERUBAHAN_BAB)
     parent.add_child(perubahan_bab_node)
 
@@ -713,7 +891,8 @@ def parse_perubahan_bab(
     if perubahan_section_end_index == start_index+1:
         return perubahan_section_end_index
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         perubahan_bab_node,
         law,
         start_index=start_index+2,
@@ -734,12 +913,14 @@ def parse_perubahan_bab(
     return end_index
 
 
+@register_parser(Structure.PERUBAHAN_BAGIAN, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_perubahan_bagian(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     perubahan_bagian_node = ComplexNode(type=Structure.PERUBAHAN_BAGIAN)
     parent.add_child(perubahan_bagian_node)
 
@@ -751,7 +932,8 @@ def parse_perubahan_bagian(
     if perubahan_section_end_index == start_index+1:
         return perubahan_section_end_index
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         perubahan_bagian_node,
         law,
         start_index=start_index+2,
@@ -773,12 +955,14 @@ def parse_perubahan_bagian(
     return end_index
 
 
+@register_parser(Structure.PENJELASAN_PERUBAHAN_BAGIAN, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_penjelasan_perubahan_bagian(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     penjelasan_perubahan_bagian_node = ComplexNode(
         type=Structure.PENJELASAN_PERUBAHAN_BAGIAN)
     parent.add_child(penjelasan_perubahan_bagian_node)
@@ -786,7 +970,8 @@ def parse_penjelasan_perubahan_bagian(
     penjelasan_perubahan_bagian_node.add_child(PrimitiveNode(
         type=Structure.BAGIAN_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         penjelasan_perubahan_bagian_node,
         law,
         start_index=start_index+1,
@@ -802,19 +987,22 @@ def parse_penjelasan_perubahan_bagian(
     return end_index
 
 
+@register_parser(Structure.PERUBAHAN_PASAL, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_perubahan_pasal(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     perubahan_pasal_node = ComplexNode(type=Structure.PERUBAHAN_PASAL)
     parent.add_child(perubahan_pasal_node)
 
     perubahan_pasal_node.add_child(PrimitiveNode(
         type=Structure.PASAL_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         perubahan_pasal_node,
         law,
         start_index=start_index+1,
@@ -837,12 +1025,14 @@ def parse_perubahan_pasal(
     return end_index
 
 
+@register_parser(Structure.PENJELASAN_PERUBAHAN_PASAL, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_penjelasan_perubahan_pasal(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     penjelasan_perubahan_pasal_node = ComplexNode(
         type=Structure.PENJELASAN_PERUBAHAN_PASAL)
     parent.add_child(penjelasan_perubahan_pasal_node)
@@ -850,7 +1040,8 @@ def parse_penjelasan_perubahan_pasal(
     penjelasan_perubahan_pasal_node.add_child(PrimitiveNode(
         type=Structure.PASAL_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         penjelasan_perubahan_pasal_node,
         law,
         start_index=start_index+1,
@@ -867,12 +1058,14 @@ def parse_penjelasan_perubahan_pasal(
     return end_index
 
 
+@register_parser(Structure.PENJELASAN_PERUBAHAN_BAB, takes_perubahan_section_end_index=True)
+@parser_frame
 def parse_penjelasan_perubahan_bab(
     parent: ComplexNode,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int,
-) -> int:
+) -> ParseFrame:
     penjelasan_perubahan_bab_node = ComplexNode(
         type=Structure.PENJELASAN_PERUBAHAN_BAB)
     parent.add_child(penjelasan_perubahan_bab_node)
@@ -880,7 +1073,8 @@ def parse_penjelasan_perubahan_bab(
     penjelasan_perubahan_bab_node.add_child(PrimitiveNode(
         type=Structure.BAB_NUMBER, text=law[start_index]))
 
-    end_index = parse_complex_perubahan_structure(
+    end_index = yield call(
+        parse_complex_perubahan_structure,
         penjelasan_perubahan_bab_node,
         law,
         start_index=start_index+1,
@@ -896,6 +1090,7 @@ def parse_penjelasan_perubahan_bab(
     return end_index
 
 
+@parser_frame
 def parse_complex_perubahan_structure(
     parent: ComplexNode,
     law: List[str],
@@ -904,7 +1099,7 @@ def parse_complex_perubahan_structure(
     next_ancestor_structures: List[Structure],
     next_sibling_structures: List[Structure],
     child_structures: List[Structure],
-) -> int:
+) -> ParseFrame:
     if parent.type not in set([
         Structure.PERUBAHAN_PASAL,
         Structure.PERUBAHAN_BAB,
@@ -947,7 +1142,8 @@ def parse_complex_perubahan_structure(
                   f'Cannot find structure for line {start_index}')
 
         assert child_structure is not None  # mypy type hint
-        end_index = parse_structure(
+        end_index = yield call(
+            parse_structure,
             parent,
             child_structure,
             law,
@@ -959,7 +1155,9 @@ def parse_complex_perubahan_structure(
     return end_index
 
 
-def parse_perubahan_section(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PERUBAHAN_SECTION)
+@parser_frame
+def parse_perubahan_section(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     perubahan_section_node = ComplexNode(type=Structure.PERUBAHAN_SECTION)
     parent.add_child(perubahan_section_node)
 
@@ -996,7 +1194,8 @@ def parse_perubahan_section(parent: ComplexNode, law: List[str], start_index: in
                   f'Cannot find structure for line {start_index}')
 
         assert child_structure is not None  # mypy type hint
-        end_index = parse_structure(
+        end_index = yield call(
+            parse_structure,
             perubahan_section_node,
             child_structure,
             law,
@@ -1010,7 +1209,9 @@ def parse_perubahan_section(parent: ComplexNode, law: List[str], start_index: in
     return perubahan_section_end_index
 
 
-def parse_penjelasan_perubahan_section(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN_PERUBAHAN_SECTION)
+@parser_frame
+def parse_penjelasan_perubahan_section(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     penjelasan_perubahan_section_node = ComplexNode(
         type=Structure.PENJELASAN_PERUBAHAN_SECTION)
     parent.add_child(penjelasan_perubahan_section_node)
@@ -1048,7 +1249,8 @@ def parse_penjelasan_perubahan_section(parent: ComplexNode, law: List[str], star
                   f'Cannot find structure for line {start_index}')
 
         assert child_structure is not None  # mypy type hint
-        end_index = parse_structure(
+        end_index = yield call(
+            parse_structure,
             penjelasan_perubahan_section_node,
             child_structure,
             law,
@@ -1062,7 +1264,9 @@ def parse_penjelasan_perubahan_section(parent: ComplexNode, law: List[str], star
     return perubahan_section_end_index
 
 
-def parse_bagian(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.BAGIAN)
+@parser_frame
+def parse_bagian(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the BAGIAN section of a law.
 
@@ -1123,7 +1327,8 @@ def parse_bagian(parent: ComplexNode, law: List[str], start_index: int) -> int:
     bagian_node.add_child(PrimitiveNode(
         type=Structure.BAGIAN_TITLE, text=law[start_index+1]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         bagian_node,
         law,
         start_index+2,
@@ -1138,7 +1343,9 @@ def parse_bagian(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_paragraf(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PARAGRAF)
+@parser_frame
+def parse_paragraf(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the PARAGRAF section of a law.
 
@@ -1198,7 +1405,8 @@ def parse_paragraf(parent: ComplexNode, law: List[str], start_index: int) -> int
     paragraf_node.add_child(PrimitiveNode(
         type=Structure.PARAGRAF_TITLE, text=law[start_index+1]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         paragraf_node,
         law,
         start_index+2,
@@ -1214,7 +1422,9 @@ def parse_paragraf(parent: ComplexNode, law: List[str], start_index: int) -> int
     return end_index
 
 
-def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.LIST)
+@parser_frame
+def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the LIST section of a law.
 
@@ -1312,6 +1522,8 @@ def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
 
         # if plaintext, could be child of list, or sibling of list
 
+        list_index_type = get_list_index_type(law[start_index])
+
         '''
         If there is already 1 list item parsed, we need to check if the next list item
         is part of the same list or part of an ancestor list.
@@ -1342,7 +1554,7 @@ def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
             curr_list_index_type = Structure[list_index_node.type.value]
             curr_list_index_number = list_index_node.text
 
-            next_list_index_type = get_list_index_type(law[start_index])
+            next_list_index_type = list_index_type
             next_list_index_number = law[start_index].rstrip()
             '''
             Suppose the current list is of type NUMBER_WITH_DOT. But the current line
@@ -1398,11 +1610,10 @@ def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
                 pass
 
         # LIST's only child structure is LIST_ITEM
-        list_index_type = get_list_index_type(law[start_index])
         if list_index_type in NORMAL_LIST_INDEX_STRUCTURES:
-            end_index = parse_list_item(list_node, law, start_index)
+            end_index = yield call(parse_list_item, list_node, law, start_index)
         elif list_index_type in PENJELASAN_LIST_INDEX_STRUCTURES:
-            end_index = parse_penjelasan_list_item(list_node, law, start_index)
+            end_index = yield call(parse_penjelasan_list_item, list_node, law, start_index)
         else:
             crash(law, start_index, 'Not a list index')
 
@@ -1411,7 +1622,9 @@ def parse_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_penjelasan_list_item(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN_LIST_ITEM)
+@parser_frame
+def parse_penjelasan_list_item(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     penjelasan_list_item_node = ComplexNode(
         type=Structure.PENJELASAN_LIST_ITEM)
     parent.add_child(penjelasan_list_item_node)
@@ -1421,7 +1634,7 @@ def parse_penjelasan_list_item(parent: ComplexNode, law: List[str], start_index:
     start_index += 1
 
     if is_start_of_penjelasan_list_index_str(law[start_index]):
-        end_index = parse_list(penjelasan_list_item_node, law, start_index)
+        end_index = yield call(parse_list, penjelasan_list_item_node, law, start_index)
     else:
         child_structures = TEXT_BLOCK_STRUCTURES.copy()
         is_desc = is_x_an_ancestor(
@@ -1452,20 +1665,27 @@ def parse_penjelasan_list_item(parent: ComplexNode, law: List[str], start_index:
                 elif list_index_type == Structure.PENJELASAN_AYAT and next_list_index_type == Structure.PENJELASAN_HURUF:
                     pass
                 else:
-                    print('---------------')
-                    print(law[start_index-1])
-                    print('- - - - - - - -')
-                    print(f'[Current Line] {law[start_index]}')
-                    if start_index+1 < len(law):
+                    def show_question():
+                        print('---------------')
+                        print(law[start_index-1])
                         print('- - - - - - - -')
-                        print(law[start_index+1])
-                    print('---------------')
-
-                    pyperclip.copy(law[start_index])
-                    print('Is this list index a child LIST or an ancestor LIST?')
-                    print(
-                        f"{colored('c (child)', 'green')} / {colored('a (ancestor)', 'red')}")
-                    user_input = input()
+                        print(f'[Current Line] {law[start_index]}')
+                        if start_index+1 < len(law):
+                            print('- - - - - - - -')
+                            print(law[start_index+1])
+                        print('---------------')
+
+                        copy_to_clipboard(law[start_index])
+                        print('Is this list index a child LIST or an ancestor LIST?')
+                        print(
+                            f"{colored('c (child)', 'green')} / {colored('a (ancestor)', 'red')}")
+
+                    user_input = ask(
+                        'parse_penjelasan_list_item',
+                        f'{law[start_index-1]}\n{law[start_index]}',
+                        show_question,
+                        valid_answers=['c', 'a'],
+                    )
 
                     if user_input == 'a':
                         return end_index
@@ -1483,14 +1703,17 @@ def parse_penjelasan_list_item(parent: ComplexNode, law: List[str], start_index:
                       f'Cannot find structure for line {start_index}')
 
             assert child_structure is not None  # mypy type hint
-            end_index = parse_structure(
+            end_index = yield call(
+                parse_structure,
                 penjelasan_list_item_node, child_structure, law, start_index)
             start_index = end_index + 1
 
     return end_index
 
 
-def parse_list_item(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.LIST_ITEM)
+@parser_frame
+def parse_list_item(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     """
     Construct a subtree of nodes that represents the LIST_ITEM section of a law.
     One interesting feature is that a LIST_ITEM can itself have a nested LIST inside of it
@@ -1766,7 +1989,8 @@ def parse_list_item(parent: ComplexNode, law: List[str], start_index: int) -> in
                   'parse_list_item: child is neither a list or plaintext')
 
         assert child_structure is not None  # mypy type hint
-        end_index = parse_structure(
+        end_index = yield call(
+            parse_structure,
             list_item_node, child_structure, law, start_index)
 
         start_index = end_index + 1
@@ -1774,7 +1998,8 @@ def parse_list_item(parent: ComplexNode, law: List[str], start_index: int) -> in
     return end_index
 
 
-def parse_list_index(parent: ComplexNode, law: List[str], i: int) -> None:
+@register_parser(Structure.LIST_INDEX)
+def parse_list_index(parent: ComplexNode, law: List[str], i: int) -> int:
     """
     Construct a primitive node that represents the LIST_INDEX section of a law. 
     The primitive node's type will be one of NUMBER_WITH_BRACKETS, NUMBER_WITH_DOT
@@ -1798,11 +2023,16 @@ def parse_list_index(parent: ComplexNode, law: List[str], i: int) -> None:
 
         law: Ordered list of strings that contain the text of the law we want to parse
         i: law[i] is the line containing the LIST_INDEX we want to parse
+
+    Returns:
+        int: the end_index, which is always i since a LIST_INDEX is 1 line long
     """
     structure = get_list_index_type(law[i])
     parent.add_child(PrimitiveNode(type=structure, text=law[i]))
+    return i
 
 
+@register_parser(Structure.CLOSING)
 def parse_closing(parent: ComplexNode, law: List[str], start_index: int) -> int:
     """
     Construct a subtree of nodes that represents the CLOSING section of a law.
@@ -1888,14 +2118,18 @@ def parse_closing(parent: ComplexNode, law: List[str], start_index: int) -> int:
     return end_index
 
 
-def parse_penjelasan(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN)
+@parser_frame
+def parse_penjelasan(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     penjelasan_node = ComplexNode(type=Structure.PENJELASAN)
     parent.add_child(penjelasan_node)
 
     end_index = parse_penjelasan_title(penjelasan_node, law, start_index)
-    end_index = parse_penjelasan_umum(
+    end_index = yield call(
+        parse_penjelasan_umum,
         penjelasan_node, law, start_index=end_index+1)
-    end_index = parse_penjelasan_pasal_demi_pasal(
+    end_index = yield call(
+        parse_penjelasan_pasal_demi_pasal,
         penjelasan_node, law, start_index=end_index+1)
 
     return end_index
@@ -1994,14 +2228,17 @@ def parse_penjelasan_title(parent: ComplexNode, law: List[str], start_index: int
     return end_index
 
 
-def parse_penjelasan_umum(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN_UMUM)
+@parser_frame
+def parse_penjelasan_umum(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     penjelasan_umum_node = ComplexNode(type=Structure.PENJELASAN_UMUM)
     parent.add_child(penjelasan_umum_node)
 
     penjelasan_umum_node.add_child(PrimitiveNode(
         type=Structure.PENJELASAN_UMUM_TITLE, text=law[start_index]))
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         penjelasan_umum_node,
         law,
         start_index+1,
@@ -2014,7 +2251,9 @@ def parse_penjelasan_umum(parent: ComplexNode, law: List[str], start_index: int)
     return end_index
 
 
-def parse_penjelasan_pasal_demi_pasal(parent: ComplexNode, law: List[str], start_index: int) -> int:
+@register_parser(Structure.PENJELASAN_PASAL_DEMI_PASAL)
+@parser_frame
+def parse_penjelasan_pasal_demi_pasal(parent: ComplexNode, law: List[str], start_index: int) -> ParseFrame:
     penjelasan_pasal_demi_pasal = ComplexNode(
         type=Structure.PENJELASAN_PASAL_DEMI_PASAL)
     parent.add_child(penjelasan_pasal_demi_pasal)
@@ -2037,7 +2276,8 @@ def parse_penjelasan_pasal_demi_pasal(parent: ComplexNode, law: List[str], start
             type=Structure.PLAINTEXT, text=law[start_index+2]))
         return start_index+2
 
-    end_index = parse_complex_structure(
+    end_index = yield call(
+        parse_complex_structure,
         penjelasan_pasal_demi_pasal,
         law,
         start_index+1,
@@ -2048,6 +2288,7 @@ def parse_penjelasan_pasal_demi_pasal(parent: ComplexNode, law: List[str], start
     return end_index
 
 
+@register_parser(Structure.UNORDERED_LIST)
 def parse_unordered_list(parent: ComplexNode, law: List[str], start_index: int) -> int:
     unordered_list_node = ComplexNode(type=Structure.UNORDERED_LIST)
     parent.add_child(unordered_list_node)
@@ -2088,6 +2329,7 @@ def parse_unordered_list(parent: ComplexNode, law: List[str], start_index: int)
     return end_index
 
 
+@register_parser(Structure.FORMATTED_MATH_ROW)
 def parse_formatted_math_row(parent: ComplexNode, law: List[str], start_index: int) -> int:
     formatted_math_row_node = ComplexNode(type=Structure.FORMATTED_MATH_ROW)
     parent.add_child(formatted_math_row_node)
@@ -2131,13 +2373,14 @@ PARSE_X GENERIC FUNCTIONS
 '''
 
 
+@parser_frame
 def parse_structure(
     parent: ComplexNode,
     structure: Structure,
     law: List[str],
     start_index: int,
     perubahan_section_end_index: int = -1,
-) -> int:
+) -> ParseFrame:
     """
     Construct a subtree of node(s) that represents a particular section of the law,
     where the structure - in other words, the type of the section - (e.g LIST, BAB, PASAL) is 
@@ -2155,94 +2398,34 @@ def parse_structure(
     Returns:
         int: the end_index; i.e law[end_index] is the last line of the structures we want to parse
     """
-    if structure in PRIMITIVE_STRUCTURES:
-        parent.add_child(PrimitiveNode(type=structure, text=law[start_index]))
-        end_index = start_index
-        return end_index
-
-    elif structure == Structure.BAB:
-        return parse_bab(parent, law, start_index)
-    elif structure == Structure.PASAL:
-        return parse_pasal(parent, law, start_index)
-    elif structure == Structure.PERUBAHAN_SECTION:
-        return parse_perubahan_section(parent, law, start_index)
-    elif structure == Structure.PERUBAHAN_PASAL:
-        return parse_perubahan_pasal(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.PERUBAHAN_BAB:
-        return parse_perubahan_bab(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.PERUBAHAN_BAGIAN:
-        return parse_perubahan_bagian(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.PENJELASAN_PERUBAHAN_SECTION:
-        return parse_penjelasan_perubahan_section(parent, law, start_index)
-    elif structure == Structure.PENJELASAN_PERUBAHAN_PASAL:
-        return parse_penjelasan_perubahan_pasal(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.PENJELASAN_PERUBAHAN_BAB:
-        return parse_penjelasan_perubahan_bab(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.PENJELASAN_PERUBAHAN_BAGIAN:
-        return parse_penjelasan_perubahan_bagian(
-            parent,
-            law,
-            start_index,
-            perubahan_section_end_index,
-        )
-    elif structure == Structure.BAGIAN:
-        return parse_bagian(parent, law, start_index)
-    elif structure == Structure.PARAGRAF:
-        return parse_paragraf(parent, law, start_index)
-    elif structure == Structure.LIST:
-        return parse_list(parent, law, start_index)
-    elif structure == Structure.LIST_ITEM:
-        return parse_list_item(parent, law, start_index)
-    elif structure == Structure.LIST_INDEX:
-        parse_list_index(parent, law, start_index)
-        end_index = start_index
-        return end_index
-    elif structure == Structure.CLOSING:
-        return parse_closing(parent, law, start_index)
-    elif structure == Structure.PENJELASAN:
-        return parse_penjelasan(parent, law, start_index)
-    elif structure == Structure.PENJELASAN_UMUM:
-        return parse_penjelasan_umum(parent, law, start_index)
-    elif structure == Structure.PENJELASAN_PASAL_DEMI_PASAL:
-        return parse_penjelasan_pasal_demi_pasal(parent, law, start_index)
-    elif structure == Structure.PENJELASAN_PASAL:
-        return parse_penjelasan_pasal(parent, law, start_index)
-    elif structure == Structure.PENJELASAN_LIST_ITEM:
-        return parse_penjelasan_list_item(parent, law, start_index)
-    elif structure == Structure.UNORDERED_LIST:
-        return parse_unordered_list(parent, law, start_index)
-    elif structure == Structure.FORMATTED_MATH_ROW:
-        return parse_formatted_math_row(parent, law, start_index)
-    else:
+    if structure not in STRUCTURE_PARSERS:
         crash(law, start_index, f'No function to parse {structure.value}')
         return -1  # only to satisfy mypy; will never run since we crash
 
+    parse_fn, takes_perubahan_section_end_index = STRUCTURE_PARSERS[structure]
+    if takes_perubahan_section_end_index:
+        return (yield call(parse_fn, parent, law, start_index, perubahan_section_end_index))
+
+    return (yield call(parse_fn, parent, law, start_index))
+
+
+def parse_primitive(structure: Structure, parent: ComplexNode, law: List[str], start_index: int) -> int:
+    """
+    Construct a primitive node of type structure whose text is law[start_index]
+
+    Returns:
+        int: the end_index, which is always start_index
+    """
+    parent.add_child(PrimitiveNode(type=structure, text=law[start_index]))
+    end_index = start_index
+    return end_index
+
+
+for primitive_structure in PRIMITIVE_STRUCTURES:
+    register_parser(primitive_structure)(partial(parse_primitive, primitive_structure))
+
 
+@parser_frame
 def parse_complex_structure(
     parent: ComplexNode,
     law: List[str],
@@ -2253,7 +2436,7 @@ def parse_complex_structure(
     # TODO(johnamadeo) - rename to next_sibling_structures?
     sibling_structures: List[Structure],
     child_structures: List[Structure],
-) -> int:
+) -> ParseFrame:
     """
     Given a complex parent node, construct a list of its child nodes.
 
@@ -2355,17 +2538,72 @@ def parse_complex_structure(
                 child_structure = maybe_child_structure
                 break
 
-        if child_structure == None:
-            crash(law, start_index,
-                  f'Cannot find structure for line {start_index}')
+        try:
+            if child_structure == None:
+                crash(law, start_index,
+                      f'Cannot find structure for line {start_index}')
+
+            assert child_structure is not None  # mypy type hint
+            end_index = yield call(parse_structure, parent, child_structure, law, start_index)
+        except ParseError as error:
+            if get_context().parse_errors is None:
+                raise
+
+            end_index = recover_from_parse_error(
+                error,
+                parent,
+                law,
+                start_index,
+                boundary_structures=ancestor_structures + sibling_structures + [
+                    s for s in [Structure.PASAL, Structure.BAB] if s in child_structures
+                ],
+            )
 
-        assert child_structure is not None  # mypy type hint
-        end_index = parse_structure(parent, child_structure, law, start_index)
         start_index = end_index + 1
 
     return end_index
 
 
+def recover_from_parse_error(
+    error: 'ParseError',
+    parent: ComplexNode,
+    law: List[str],
+    start_index: int,
+    boundary_structures: List[Structure],
+) -> int:
+    """Records error & skips past the lines that couldn't be parsed, so the parser can
+    carry on from the next line that marks the start of one of boundary_structures
+    (i.e the next PASAL or BAB, or the end of parent). The skipped lines are added to
+    parent as a PARSE_ERROR node.
+
+    Args:
+        error: the error raised while parsing the child of parent at law[start_index]
+        start_index: law[start_index] is the 1st line of the child that failed to parse
+
+    Returns:
+        int: the end_index; i.e law[end_index] is the last line that was skipped
+    """
+    parse_errors = get_context().parse_errors
+    assert parse_errors is not None
+    parse_errors.append(error)
+
+    # the child may have parsed some of its lines before failing
+    error_index = min(max(error.line_index, start_index), len(law)-1)
+
+    end_index = error_index
+    while end_index+1 < len(law) and \
+            not is_start_of_any(boundary_structures, law, end_index+1):
+        end_index += 1
+
+    parse_error_node = ComplexNode(type=Structure.PARSE_ERROR)
+    parent.add_child(parse_error_node)
+    for i in range(error_index, end_index+1):
+        parse_error_node.add_child(PrimitiveNode(
+            type=Structure.PLAINTEXT, text=law[i]))
+
+    return end_index
+
+
 '''
 -----------------
 
@@ -2376,61 +2614,297 @@ __MAIN__
 
 
 def print_tree() -> None:
-    if ROOT is None:
+    root = get_context().root
+    if root is None:
         print('ROOT=None')
     else:
-        print(json.dumps(convert_tree_to_json(ROOT, []), indent=2))
+        print(json.dumps(convert_tree_to_json(root, []), indent=2))
+
+
+def parse_law_tree(
+    law: List[str],
+    engine: str = 'recursive',
+    errors: Optional[List['ParseError']] = None,
+) -> ComplexNode:
+    """Parses a cleaned law into a tree. engine is 1 of PARSER_ENGINES; both build the
+    same tree.
+
+    If errors is a list, the parser doesn't stop at the 1st line it can't parse; it
+    adds the error to errors, puts the lines up to the next PASAL or BAB in a
+    PARSE_ERROR node & carries on (see recover_from_parse_error), so every error in
+    the law is found in 1 run.
+    """
+    context = get_context()
+    root = context.root = ComplexNode(type=Structure.UNDANG_UNDANG)
+
+    # so parsing the same law again asks (or replays) the same questions
+    reset_decision_occurrences()
+
+    context.parse_errors = errors
+    try:
+        if engine == 'recursive':
+            # same as running parse_undang_undang.frame with run_recursively, except
+            # that parser_profiler can still time parse_undang_undang
+            parse_undang_undang(root, law)
+        else:
+            PARSER_ENGINES[engine](parse_undang_undang.frame(root, law))  # type: ignore
+    except ParseError as error:
+        # an error outside of any structure the parser can recover in e.g the OPENING
+        if errors is None:
+            raise
+        errors.append(error)
+    finally:
+        context.parse_errors = None
+
+    return root
+
+
+def build_law(
+    law: List[str],
+    engine: str = 'recursive',
+    errors: Optional[List['ParseError']] = None,
+) -> Dict[str, Any]:
+    """Parses a cleaned law into the JSON object served by indolaw-nextjs
+
+    Args:
+        law: ordered list of strings that contain the text of the cleaned law
+        engine: see PARSER_ENGINES
+        errors: see parse_law_tree
+
+    Returns:
+        Dict[str, Any]: {'metadata': ..., 'content': ...}
+    """
+    root = parse_law_tree(law, engine=engine, errors=errors)
+    metadata = extract_metadata_from_tree(root)
+    content = convert_tree_to_json(root, get_ketentuan_umum_list(metadata))
+
+    return {
+        'metadata': metadata,
+        'content': content
+    }
+
+
+def write_law(
+    law: List[str],
+    outfile: TextIO,
+    compact: bool = False,
+    short_keys: bool = False,
+    engine: str = 'recursive',
+    errors: Optional[List['ParseError']] = None,
+) -> None:
+    """Same as json.dump(build_law(law), outfile, indent=2), but streams the
+    law tree into outfile rather than converting it to dicts first. See write_law_json
+    for compact & short_keys, and parse_law_tree for engine & errors.
+    """
+    root = parse_law_tree(law, engine, errors)
+    metadata = extract_metadata_from_tree(root)
+    write_law_json(
+        outfile,
+        metadata,
+        root,
+        get_ketentuan_umum_list(metadata),
+        compact=compact,
+        short_keys=short_keys,
+    )
+
+
+def parse_law(
+    text: str,
+    decisions: Optional[DecisionJournal] = None,
+    clean: bool = False,
+    engine: str = 'recursive',
+    errors: Optional[List['ParseError']] = None,
+) -> ComplexNode:
+    """Parses the text of a law into a tree, for using the parser as a library. The
+    user is never asked anything & nothing is printed or copied to the clipboard; every
+    question must already have been answered in decisions, or MissingDecisionError is
+    raised. The law's state is kept in a ParseContext of its own, so laws can be
+    parsed at the same time from several threads.
+
+    Args:
+        text: the text of the cleaned law e.g the contents of uu-2008-14-mod-clean.txt
+
+        decisions: the decisions made while the law was cleaned & parsed e.g
+        DecisionJournal('laws/uu-2008-14-mod-decisions.json', 'uu-2008-14-mod'). Only
+        read from, so the same journal can be passed to several calls at once.
+
+        clean: if True, text is the law before cleaning (e.g uu-2008-14-mod.txt) & is run
+        through every cleaning stage first
+
+        engine, errors: see parse_law_tree
+
+    Returns:
+        ComplexNode: the root of the law tree
+
+    Examples:
+        >>> root = parse_law(text, decisions=DecisionJournal(filename, law_id))
+        >>> convert_tree_to_json(root, [])
+        {'type': 'UNDANG_UNDANG', 'id': '', 'children': [...]}
+    """
+    # a journal of its own, so each call keeps count of its own occurrences
+    journal = DecisionJournal(
+        None,
+        '' if decisions is None else decisions.law_id,
+        replay_only=True,
+    )
+    if decisions is not None:
+        journal.decisions = decisions.decisions
+
+    with use_context(ParseContext(journal, interactive=False)):
+        law = text.split('\n')
+        if clean:
+            law = list(clean_law_stream(law))
+
+        return parse_law_tree(law, engine=engine, errors=errors)
+
+
+'''
+Where crash() dumps the law tree. The corpus build gives each law its own file since
+laws are parsed in parallel.
+'''
+CRASH_FILENAME = './crash.json'
+
+
+'''
+No. of lines before & after the line a ParseError is raised at that the error keeps
+'''
+PARSE_ERROR_CONTEXT_LINES = 2
+
+
+class ParseError(Exception):
+    """Raised by crash() when the parser can't parse law[line_index]. Keeps the lines
+    around law[line_index], so the error can still be reported after the law is gone.
+    """
+
+    def __init__(self, message: str, law: List[str], line_index: int):
+        super().__init__(message)
+        self.message = message
+        self.line_index = line_index
+        self.context_start = max(line_index - PARSE_ERROR_CONTEXT_LINES, 0)
+        self.context = [
+            str(line) for line in
+            law[self.context_start:line_index + PARSE_ERROR_CONTEXT_LINES + 1]
+        ]
+
+
+def format_parse_errors(errors: List[ParseError]) -> str:
+    """e.g
+
+    2 parse errors
+    --------------
+    [1] line 120: Cannot find structure for line 120
+          119 | Pasal 12
+        > 120 | Badan Publik wajib
+          121 | (1)
+    ...
+    """
+    if len(errors) == 0:
+        return '0 parse errors'
+
+    header = f'{len(errors)} parse error{"s" if len(errors) > 1 else ""}'
+    report = [header, '-' * len(header)]
+    for n, error in enumerate(errors, 1):
+        report.append(f'[{n}] line {error.line_index}: {error.message}')
+        for i, line in enumerate(error.context, error.context_start):
+            marker = '>' if i == error.line_index else ' '
+            report.append(f'    {marker} {i} | {line}')
+
+    return '\n'.join(report)
 
 
 def crash(law: List[str], i: int, error_message: str) -> None:
+    context = get_context()
+    if context.parse_errors is not None or not context.interactive:
+        # the error is either recovered from & reported along with the rest, or handed
+        # to the caller of parse_law
+        raise ParseError(error_message, law, i)
+
     print_around(law, i)
 
-    if ROOT is not None:
-        with open('./crash.json', 'w') as outfile:
+    if context.root is not None:
+        with open(CRASH_FILENAME, 'w') as outfile:
             json.dump(
-                convert_tree_to_json(ROOT, []),
+                convert_tree_to_json(context.root, []),
                 outfile,
                 indent=2
             )
 
-    raise Exception(error_message)
+    raise ParseError(error_message, law, i)
 
 
 if __name__ == "__main__":
     if len(sys.argv) < 2:
-        print('e.g python3 parser.py uu_18_2017')
+        print('e.g python3 parser.py uu_18_2017 [-c/--clean] [-b/--batch] [-p/--profile] [-s/--stack] [-r/--recover]')
         exit()
 
     filename = sys.argv[1]
     if filename.endswith('.txt'):
         filename = filename.strip('.txt')
 
-    law = load_clean_law(filename)
+    flags = sys.argv[2:]
 
-    if len(sys.argv) >= 3 and sys.argv[2] in ['-c', '--clean']:
-        exit()
-
-    ROOT = ComplexNode(type=Structure.UNDANG_UNDANG)
-    parse_undang_undang(ROOT, law)
-
-    assert ROOT is not None
+    '''
+    Answers to the questions asked while cleaning & parsing are recorded in
+    e.g uu_18_2017-decisions.json. In batch mode, every answer is replayed from it
+    and the law is re-cleaned without asking the user anything.
+    '''
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(filename),
+        path.basename(filename),
+        replay_only=any(flag in ['-b', '--batch'] for flag in flags),
+    ))
 
-    metadata = extract_metadata_from_tree(ROOT)
+    law = load_clean_law(filename)
 
-    ketentuan_umum_list = []
+    if any(flag in ['-c', '--clean'] for flag in flags):
+        exit()
 
-    if 'ketentuan_umum' in metadata:
-        ketentuan_umum_list = sorted(
-            metadata['ketentuan_umum'].keys(), key=lambda x: len(x), reverse=True)
+    '''
+    When profiling, the time spent in each is_start_of_x & parse_x function and each
+    Structure is written to e.g uu_18_2017-profile.txt. See parser_profiler.
+    '''
+    profiler = None
+    if any(flag in ['-p', '--profile'] for flag in flags):
+        profiler = Profiler()
+        profiler.num_lines = len(law)
+        profiler.enable(get_parser_modules(sys.modules[__name__]))
 
-    content = convert_tree_to_json(ROOT, ketentuan_umum_list)
+    # parse with the stack engine instead of the recursive one; see PARSER_ENGINES
+    engine = 'recursive'
+    if any(flag in ['-s', '--stack'] for flag in flags):
+        engine = 'stack'
 
-    with open(filename + '.json', 'w') as outfile:
-        json.dump(
-            {
-                'metadata': metadata,
-                'content': content
-            },
-            outfile,
-            indent=2
-        )
+    '''
+    In recover mode, the parser doesn't stop at the 1st line it can't parse; every
+    error is reported at the end. indolaw-nextjs doesn't know about PARSE_ERROR nodes,
+    so if there are any errors the partly parsed law is written to
+    e.g uu_18_2017-recovered.json instead, & uu_18_2017.json is left as it was.
+    '''
+    errors: Optional[List[ParseError]] = None
+    output_filename = filename + '.json'
+    if any(flag in ['-r', '--recover'] for flag in flags):
+        errors = []
+        output_filename = filename + '-recovered.json'
+
+    start = time.perf_counter()
+    try:
+        # if the law can't be parsed, the last JSON that was built is kept
+        with open_atomically(output_filename) as outfile:
+            write_law(law, outfile, engine=engine, errors=errors)
+    finally:
+        if errors is not None:
+            print(format_parse_errors(errors))
+
+    if profiler is not None:
+        profiler.seconds = time.perf_counter() - start
+        profiler.disable()
+        with open(filename + '-profile.txt', 'w') as outfile:
+            outfile.write(format_profile(
+                f'law: {path.basename(filename)}', profiler))
+
+    if errors is not None:
+        if len(errors) > 0:
+            print(f'The partly parsed law was written to {output_filename}')
+            exit(1)
+
+        os.replace(output_filename, filename + '.json')
@@ -0,0 +1,404 @@
+import argparse
+import importlib
+import inspect
+import io
+import os
+import sys
+import time
+from contextlib import redirect_stdout
+from functools import wraps
+from os import path
+from types import ModuleType
+from typing import Any, Callable, Dict, List, NamedTuple, Optional, Tuple
+
+from parser_decisions import (
+    DecisionJournal,
+    get_decision_journal_filename,
+    set_decision_journal,
+)
+
+PARSER_DIRECTORY = path.dirname(path.abspath(__file__))
+PROFILE_DIRECTORY = path.join(PARSER_DIRECTORY, 'build', 'profile')
+
+'''
+Every module-level function whose name starts with one of these is timed, along with
+the functions in PROFILED_FUNCTIONS
+'''
+PROFILED_FUNCTION_PREFIXES = ['is_start_of_', 'parse_', 'get_squashed_']
+PROFILED_FUNCTIONS = [
+    'detect_structure',
+    'extract_metadata_from_tree',
+    'convert_tree_to_json',
+    'write_law_json',
+    'link_ketentuan_umum',
+]
+
+'''
+Classes whose constructor is timed e.g ClassifiedLaw runs the is_start_of_x function of
+every structure on every line of the law
+'''
+PROFILED_CLASSES = ['ClassifiedLaw']
+
+
+class CallStats:
+    def __init__(self):
+        self.calls = 0
+        # time spent in the outermost call of a function, so recursive calls (e.g a LIST
+        # nested in a LIST) aren't counted twice
+        self.total_seconds = 0.0
+        # total_seconds minus the time spent in other timed functions it called
+        self.self_seconds = 0.0
+        # no. of calls in progress
+        self.depth = 0
+
+    def add(self, other: 'CallStats'):
+        self.calls += other.calls
+        self.total_seconds += other.total_seconds
+        self.self_seconds += other.self_seconds
+
+
+def get_sorted_stats(stats: Dict[str, CallStats]) -> List[Tuple[str, CallStats]]:
+    """Most expensive first, by time spent in the function itself
+    """
+    return sorted(
+        [(name, call_stats) for name, call_stats in stats.items() if call_stats.calls > 0],
+        key=lambda item: item[1].self_seconds,
+        reverse=True,
+    )
+
+
+def add_stats(stats: Dict[str, CallStats], other: Dict[str, CallStats]):
+    for name, call_stats in other.items():
+        stats.setdefault(name, CallStats()).add(call_stats)
+
+
+class Profiler:
+    """Times every is_start_of_x, parse_x & JSON conversion function while enabled, as well
+    as the is_start_of_x & parse_x function of each Structure (through STRUCTURE_DETECTORS,
+    CLASSIFIERS and STRUCTURE_PARSERS).
+
+    The functions are timed by replacing them in the modules they're defined in or imported
+    into, so parsing runs as usual; disable() puts the original functions back.
+
+    Timing a call costs about a microsecond, which adds up over the 100,000s of
+    is_start_of_x calls made while parsing a law. The cost is measured once & taken off
+    the times of each call & its caller, so it doesn't show up as time spent in e.g
+    ClassifiedLaw.__init__.
+    """
+
+    def __init__(self):
+        self.functions: Dict[str, CallStats] = {}
+        self.detectors: Dict[str, CallStats] = {}
+        self.parsers: Dict[str, CallStats] = {}
+        self.seconds = 0.0
+        self.num_lines = 0
+        # the time spent in the timed functions called by each call in progress
+        self.child_seconds: List[float] = []
+        # see measure_overhead
+        self.inner_overhead_seconds = 0.0
+        self.outer_overhead_seconds = 0.0
+        # (module/class or registry, name or key, original value) of everything replaced
+        self.patches: List[Tuple[Any, Any, Any]] = []
+
+    def wrap(self, fn: Callable[..., Any], *all_stats: CallStats) -> Callable[..., Any]:
+        """Returns fn, except that every call is added to all_stats
+        """
+        child_seconds = self.child_seconds
+
+        @wraps(fn)
+        def timed_fn(*args, **kwargs):
+            for stats in all_stats:
+                stats.depth += 1
+            child_seconds.append(0.0)
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                seconds = time.perf_counter() - start
+                self_seconds = seconds - child_seconds.pop() - self.inner_overhead_seconds
+                for stats in all_stats:
+                    stats.depth -= 1
+                    stats.calls += 1
+                    stats.self_seconds += self_seconds
+                    if stats.depth == 0:
+                        stats.total_seconds += seconds
+                if len(child_seconds) > 0:
+                    child_seconds[-1] += seconds + self.outer_overhead_seconds
+
+        return timed_fn
+
+    def measure_overhead(self, num_calls: int = 100000):
+        """Measures how much of the cost of timing a call is counted as part of the call
+        (inner) & how much is counted as part of its caller (outer)
+        """
+        def noop():
+            pass
+
+        stats = CallStats()
+        timed_noop = self.wrap(noop, stats)
+
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            noop()
+        noop_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        for _ in range(num_calls):
+            timed_noop()
+        timed_noop_seconds = time.perf_counter() - start
+
+        self.inner_overhead_seconds = stats.total_seconds / num_calls
+        self.outer_overhead_seconds = max(
+            (timed_noop_seconds - noop_seconds - stats.total_seconds) / num_calls, 0.0)
+
+    def patch(self, container: Any, key: Any, value: Any):
+        if isinstance(container, (dict, list)):
+            self.patches.append((container, key, container[key]))
+            container[key] = value
+        else:
+            self.patches.append((container, key, getattr(container, key)))
+            setattr(container, key, value)
+
+    def enable(self, modules: List[ModuleType]):
+        self.measure_overhead()
+
+        timed_fns: Dict[int, Callable[..., Any]] = {}
+        for module in modules:
+            for name, value in list(vars(module).items()):
+                if not is_profiled_function(name, value):
+                    continue
+
+                if id(value) not in timed_fns:
+                    timed_fns[id(value)] = self.wrap(
+                        value, self.functions.setdefault(name, CallStats()))
+                self.patch(module, name, timed_fns[id(value)])
+
+            for name in PROFILED_CLASSES:
+                cls = getattr(module, name, None)
+                if cls is not None and cls.__module__ == module.__name__:
+                    self.patch(cls, '__init__', self.wrap(
+                        cls.__init__,
+                        self.functions.setdefault(f'{name}.__init__', CallStats()),
+                    ))
+
+        def wrap_structure_fn(fn: Callable[..., Any], structure_stats: CallStats):
+            '''
+            fn is also counted against its own name, unless it isn't a named function
+            e.g the partial parse_primitive is registered with
+            '''
+            name = getattr(fn, '__name__', None)
+            if name is None:
+                return self.wrap(fn, structure_stats)
+            return self.wrap(fn, structure_stats, self.functions.setdefault(name, CallStats()))
+
+        for module in modules:
+            detectors = getattr(module, 'STRUCTURE_DETECTORS', None)
+            if detectors is not None:
+                for structure, detector in list(detectors.items()):
+                    self.patch(detectors, structure, wrap_structure_fn(
+                        detector, self.detectors.setdefault(structure.name, CallStats())))
+
+                # the is_start_of_x functions a ClassifiedLaw is built with
+                classifiers = getattr(module, 'CLASSIFIERS')
+                for i, structure in enumerate(getattr(module, 'CLASSIFIABLE_STRUCTURES')):
+                    bit, _ = classifiers[i]
+                    self.patch(classifiers, i, (bit, detectors[structure]))
+
+            parsers = getattr(module, 'STRUCTURE_PARSERS', None)
+            if parsers is not None:
+                for structure, (parse_fn, takes_end_index) in list(parsers.items()):
+                    timed_parse_fn = wrap_structure_fn(
+                        parse_fn, self.parsers.setdefault(structure.name, CallStats()))
+                    self.patch(parsers, structure, (timed_parse_fn, takes_end_index))
+
+    def disable(self):
+        while len(self.patches) > 0:
+            container, key, value = self.patches.pop()
+            if isinstance(container, (dict, list)):
+                container[key] = value
+            else:
+                setattr(container, key, value)
+
+    def add(self, other: 'Profiler'):
+        add_stats(self.functions, other.functions)
+        add_stats(self.detectors, other.detectors)
+        add_stats(self.parsers, other.parsers)
+        self.seconds += other.seconds
+        self.num_lines += other.num_lines
+
+
+def is_profiled_function(name: str, value: Any) -> bool:
+    if not callable(value) or inspect.isclass(value):
+        return False
+
+    return name in PROFILED_FUNCTIONS or \
+        any(name.startswith(prefix) for prefix in PROFILED_FUNCTION_PREFIXES)
+
+
+def get_parser_modules(parser_main_module: Optional[ModuleType] = None) -> List[ModuleType]:
+    """The modules the Profiler should patch. parser_main_module should be passed in
+    when parser_main is run as a script, since it is then __main__ rather than parser_main.
+    """
+    if parser_main_module is None:
+        parser_main_module = importlib.import_module('parser_main')
+
+    return [
+        parser_main_module,
+        importlib.import_module('parser_is_start_of_x'),
+        importlib.import_module('parser_utils'),
+    ]
+
+
+def format_profile(title: str, profiler: Profiler, top: Optional[int] = None) -> str:
+    """A report of where the time profiler measured went, most expensive first
+    """
+    lines = [
+        title,
+        f'lines: {profiler.num_lines}  seconds: {profiler.seconds:.3f}  '
+        f'lines/sec: {profiler.num_lines / max(profiler.seconds, 1e-9):.0f}',
+        '',
+        f'{"function":<50}{"calls":>10}{"total s":>10}{"self s":>10}{"self %":>8}',
+    ]
+    for name, stats in get_sorted_stats(profiler.functions)[:top]:
+        lines.append(
+            f'{name:<50}{stats.calls:>10}{stats.total_seconds:>10.3f}'
+            f'{stats.self_seconds:>10.3f}'
+            f'{stats.self_seconds / max(profiler.seconds, 1e-9) * 100:>7.1f}%'
+        )
+
+    lines.extend([
+        '',
+        f'{"structure":<40}{"detect calls":>14}{"detect s":>10}'
+        f'{"parse calls":>13}{"parse total s":>15}{"parse self s":>14}',
+    ])
+    structures = set(profiler.detectors.keys()) | set(profiler.parsers.keys())
+
+    def get_stats(stats: Dict[str, CallStats], structure: str) -> CallStats:
+        return stats.get(structure, CallStats())
+
+    def get_cost(structure: str) -> float:
+        return get_stats(profiler.detectors, structure).total_seconds + \
+            get_stats(profiler.parsers, structure).self_seconds
+
+    for structure in sorted(structures, key=get_cost, reverse=True)[:top]:
+        detector = get_stats(profiler.detectors, structure)
+        parser = get_stats(profiler.parsers, structure)
+        if detector.calls == 0 and parser.calls == 0:
+            continue
+
+        lines.append(
+            f'{structure:<40}{detector.calls:>14}{detector.total_seconds:>10.3f}'
+            f'{parser.calls:>13}{parser.total_seconds:>15.3f}{parser.self_seconds:>14.3f}'
+        )
+
+    return '\n'.join(lines) + '\n'
+
+
+class LawProfile(NamedTuple):
+    law_id: str
+    profiler: Profiler
+    # None if the law was parsed successfully
+    error: Optional[str]
+
+
+def profile_law(clean_filename: str) -> LawProfile:
+    """Parses a cleaned law (replaying any decisions from its journal) & converts it to
+    JSON while timing every function the Profiler knows about
+    """
+    # imported here since parser_main imports this module
+    import parser_main
+    from parser_corpus import get_law_filename
+    from parser_utils import read_clean_law
+
+    law_filename = get_law_filename(clean_filename)
+    law_id = path.basename(law_filename)
+    set_decision_journal(DecisionJournal(
+        get_decision_journal_filename(law_filename),
+        law_id,
+        replay_only=True,
+    ))
+
+    law = read_clean_law(clean_filename)
+    profiler = Profiler()
+    profiler.num_lines = len(law)
+    error = None
+
+    profiler.enable(get_parser_modules(parser_main))
+    start = time.perf_counter()
+    try:
+        # the parser prints context for debugging whenever it crashes
+        with redirect_stdout(io.StringIO()), open(os.devnull, 'w') as outfile:
+            parser_main.write_law(law, outfile)
+    except Exception as e:
+        error = f'{type(e).__name__}: {e}'
+    finally:
+        profiler.seconds = time.perf_counter() - start
+        profiler.disable()
+        set_decision_journal(None)
+
+    return LawProfile(law_id, profiler, error)
+
+
+def profile_corpus(clean_filenames: List[str], output_directory: str, top: int) -> Profiler:
+    """Profiles every law in clean_filenames one after another, writing a report for each
+    law & one for the whole corpus to output_directory
+
+    Returns:
+        Profiler: the combined profile of every law
+    """
+    os.makedirs(output_directory, exist_ok=True)
+
+    corpus_profiler = Profiler()
+    num_failed = 0
+    for i, clean_filename in enumerate(clean_filenames):
+        law_profile = profile_law(clean_filename)
+        corpus_profiler.add(law_profile.profiler)
+
+        title = f'law: {law_profile.law_id}'
+        if law_profile.error is not None:
+            num_failed += 1
+            title += f' (failed: {law_profile.error})'
+
+        with open(path.join(output_directory, f'{law_profile.law_id}-profile.txt'), 'w') as outfile:
+            outfile.write(format_profile(title, law_profile.profiler))
+
+        status = 'ok' if law_profile.error is None else 'failed'
+        print(f'[{i + 1}/{len(clean_filenames)}] {law_profile.law_id:<40}'
+              f'{law_profile.profiler.seconds:>8.2f}s  {status}', file=sys.stderr)
+
+    '''
+    Laws that failed to parse are still counted, since the time spent on them up to the
+    point they failed was spent all the same
+    '''
+    title = f'corpus: {len(clean_filenames)} laws ({num_failed} failed)'
+    report = format_profile(title, corpus_profiler, top)
+    with open(path.join(output_directory, 'corpus-profile.txt'), 'w') as outfile:
+        outfile.write(format_profile(title, corpus_profiler))
+    print(report)
+
+    return corpus_profiler
+
+
+if __name__ == '__main__':
+    from parser_utils import LAWS_DIRECTORY, get_clean_law_filenames
+
+    parser = argparse.ArgumentParser(
+        description='Counts calls & time spent in every is_start_of_x & parse_x function '
+        'and every Structure while parsing the cleaned laws')
+    parser.add_argument(
+        'laws',
+        nargs='*',
+        help='cleaned laws to profile e.g laws/uu-2008-14-mod-clean.txt; defaults to every cleaned law',
+    )
+    parser.add_argument('--laws-directory', default=LAWS_DIRECTORY)
+    parser.add_argument('-o', '--output-directory', default=PROFILE_DIRECTORY)
+    parser.add_argument(
+        '--top',
+        type=int,
+        default=25,
+        help='no. of functions & structures printed for the whole corpus; the reports written to the output directory list all of them',
+    )
+    args = parser.parse_args()
+
+    clean_filenames = args.laws or get_clean_law_filenames(args.laws_directory)
+    profile_corpus(clean_filenames, args.output_directory, args.top)
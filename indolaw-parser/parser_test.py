@@ -1,11 +1,24 @@
-from parser_types import Structure, ComplexNode, PrimitiveNode
+from parser_types import Structure, ComplexNode, Line, PrimitiveNode
 from parser_utils import (
+    LAWS_DIRECTORY,
+    CleaningStageOrder,
+    clean_law,
+    clean_law_at_stage,
+    clean_law_stream,
+    iter_preclean_law,
     clean_maybe_squashed_heading,
     clean_split_lines_between_pages,
     clean_split_pasal_number,
     clean_whitespace,
+    convert_tree_to_json,
+    get_clean_law_filenames,
     get_id,
+    get_parent_node,
+    find_squashed_heading_start,
+    find_squashed_list_item_start,
     get_squashed_list_item,
+    SQUASHED_HEADING_START_REGEXES,
+    SQUASHED_LIST_ITEM_START_REGEXES,
     ignore_line,
     get_list_index_type,
     get_list_index_as_num,
@@ -15,13 +28,30 @@ from parser_utils import (
     insert_perubahan_section_open_quotes,
     is_alphanumeric_list_index,
     is_next_list_index_number,
+    is_x_an_ancestor,
     is_page_number,
+    ListIndex,
+    parse_list_index_str,
+    load_clean_law,
+    read_clean_law,
+    write_law_lines,
     roman_to_int,
+    TermLinker,
+    write_law_json,
     clean_maybe_list_item,
     is_word_part_of_text,
     clean_squashed_page_numbers
 )
 from parser_is_start_of_x import (
+    HEADING_PATTERNS,
+    HEADING_REGEXES,
+    LINE_ENDING_REGEXES,
+    LIST_INDEX_DEFINITIONS,
+    CLASSIFIABLE_STRUCTURES,
+    ClassifiedLaw,
+    compile_heading,
+    STRUCTURE_DETECTORS,
+    detect_structure,
     is_heading,
     is_start_of_closing,
     is_start_of_first_list_index,
@@ -70,9 +100,53 @@ from parser_is_start_of_x import (
     is_start_of_opening,
     is_start_of_undang_undang,
     is_start_of_any,
+    is_start_of_any_other_structure,
     is_start_of_structure
 )
+from parser_checkpoints import CheckpointStore
+from parser_decisions import (
+    DecisionJournal,
+    MissingDecisionError,
+    forget_decisions,
+    reset_decision_occurrences,
+    set_decision_journal,
+)
+from parser_corpus import (
+    build_corpus,
+    build_law_file,
+    check_law_file,
+    find_first_difference,
+    get_changed_laws,
+    get_law_filename,
+    is_up_to_date,
+    load_manifest,
+)
+from parser_benchmark import benchmark_law, compare_benchmarks, get_percentile
+from parser_profiler import format_profile, profile_law
+from parser_main import (
+    STRUCTURE_PARSERS,
+    ParseError,
+    ParseFrame,
+    build_law,
+    call,
+    format_parse_errors,
+    parse_law,
+    parse_law_tree,
+    parse_structure,
+    parser_frame,
+    run_on_stack,
+    write_law,
+)
+from concurrent.futures import ThreadPoolExecutor
+from os import path
+import glob
+import io
+import json
+import re
+import subprocess
+import sys
 import pytest
+import timeit
 
 
 def test_roman_to_int():
@@ -86,6 +160,29 @@ def test_is_heading():
     assert not is_heading('BAB [0-9]+', 'dengan BAB 23   ')
     assert not is_heading('BAB [0-9]+', '  asdf   ')
 
+    pattern = compile_heading('BAB [0-9]+')
+    assert compile_heading('BAB [0-9]+') is pattern
+    assert is_heading(pattern, '  BAB 23   ')
+    assert not is_heading(pattern, 'dengan BAB 23   ')
+
+
+def test_heading_patterns():
+    assert set(LIST_INDEX_DEFINITIONS.keys()).issubset(HEADING_PATTERNS.keys())
+    assert HEADING_PATTERNS.keys() == HEADING_REGEXES.keys()
+
+    for structure, regex in HEADING_REGEXES.items():
+        assert HEADING_PATTERNS[structure] is compile_heading(regex)
+
+    assert is_heading(HEADING_PATTERNS[Structure.PASAL_NUMBER], 'Pasal 12A')
+    assert is_heading(HEADING_PATTERNS[Structure.PERUBAHAN_PASAL], '“Pasal 12A')
+    assert is_heading(HEADING_PATTERNS[Structure.UNORDERED_LIST_INDEX], '\u2212')
+    assert is_heading(HEADING_PATTERNS[Structure.UNORDERED_LIST_INDEX], '-')
+    assert is_heading(HEADING_PATTERNS[Structure.PENJELASAN_UMUM_TITLE], 'I. UMUM')
+    assert is_heading(
+        HEADING_PATTERNS[Structure.PENJELASAN_UMUM_TITLE], 'PENJELASAN UMUM')
+    assert not is_heading(
+        HEADING_PATTERNS[Structure.PENJELASAN_UMUM_TITLE], 'UMUM PENJELASAN')
+
 
 def test_ignore_line():
     assert ignore_line('. . .')
@@ -141,6 +238,37 @@ def test_is_next_list_index_number(monkeypatch):
     assert is_next_list_index_number('(13f)', '(14)') == True
 
 
+def test_decision_journal(monkeypatch, tmp_path):
+    filename = str(tmp_path / 'uu-2099-1-decisions.json')
+    answers = iter(['y', 'n'])
+    monkeypatch.setattr('builtins.input', lambda: next(answers))
+
+    set_decision_journal(DecisionJournal(filename, 'uu-2099-1'))
+    try:
+        assert is_next_list_index_number('(13f)', '(13g)') == True
+        # same question asked a 2nd time is a separate decision
+        assert is_next_list_index_number('(13f)', '(13g)') == False
+
+        # a later run replays the answers in order without asking
+        monkeypatch.setattr('builtins.input', lambda: pytest.fail('asked'))
+        set_decision_journal(DecisionJournal(
+            filename, 'uu-2099-1', replay_only=True))
+        assert is_next_list_index_number('(13f)', '(13g)') == True
+        assert is_next_list_index_number('(13f)', '(13g)') == False
+
+        with pytest.raises(MissingDecisionError):
+            is_next_list_index_number('(13f)', '(13g)')
+        with pytest.raises(MissingDecisionError):
+            is_next_list_index_number('(13g)', '(13h)')
+
+        reset_decision_occurrences()
+        forget_decisions(['is_next_list_index_number'])
+        with pytest.raises(MissingDecisionError):
+            is_next_list_index_number('(13f)', '(13g)')
+    finally:
+        set_decision_journal(None)
+
+
 def test_is_alphanumeric_list_index():
     assert is_alphanumeric_list_index('5.') == False
     assert is_alphanumeric_list_index('5f.') == True
@@ -158,6 +286,60 @@ def test_is_alphanumeric_list_index():
     assert is_alphanumeric_list_index('Angka 5f') == True
 
 
+def test_parse_list_index_str():
+    assert parse_list_index_str('d.') == ListIndex(Structure.LETTER_WITH_DOT, 4, False)
+    assert parse_list_index_str(' (12) ') == \
+        ListIndex(Structure.NUMBER_WITH_BRACKETS, 12, False)
+    assert parse_list_index_str('Huruf k') == \
+        ListIndex(Structure.PENJELASAN_HURUF, 11, False)
+    assert parse_list_index_str('Ayat (8d)') == \
+        ListIndex(Structure.PENJELASAN_AYAT, None, True)
+    assert parse_list_index_str('a. cara berpikir kreatif') == None
+    assert parse_list_index_str('Berhubungan') == None
+
+    # each list index string is only parsed once
+    parse_list_index_str.cache_clear()
+    for _ in range(3):
+        assert parse_list_index_str('Angka 3') == \
+            ListIndex(Structure.PENJELASAN_ANGKA, 3, False)
+        assert get_list_index_type('Angka 3') == Structure.PENJELASAN_ANGKA
+        assert get_list_index_as_num('Angka 3') == 3
+    assert parse_list_index_str.cache_info().misses == 1
+
+
+def test_line():
+    line = Line('  Ketentuan Pasal 5 diubah sebagai berikut: ')
+    assert line == '  Ketentuan Pasal 5 diubah sebagai berikut: '
+    assert line.tokens == ['Ketentuan', 'Pasal', '5', 'diubah', 'sebagai', 'berikut:']
+    assert line.lowercase == '  ketentuan pasal 5 diubah sebagai berikut: '
+    assert line.is_all_caps == False
+    assert line.starts_with_lowercase == False
+    assert (line.first_token, line.last_token) == ('Ketentuan', 'berikut:')
+    assert line.trailing_punctuation == ':'
+
+    assert Line('BAB II').is_all_caps == True
+    assert Line('dan pemerintah daerah.”').trailing_punctuation == '”'
+    assert Line('Pasal 5A').trailing_punctuation == ''
+    assert Line('').tokens == []
+    assert (Line('').first_token, Line('').last_token) == ('', '')
+
+    # each property is only computed once
+    assert line.tokens is line.tokens
+    assert Line.of(line) is line
+    assert Line.from_tokens(['a.', 'asas']).tokens == Line('a. asas').tokens
+
+    # a Line can be passed to anything that takes a str line
+    assert is_start_of_closing(
+        [
+            Line('LEMBARAN NEGARA REPUBLIK INDONESIA TAHUN 2003 NOMOR 39'),
+            Line('Disahkan Di Jakarta,'),
+        ],
+        1,
+    ) == True
+    assert clean_maybe_list_item(Line('a. asas dan tujuan;'), 0, 0) == \
+        clean_maybe_list_item('a. asas dan tujuan;', 0, 0)
+
+
 def test_is_start_of_first_list_index():
     assert is_start_of_first_list_index('a.') == True
     assert is_start_of_first_list_index('b.') == False
@@ -577,6 +759,383 @@ def test_is_start_of_structure():
     ) == True
 
 
+def test_classified_law():
+    law = [
+        'BAB X',
+        'GUGATAN KE PENGADILAN',
+        'Pasal 23',
+        '(1) Pengajuan gugatan dilakukan...',
+        '',
+        '\u2212 jumlah',
+        'Rp 1.000.000,00',
+    ]
+    classified_law = ClassifiedLaw(law)
+
+    assert classified_law == law
+    assert classified_law.get_structures(0) == [
+        Structure.BAB,
+        Structure.BAB_NUMBER,
+        Structure.PERUBAHAN_BAB,
+        Structure.PENJELASAN_PERUBAHAN_BAB,
+    ]
+
+    for i in range(len(law)):
+        for structure in Structure:
+            if structure == Structure.FORMATTED_MATH_ROW:
+                continue
+            if structure == Structure.PLAINTEXT and i == len(law)-1:
+                continue
+
+            try:
+                expected = detect_structure(structure, law, i)
+            except Exception as e:
+                with pytest.raises(type(e)):
+                    is_start_of_structure(structure, classified_law, i)
+                continue
+
+            assert is_start_of_structure(
+                structure, classified_law, i) == expected
+
+
+def test_is_start_of_any_other_structure():
+    '''
+    Check against going through every structure 1 by 1, for every line of every
+    cleaned law
+    '''
+    classifiers = [STRUCTURE_DETECTORS[s] for s in CLASSIFIABLE_STRUCTURES]
+
+    def is_start_of_any_other_structure_1_by_1(law, start_index):
+        for classifier in classifiers:
+            if classifier(law, start_index):
+                return True
+        return False
+
+    filenames = get_clean_law_filenames()
+    assert len(filenames) > 0
+
+    for filename in filenames:
+        law = read_clean_law(filename)
+        for i in range(len(law)):
+            try:
+                expected = is_start_of_any_other_structure_1_by_1(law, i)
+            except Exception as e:
+                with pytest.raises(type(e)):
+                    is_start_of_any_other_structure(law, i)
+                continue
+
+            assert is_start_of_any_other_structure(law, i) == expected, \
+                f'{filename} line {i}: {law[i]}'
+
+
+def test_build_law_file(tmp_path):
+    assert get_law_filename('laws/uu-2015-11-mod-clean.txt') == 'laws/uu-2015-11-mod'
+    assert get_law_filename('laws/uu_4_2020_clean.txt') == 'laws/uu_4_2020'
+
+    clean_filename = path.join(LAWS_DIRECTORY, 'uu-2015-11-mod-clean.txt')
+    result = build_law_file(clean_filename, str(tmp_path))
+    assert result.law_id == 'uu-2015-11-mod'
+    assert result.error is None
+    with open(tmp_path / 'uu-2015-11-mod.json') as file:
+        assert json.load(file) == build_law(read_clean_law(clean_filename))
+
+    # no user to ask while building the corpus
+    clean_filename = path.join(LAWS_DIRECTORY, 'uu-2019-15-clean.txt')
+    (tmp_path / 'uu-2019-15.json').write_text('{"previous": "build"}')
+    result = build_law_file(clean_filename, str(tmp_path))
+    assert result.error is not None
+    assert result.error.startswith('MissingDecisionError')
+
+    # a law that fails to build keeps its last output
+    assert (tmp_path / 'uu-2019-15.json').read_text() == '{"previous": "build"}'
+    assert not (tmp_path / 'uu-2019-15.json.tmp').exists()
+
+
+def test_profile_law():
+    detectors = dict(STRUCTURE_DETECTORS)
+    parsers = dict(STRUCTURE_PARSERS)
+
+    law_profile = profile_law(path.join(LAWS_DIRECTORY, 'uu-2015-11-mod-clean.txt'))
+    assert law_profile.error is None
+
+    profiler = law_profile.profiler
+    assert profiler.functions['parse_pasal'].calls == profiler.parsers['PASAL'].calls > 0
+    assert profiler.detectors['PASAL'].calls >= profiler.num_lines
+    assert profiler.functions['write_law_json'].calls == 1
+    for stats in profiler.functions.values():
+        assert stats.self_seconds <= stats.total_seconds + 1e-3
+
+    report = format_profile('law: uu-2015-11-mod', profiler)
+    assert 'parse_pasal' in report and 'PASAL' in report
+
+    # the original functions are put back once the law is profiled
+    assert STRUCTURE_DETECTORS == detectors
+    assert STRUCTURE_PARSERS == parsers
+
+
+def test_benchmark_law():
+    assert get_percentile([4, 1, 3, 2], 50) == 2.5
+    assert get_percentile([4, 1, 3, 2], 100) == 4
+    assert get_percentile([7], 90) == 7
+
+    benchmark = benchmark_law(
+        path.join(LAWS_DIRECTORY, 'uu-2015-11-mod-clean.txt'), repeat=1)
+    assert benchmark.error is None
+    assert benchmark.num_nodes > benchmark.num_lines > 0
+    assert set(benchmark.seconds.keys()) == {'parse', 'metadata', 'convert'}
+
+    def get_results(seconds: float):
+        return {'laws': {'uu-2015-11-mod': {'seconds': {
+            'parse': seconds, 'metadata': 1, 'convert': 1,
+        }}}}
+
+    assert compare_benchmarks(get_results(1.05), get_results(1), 0.1) == []
+    assert compare_benchmarks(get_results(1.2), get_results(1), 0.1) == ['parse']
+
+
+def test_find_first_difference():
+    def list_item(text):
+        return {'type': 'LIST_ITEM', 'children': [{'type': 'PLAINTEXT', 'text': text}]}
+
+    expected = {
+        'metadata': {'nomor': 3},
+        'content': {'type': 'UNDANG_UNDANG', 'children': [
+            {'type': 'BAB', 'id': 'bab-3', 'children': [
+                {'type': 'PASAL', 'id': 'pasal-12', 'children': [
+                    {'type': 'LIST', 'children': [
+                        list_item('a'), list_item('b'), list_item('c'),
+                    ]},
+                ]},
+            ]},
+        ]},
+    }
+    assert find_first_difference(expected, json.loads(json.dumps(expected))) is None
+
+    actual = json.loads(json.dumps(expected))
+    actual['content']['children'][0]['children'][0]['children'][0]['children'][2] = list_item('d')
+    assert find_first_difference(expected, actual) == \
+        'content/bab-3/pasal-12/LIST/LIST_ITEM[2]/PLAINTEXT: text: expected "c", got "d"'
+
+    actual['content']['children'][0]['children'][0]['children'][0]['children'].pop()
+    assert find_first_difference(expected, actual) == \
+        'content/bab-3/pasal-12/LIST: expected 3 children, got 2'
+
+    actual = json.loads(json.dumps(expected))
+    actual['metadata']['nomor'] = 4
+    assert find_first_difference(expected, actual) == \
+        'metadata/nomor: expected 3, got 4'
+
+
+def test_check_law_file():
+    result = check_law_file(path.join(LAWS_DIRECTORY, 'uu-2015-11-mod-clean.txt'))
+    assert result.error is None
+    assert result.difference is None
+
+
+def test_write_law_json():
+    law = read_clean_law(path.join(LAWS_DIRECTORY, 'uu-2009-4-mod-clean.txt'))
+    outfile = io.StringIO()
+    write_law(law, outfile)
+    expected = json.dumps(build_law(law), indent=2)
+    assert outfile.getvalue() == expected
+
+    outfile = io.StringIO()
+    write_law(law, outfile, compact=True)
+    assert outfile.getvalue() == json.dumps(build_law(law), separators=(',', ':'))
+
+    outfile = io.StringIO()
+    write_law(law, outfile, compact=True, short_keys=True)
+    short_law_json = json.loads(outfile.getvalue())
+    assert short_law_json['metadata'] == build_law(law)['metadata']
+    assert short_law_json['content']['t'] == 'UNDANG_UNDANG'
+    assert short_law_json['content']['c'][0]['c'][0]['c'][0]['x'] == law[0]
+
+    # deeper than the recursion limit
+    root = ComplexNode(type=Structure.UNDANG_UNDANG)
+    node = root
+    for _ in range(sys.getrecursionlimit() + 100):
+        child = ComplexNode(type=Structure.LIST)
+        node.add_child(child)
+        node = child
+    node.add_child(PrimitiveNode(type=Structure.PLAINTEXT, text='Setiap Orang'))
+
+    outfile = io.StringIO()
+    write_law_json(outfile, {}, root, ['SETIAP ORANG'])
+    assert outfile.getvalue().count('"type": "LIST"') == sys.getrecursionlimit() + 100
+    assert convert_tree_to_json(root, [])['type'] == 'UNDANG_UNDANG'
+
+
+def test_build_corpus(tmp_path, monkeypatch):
+    clean_filenames = [path.join(LAWS_DIRECTORY, 'uu-2015-11-mod-clean.txt')]
+    assert build_corpus(clean_filenames, str(tmp_path), jobs=1) == {}
+    manifest = load_manifest(str(tmp_path))
+    assert manifest['uu-2015-11-mod']['error'] is None
+
+    # nothing has changed, so nothing is rebuilt
+    monkeypatch.setattr('parser_corpus.build_law_file',
+                        lambda *args: pytest.fail('rebuilt'))
+    assert build_corpus(clean_filenames, str(tmp_path), jobs=1) == manifest
+    assert get_changed_laws(manifest, load_manifest(str(tmp_path))) == []
+
+    # editing the parser invalidates every law
+    assert not is_up_to_date(
+        manifest,
+        'uu-2015-11-mod',
+        manifest['uu-2015-11-mod']['input_hash'],
+        'changed',
+        str(tmp_path),
+    )
+
+
+def test_dispatch_through_registries(monkeypatch):
+    '''
+    is_start_of_structure & parse_structure call whichever is_start_of_x & parse_x
+    function is registered for the structure
+    '''
+    detected = []
+    for structure in list(STRUCTURE_DETECTORS.keys()):
+        monkeypatch.setitem(
+            STRUCTURE_DETECTORS,
+            structure,
+            lambda law, start_index, structure=structure: detected.append(structure),
+        )
+
+    parsed = []
+    for structure in list(STRUCTURE_PARSERS.keys()):
+        monkeypatch.setitem(
+            STRUCTURE_PARSERS,
+            structure,
+            (lambda parent, law, start_index, structure=structure:
+             parsed.append(structure) or start_index, False),
+        )
+
+    law = ['Pasal 1']
+    parent = ComplexNode(type=Structure.PASAL)
+    for structure in STRUCTURE_DETECTORS:
+        is_start_of_structure(structure, law, 0)
+    for structure in STRUCTURE_PARSERS:
+        assert parse_structure(parent, structure, law, 0) == 0
+
+    assert detected == list(STRUCTURE_DETECTORS.keys())
+    assert parsed == list(STRUCTURE_PARSERS.keys())
+
+
+def test_parser_engines():
+    for filename in ['uu-2015-11-mod-clean.txt', 'uu-2009-4-mod-clean.txt']:
+        law = read_clean_law(path.join(LAWS_DIRECTORY, filename))
+        assert build_law(law, engine='stack') == build_law(law)
+
+    @parser_frame
+    def parse_nested(depth: int) -> ParseFrame:
+        if depth == 0:
+            return 0
+        end_index = yield call(parse_nested, depth-1)
+        return end_index + 1
+
+    # deeper than the recursion limit
+    depth = sys.getrecursionlimit() + 100
+    assert run_on_stack(parse_nested.frame(depth)) == depth
+    with pytest.raises(RecursionError):
+        parse_nested(depth)
+
+
+def test_parse_errors(monkeypatch, tmp_path):
+    monkeypatch.setattr('parser_main.CRASH_FILENAME', str(tmp_path / 'crash.json'))
+
+    def count_nodes(node_json, structure):
+        count = 1 if node_json['type'] == structure.value else 0
+        for child in node_json.get('children', []):
+            count += count_nodes(child, structure)
+        return count
+
+    law = read_clean_law(path.join(LAWS_DIRECTORY, 'uu-2009-4-mod-clean.txt'))
+    expected = build_law(law)
+
+    # a line that can't be parsed after each of 3 PASALs
+    broken_law = list(law)
+    pasal_indexes = [i for i, line in enumerate(law) if line.startswith('Pasal ')]
+    error_indexes = [pasal_indexes[50] + 1, pasal_indexes[100] + 2, pasal_indexes[150] + 3]
+    for i in error_indexes:
+        broken_law.insert(i, 'z.')
+
+    with pytest.raises(ParseError) as error:
+        build_law(broken_law)
+    assert error.value.line_index == error_indexes[0]
+
+    for engine in ['recursive', 'stack']:
+        errors = []
+        actual = build_law(broken_law, engine=engine, errors=errors)
+
+        # every error is found in 1 run, & the parser carries on at the next PASAL
+        assert [error.line_index for error in errors] == error_indexes
+        assert count_nodes(actual['content'], Structure.PARSE_ERROR) == 3
+        assert count_nodes(actual['content'], Structure.PASAL) == \
+            count_nodes(expected['content'], Structure.PASAL)
+
+    assert format_parse_errors(errors).startswith('3 parse errors')
+    assert f'> {error_indexes[0]} | z.' in format_parse_errors(errors)
+
+    # recovering from errors doesn't change how a law without errors is parsed
+    errors = []
+    assert build_law(law, errors=errors) == expected
+    assert errors == []
+
+
+def test_parse_law(monkeypatch, capsys):
+    monkeypatch.setattr('builtins.input', lambda: pytest.fail('asked'))
+    monkeypatch.setattr('pyperclip.copy', lambda _: pytest.fail('copied'))
+
+    filenames = ['uu-2015-11-mod-clean.txt', 'uu-2009-4-mod-clean.txt']
+    texts = []
+    expected = []
+    for filename in filenames:
+        law = read_clean_law(path.join(LAWS_DIRECTORY, filename))
+        texts.append('\n'.join(law))
+        expected.append(convert_tree_to_json(parse_law_tree(law), []))
+    capsys.readouterr()
+
+    # laws parsed at the same time from several threads don't see each other's state
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        roots = list(executor.map(parse_law, texts * 4))
+    assert [convert_tree_to_json(root, []) for root in roots] == expected * 4
+    assert capsys.readouterr().out == ''
+
+    def insert_after(law, line, n, inserted_line):
+        i = law.index(line)
+        return law[:i+n] + [inserted_line] + law[i+n:]
+
+    # a question without a recorded decision is an error, rather than asking the user
+    law = insert_after(texts[1].split('\n'), 'Pasal 73', 2, 'z.')
+    with pytest.raises(MissingDecisionError) as error:
+        parse_law('\n'.join(law), decisions=DecisionJournal(None, 'uu-2009-4-mod'))
+    assert error.value.key.startswith('uu-2009-4-mod:')
+
+    # the parser doesn't print or dump the law tree when it crashes either
+    law = insert_after(texts[1].split('\n'), 'Pasal 37', 2, 'z.')
+    with pytest.raises(ParseError):
+        parse_law('\n'.join(law))
+    assert capsys.readouterr().out == ''
+
+
+def test_import_ui_modules_lazily():
+    '''
+    The parser is imported in a fresh process (like a corpus worker), which mustn't
+    import the modules that are only needed once the user is asked something
+    '''
+    code = '; '.join([
+        'import sys',
+        'import parser_main',
+        'print(" ".join(m for m in ["pyperclip", "termcolor", "colorama"] if m in sys.modules))',
+    ])
+    result = subprocess.run(
+        [sys.executable, '-c', code],
+        cwd=path.dirname(path.abspath(__file__)),
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    assert result.stdout.strip() == ''
+
+
 def test_get_squashed_list_item(monkeypatch):
     monkeypatch.setattr('builtins.input', lambda: "y")
 
@@ -589,6 +1148,56 @@ def test_get_squashed_list_item(monkeypatch):
         'Siang berakhir pukul 18.00. 28. 1 hari adalah waktu selama 24 jam.', 0, 0) == 28
 
 
+def test_find_squashed_start():
+    '''
+    Check against searching for every line ending + list index/heading pair 1 by 1 &
+    keeping the earliest match, for every line of every law in raw-laws/ (and what's
+    left of the line after each split, since the cleaning stages recurse on it)
+    '''
+    def find_squashed_start_1_by_1(patterns, line):
+        earliest_match = None
+        for pattern in patterns:
+            match = pattern.search(line)
+            if match is None:
+                continue
+
+            if (earliest_match is None) or match.start(0) < earliest_match.start(0):
+                earliest_match = match
+
+        return None if earliest_match is None else earliest_match.start(2)
+
+    assert find_squashed_list_item_start('nasi goreng; 3. bakmie ayam;') == 13
+    assert find_squashed_list_item_start('Pasal 3 ayat (1) huruf a; dan') == None
+    assert find_squashed_heading_start('sebagai berikut: Pasal 3') == 17
+    assert find_squashed_heading_start('Cukup jelas. Huruf b') == 13
+
+    filenames = glob.glob(path.join(path.dirname(__file__), 'raw-laws', '*.txt'))
+    assert len(filenames) > 0
+
+    lines = set()
+    for filename in filenames:
+        with open(filename, mode='r', encoding='utf-8-sig', errors='replace') as file:
+            lines.update(file.read().split('\n'))
+
+    for start_regexes, find_start in [
+        (SQUASHED_LIST_ITEM_START_REGEXES, find_squashed_list_item_start),
+        (SQUASHED_HEADING_START_REGEXES, find_squashed_heading_start),
+    ]:
+        patterns = [
+            re.compile(i + r'\s+(' + j + ')')
+            for i in LINE_ENDING_REGEXES for j in start_regexes
+        ]
+        for line in lines:
+            rest_of_line = line
+            while True:
+                expected = find_squashed_start_1_by_1(patterns, rest_of_line)
+                assert find_start(rest_of_line) == expected, rest_of_line
+
+                if expected is None:
+                    break
+                rest_of_line = rest_of_line[expected:]
+
+
 def test_clean_maybe_list_item(monkeypatch):
     monkeypatch.setattr('builtins.input', lambda: "y")
 
@@ -763,6 +1372,50 @@ def test_get_id():
     assert get_id(pasal_node) == 'pasal-12'
 
 
+def test_node_slots():
+    node = PrimitiveNode(type=Structure.PLAINTEXT, text='Setiap Orang')
+    assert not hasattr(node, '__dict__')
+    assert not hasattr(ComplexNode(type=Structure.BAB), '__dict__')
+
+    # the default formatting is shared, so it can't be modified
+    with pytest.raises(TypeError):
+        node.formatting['underline_currency'] = True  # type: ignore
+
+
+def test_get_parent_node():
+    root = ComplexNode(type=Structure.UNDANG_UNDANG)
+    bab_node = ComplexNode(type=Structure.BAB)
+    root.add_child(bab_node)
+    pasal_node = ComplexNode(type=Structure.PASAL)
+    bab_node.add_child(pasal_node)
+    list_node = ComplexNode(type=Structure.LIST)
+    pasal_node.add_child(list_node)
+    plaintext_node = PrimitiveNode(type=Structure.PLAINTEXT, text='Setiap Orang')
+    list_node.add_child(plaintext_node)
+
+    assert get_parent_node(plaintext_node, Structure.PASAL) is pasal_node
+    assert get_parent_node(plaintext_node, Structure.BAB) is bab_node
+    assert get_parent_node(plaintext_node, Structure.BAGIAN) is None
+    assert get_parent_node(list_node, Structure.LIST) is None
+    assert get_parent_node(root, Structure.UNDANG_UNDANG) is None
+    assert is_x_an_ancestor(plaintext_node, Structure.UNDANG_UNDANG)
+    assert not is_x_an_ancestor(plaintext_node, Structure.PERUBAHAN_SECTION)
+
+    # the nearest ancestor of each type is used
+    nested_list_node = ComplexNode(type=Structure.LIST)
+    list_item_node = ComplexNode(type=Structure.LIST_ITEM)
+    list_item_node.add_child(nested_list_node)
+    list_node.add_child(list_item_node)
+    assert get_parent_node(nested_list_node, Structure.LIST) is list_node
+    assert get_parent_node(nested_list_node, Structure.PASAL) is pasal_node
+
+    # adding a subtree updates every node in it
+    perubahan_section_node = ComplexNode(type=Structure.PERUBAHAN_SECTION)
+    perubahan_section_node.add_child(root)
+    assert is_x_an_ancestor(plaintext_node, Structure.PERUBAHAN_SECTION)
+    assert get_parent_node(nested_list_node, Structure.PERUBAHAN_SECTION) is perubahan_section_node
+
+
 def test_is_start_of_penjelasan():
     law = [
         'PENJELASAN',
@@ -924,6 +1577,28 @@ def test_insert_perubahan_section_close_quotes(monkeypatch):
     monkeypatch.setattr('builtins.input', lambda: "1")
     assert insert_perubahan_section_close_quotes(law) == new_law
 
+    # a typo isn't recorded, and the recorded answer is still replayed after lines
+    # before the section are added
+    monkeypatch.setattr('pyperclip.copy', lambda _: None)
+    journal = DecisionJournal(None, 'uu-2099-1')
+    set_decision_journal(journal)
+    try:
+        monkeypatch.setattr('builtins.input', lambda: "1o")
+        with pytest.raises(Exception):
+            insert_perubahan_section_close_quotes(law)
+        assert journal.decisions == {}
+
+        journal.reset_occurrences()
+        monkeypatch.setattr('builtins.input', lambda: "1")
+        assert insert_perubahan_section_close_quotes(law) == new_law
+
+        journal.reset_occurrences()
+        monkeypatch.setattr('builtins.input', lambda: pytest.fail('asked'))
+        assert insert_perubahan_section_close_quotes(['Pasal 4'] + law) == \
+            ['Pasal 4'] + new_law
+    finally:
+        set_decision_journal(None)
+
 
 def test_insert_penjelasan_perubahan_section_open_quotes(monkeypatch):
     law = [
@@ -1025,6 +1700,31 @@ def test_is_word_part_of_text():
     assert is_word_part_of_text("kami harus melaksanakan", "anak", 17) == False
 
 
+def test_term_linker():
+    term_linker = TermLinker(['LOREM IPSUM', 'IPSUM', 'ANAK'])
+    assert term_linker.link(
+        'Lorem ipsum dolor sit amet') == '${Lorem ipsum} dolor sit amet'
+    assert term_linker.link('Ipsum dolor sit amet') == '${Ipsum} dolor sit amet'
+    assert term_linker.link(
+        'Lorem ipsum ipsum lorem') == '${Lorem ipsum} ${ipsum} lorem'
+    assert term_linker.link('melaksanakan anak-anak') == 'melaksanakan ${anak}-${anak}'
+    assert term_linker.link('Lorem ipsumnya ipsum') == 'Lorem ipsumnya ${ipsum}'
+    # already linked
+    assert term_linker.link('${Lorem ipsum} ipsum') == '${Lorem ipsum} ${ipsum}'
+    assert TermLinker([]).link('Lorem ipsum') == 'Lorem ipsum'
+
+    # the cost of linking shouldn't grow with the no. of terms
+    words = ['pemerintah', 'daerah', 'menteri', 'badan', 'usaha', 'orang', 'setiap',
+             'pusat', 'dewan', 'perwakilan', 'rakyat', 'komisi', 'lembaga']
+    terms = [f'{a} {b}'.upper() for a in words for b in words if a != b]
+    text = ' '.join(words * 200)
+    few_terms_seconds = min(timeit.repeat(
+        lambda: TermLinker(terms[:5]).link(text), number=1, repeat=3))
+    many_terms_seconds = min(timeit.repeat(
+        lambda: TermLinker(terms).link(text), number=1, repeat=3))
+    assert many_terms_seconds < few_terms_seconds * 5
+
+
 def test_clean_squashed_page_numbers(monkeypatch):
     monkeypatch.setattr('builtins.input', lambda: "y")
     law = [
@@ -1070,6 +1770,140 @@ def test_clean_split_lines_between_pages():
     assert clean_split_lines_between_pages(law) == [f'{law[0]} {law[-1]}']
 
 
+def test_clean_law_stream(monkeypatch):
+    law = [
+        '1 / 10',
+        'Pasal 1',
+        'Dalam Undang-Undang ini yang dimaksud dengan: 1. Informasi adalah keterangan, pernyataan,',
+        'gagasan, dan tanda-tanda yang mengandung nilai, makna, dan pesan. 2. Badan Publik adalah',
+        '(1) Pelaksanaan kemitraan dengan pola perdagangan umum sebagaimana dimaksud dalam Pasal 26 huruf d, dapat dilakukan dalam bentuk kerjasama pemasaran, penyediaan lokasi usaha, atau penerimaan pasokan',
+        '12 / 38',
+        'www.hukumonline.com',
+        'dari Usaha Mikro, Kecil, dan Menengah oleh Usaha Besar yang dilakukan secara terbuka. Pasal 39 B',
+        '. . .',
+        'Pasal 39 B',
+    ]
+
+    # record the decisions while running the stages one by one, answering 'y' to all
+    monkeypatch.setattr('builtins.input', lambda: 'y')
+    monkeypatch.setattr('pyperclip.copy', lambda _: None)
+    journal = DecisionJournal(None, 'uu-2099-1')
+    set_decision_journal(journal)
+    try:
+        clean_law = list(iter_preclean_law(law))
+        for stage in CleaningStageOrder:
+            if stage == CleaningStageOrder.INSERT_PERUBAHAN_QUOTES:
+                monkeypatch.setattr('builtins.input', lambda: 'n')
+            clean_law = clean_law_at_stage(stage.value, clean_law)
+
+        # replaying them in a single pass gives the same law
+        monkeypatch.setattr('builtins.input', lambda: pytest.fail('asked'))
+        journal.replay_only = True
+        assert list(clean_law_stream(iter(law))) == clean_law
+        assert clean_law[:4] == [
+            'Pasal 1',
+            'Dalam Undang-Undang ini yang dimaksud dengan:',
+            '1.',
+            'Informasi adalah keterangan, pernyataan, gagasan, dan tanda-tanda yang mengandung nilai, makna, dan pesan.',
+        ]
+    finally:
+        set_decision_journal(None)
+
+
+def test_clean_law_stream_is_lazy(monkeypatch, tmp_path):
+    law = []
+    for i in range(1, 501):
+        law += [f'Pasal {i}', f'Ketentuan ini berlaku untuk {i} orang.', '12 / 38']
+
+    num_read = 0
+
+    def read_law():
+        nonlocal num_read
+        for line in law:
+            num_read += 1
+            yield line
+
+    monkeypatch.setattr('builtins.input', lambda: 'n')
+    monkeypatch.setattr('pyperclip.copy', lambda _: None)
+    journal = DecisionJournal(None, 'uu-2099-1')
+    set_decision_journal(journal)
+    try:
+        # each stage only looks a few lines ahead of the line it's cleaning, so the
+        # stream never reads more than a few lines past the line it outputs
+        max_lines_ahead = 0
+        clean_law = []
+        for line in clean_law_stream(read_law()):
+            if len(clean_law) == 0:
+                assert num_read < 10
+
+            # the page number after every 2 lines is dropped
+            i = len(clean_law)
+            law_index = i // 2 * 3 + i % 2
+            assert line == law[law_index]
+            max_lines_ahead = max(max_lines_ahead, num_read - (law_index + 1))
+            clean_law.append(line)
+
+        assert num_read == len(law)
+        assert len(clean_law) == 1000
+        assert max_lines_ahead < 10
+
+        # in batch mode, the cleaned law is streamed straight to <law>-clean.txt
+        filename = str(tmp_path / 'uu-2099-1')
+        with open(filename + '.txt', 'w', encoding='utf-8') as file:
+            file.write('\n'.join(law))
+        journal.replay_only = True
+        assert load_clean_law(filename) == clean_law
+        assert read_clean_law(filename + '-clean.txt') == clean_law
+    finally:
+        set_decision_journal(None)
+
+    outfile = io.StringIO()
+    write_law_lines(iter(clean_law), outfile)
+    assert outfile.getvalue() == '\n'.join(clean_law)
+
+
+def test_checkpoint_store(monkeypatch, tmp_path):
+    law = ['Pasal 1', 'Pasal 39 B', 'Pasal 2']
+    clean_law_1 = ['Pasal 1', 'Pasal 39 B']
+    clean_law_2 = ['Pasal 1', 'Pasal 39B']
+
+    directory = str(tmp_path / 'uu-2099-1-checkpoints')
+    checkpoints = CheckpointStore(directory)
+    checkpoints.save(1, 'CLEAN_SQUASHED_PAGE_NUMBERS', law, clean_law_1)
+    checkpoints.save(2, 'CLEAN_MAYBE_LIST_ITEMS', clean_law_1, clean_law_2)
+
+    # a later session picks up where this one stopped
+    checkpoints = CheckpointStore(directory)
+    assert checkpoints.load_all(law, [1, 2, 3]) == {1: clean_law_1, 2: clean_law_2}
+    # ...unless the law being cleaned has changed
+    assert checkpoints.load_all(law[:2], [1, 2, 3]) == {}
+
+    # a checkpoint edited by hand is ignored, as is every checkpoint after it
+    with open(checkpoints.get_filename(1), mode='a', encoding='utf-8') as file:
+        file.write('\nPasal 3')
+    assert checkpoints.load_all(law, [1, 2, 3]) == {}
+
+    checkpoints.delete([1, 2])
+    assert CheckpointStore(directory).index == {}
+
+    # resume cleaning after every stage but the last has been saved
+    law = ['Pasal 1', 'Pasal 39 B']
+    checkpoints = CheckpointStore(directory)
+    previous_law = law
+    for stage in list(CleaningStageOrder)[:-1]:
+        checkpoints.save(stage.value, stage.name, previous_law, previous_law)
+
+    answers = iter([
+        'd',  # go to the next (i.e last) stage
+        'n',  # not an UU Perubahan
+        'y',  # finish cleaning
+    ])
+    monkeypatch.setattr('builtins.input', lambda *_: next(answers))
+    assert clean_law(law, CheckpointStore(directory)) == law
+    assert CheckpointStore(directory).load_all(
+        law, [stage.value for stage in CleaningStageOrder]).keys() == {1, 2, 3, 4, 5, 6}
+
+
 def test_is_page_number():
     assert is_page_number('2 / 34')
     assert is_page_number('2/34')
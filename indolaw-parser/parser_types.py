@@ -1,6 +1,8 @@
 
 from enum import Enum
-from typing import Any, Dict, List, Optional, Union
+from functools import cached_property
+from types import MappingProxyType
+from typing import Any, Dict, List, Mapping, Optional, Union
 from typing_extensions import TypedDict
 
 
@@ -63,6 +65,8 @@ class Structure(Enum):
     PENJELASAN_ANGKA = "PENJELASAN_ANGKA"
     PENJELASAN_ANGKA_WITH_RIGHT_BRACKET = "PENJELASAN_ANGKA_WITH_RIGHT_BRACKET"
     FORMATTED_MATH_ROW = "FORMATTED_MATH_ROW"
+    # lines the parser couldn't parse; only created when parsing with errors recovered
+    PARSE_ERROR = "PARSE_ERROR"
 
 
 TEXT_BLOCK_STRUCTURES = [
@@ -90,6 +94,13 @@ PRIMITIVE_STRUCTURES = [
 ListIndexDefinition = Dict[str, Union[str, bool]]
 
 
+'''
+Read-only so that every PrimitiveNode without formatting can share it
+'''
+NO_FORMATTING: Mapping[str, Any] = MappingProxyType({})
+NO_ANCESTORS: Mapping[Structure, Any] = MappingProxyType({})
+
+
 class PrimitiveNode:
     '''
     A primitive node is a node:
@@ -106,19 +117,91 @@ class PrimitiveNode:
     }
     '''
 
+    # A large law has tens of thousands of nodes, so they don't each get a __dict__
+    __slots__ = ('type', 'text', 'parent', 'formatting', 'id')
+
     def __init__(
         self,
         type: Structure,
         text: str,
-        formatting: Dict[str, Any] = {},
+        formatting: Mapping[str, Any] = NO_FORMATTING,
     ) -> None:
         self.type = type
         self.text = text
         self.parent: Union[None, 'ComplexNode'] = None
-        self.formatting: Dict[str, Any] = formatting
+        self.formatting: Mapping[str, Any] = formatting
         self.id = ''
 
 
+class Line(str):
+    '''
+    A line of a law that works out the things the cleaning stages & is_start_of_x
+    functions keep asking of it (its words, its lowercase form etc) the 1st time they're
+    asked for, & remembers them. Since it's a str, it can be passed anywhere a line is.
+
+    A line is often checked by dozens of heuristics & detectors, & then checked again
+    as the previous/next line of its neighbours, so this saves splitting & lowercasing
+    the same line over & over again.
+
+    e.g
+    >>> line = Line('Pasal 5 ayat (2) berlaku;')
+    >>> line.tokens
+    ['Pasal', '5', 'ayat', '(2)', 'berlaku;']
+    >>> line.last_token, line.trailing_punctuation
+    ('berlaku;', ';')
+    '''
+
+    @staticmethod
+    def of(line: str) -> 'Line':
+        return line if isinstance(line, Line) else Line(line)
+
+    @staticmethod
+    def from_tokens(tokens: List[str]) -> 'Line':
+        '''
+        Same as Line(' '.join(tokens)), without splitting the line into tokens again
+        '''
+        line = Line(' '.join(tokens))
+        line.__dict__['tokens'] = tokens
+        return line
+
+    @cached_property
+    def tokens(self) -> List[str]:
+        return self.split()
+
+    @cached_property
+    def lowercase(self) -> str:
+        return self.lower()
+
+    @cached_property
+    def is_all_caps(self) -> bool:
+        return self.isupper()
+
+    @cached_property
+    def starts_with_lowercase(self) -> bool:
+        return self[:1].islower()
+
+    @cached_property
+    def first_token(self) -> str:
+        # '' for a blank line, so callers don't have to check len(tokens) first
+        return self.tokens[0] if len(self.tokens) > 0 else ''
+
+    @cached_property
+    def last_token(self) -> str:
+        return self.tokens[-1] if len(self.tokens) > 0 else ''
+
+    @cached_property
+    def trailing_punctuation(self) -> str:
+        '''
+        The punctuation mark the line ends with (ignoring whitespace) e.g ';', or '' if
+        it doesn't end with one
+        '''
+        last_char = self.rstrip()[-1:]
+        return last_char if last_char in LINE_PUNCTUATION else ''
+
+
+LINE_PUNCTUATION = '.,:;!?)\'"”'
+
+
 class ComplexNode:
     """
     A complex node is a node whose content is a list of other nodes, as opposed
@@ -138,6 +221,9 @@ class ComplexNode:
     }
     """
 
+    # See PrimitiveNode
+    __slots__ = ('type', 'children', 'parent', 'id', 'ancestors', 'ancestors_of_children')
+
     def __init__(
         self,
         type: Structure,
@@ -146,11 +232,51 @@ class ComplexNode:
         self.children: List[Union[PrimitiveNode, 'ComplexNode']] = []
         self.parent: Union[None, 'ComplexNode'] = None
         self.id = ''
+        '''
+        The nearest ancestor of each structure type above this node e.g
+        node.ancestors[Structure.BAB] is the BAB this node is in. Kept up to date by
+        add_child, so that finding an ancestor doesn't require walking up the tree.
+
+        Siblings share the same mapping (their parent's ancestors_of_children), so
+        it must not be modified.
+        '''
+        self.ancestors: Mapping[Structure, 'ComplexNode'] = NO_ANCESTORS
+        self.ancestors_of_children: Optional[Mapping[Structure, 'ComplexNode']] = None
+
+    def get_ancestors_of_children(self) -> Mapping[Structure, 'ComplexNode']:
+        if self.ancestors_of_children is None:
+            self.ancestors_of_children = {**self.ancestors, self.type: self}
+
+        return self.ancestors_of_children
 
     def add_child(self, child: Union[PrimitiveNode, 'ComplexNode']):
         self.children.append(child)
         child.parent = self
 
+        if isinstance(child, ComplexNode):
+            '''
+            The parser always adds a node to its parent before adding children to it,
+            but if a subtree is added all at once, its descendants need updating too
+            '''
+            stack = [child]
+            while len(stack) > 0:
+                node = stack.pop()
+                assert node.parent is not None  # mypy type hint
+                node.ancestors = node.parent.get_ancestors_of_children()
+                node.ancestors_of_children = None
+                stack.extend(
+                    grandchild for grandchild in node.children
+                    if isinstance(grandchild, ComplexNode)
+                )
+
+    def get_ancestor(self, structure: Structure) -> Union[None, 'ComplexNode']:
+        """Returns this node if it's a structure, else its nearest ancestor that is one
+        """
+        if self.type == structure:
+            return self
+
+        return self.ancestors.get(structure)
+
 
 class PlaintextInListItemScenario(Enum):
     SIBLING_OF_LIST = "SIBLING_OF_LIST"
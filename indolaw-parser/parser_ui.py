@@ -1,6 +1,23 @@
 from typing import Any, Dict, List, Optional, Set, Union
 from os import system, name
-from termcolor import colored
+
+from parser_context import is_interactive
+
+'''
+termcolor & pyperclip are only imported the 1st time something is printed in colour or
+copied to the clipboard, i.e once the user is actually being asked something. The
+parser can then be imported & run in batch mode (see parse_law) without either.
+'''
+
+
+def colored(text: str, color: str) -> str:
+    from termcolor import colored as termcolor_colored
+    return termcolor_colored(text, color)
+
+
+def copy_to_clipboard(text: str) -> None:
+    import pyperclip
+    pyperclip.copy(text)
 
 
 def print_law(law: List[str]) -> None:
@@ -29,6 +46,9 @@ def print_yes_no():
 
 
 def print_section_header(line):
+    if not is_interactive():
+        return
+
     print(f"{colored('---------------', 'green')}")
     print()
     print(f"{colored(line, 'green')}")
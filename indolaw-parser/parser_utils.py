@@ -1,15 +1,17 @@
-from typing import Any, Dict, List, Optional, Set, Union, Callable
+from typing import Any, Deque, Dict, Iterable, Iterator, List, NamedTuple, Optional, Pattern, Set, TextIO, Tuple, Union, Callable
+from collections import deque
+from functools import lru_cache
 from itertools import filterfalse
+import glob
+import json
 import re
 from os import system, name, path
-from colorama import init
-from termcolor import colored
-import pyperclip
 from enum import IntEnum
 
 from parser_types import (
     ComplexNode,
     PrimitiveNode,
+    Line,
     Structure,
     PlaintextInListItemScenario
 )
@@ -20,6 +22,7 @@ from parser_is_start_of_x import (
     BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
     CLOSE_QUOTE_CHAR,
     CURRENCY_REGEX,
+    HEADING_PATTERNS,
     LINE_ENDING_REGEXES,
     LIST_INDEX_DEFINITIONS,
     LIST_INDEX_STRUCTURES,
@@ -31,12 +34,12 @@ from parser_is_start_of_x import (
     PENJELASAN_LIST_INDEX_DEFINITIONS,
     PENJELASAN_LIST_INDEX_REGEXES,
     PENJELASAN_PASAL_DEMI_PASAL_REGEX,
-    START_OF_PERUBAHAN_SECTION_REGEXES,
+    START_OF_PERUBAHAN_SECTION_PATTERNS,
+    compile_heading,
     group,
     is_heading,
     is_start_of_bagian,
     is_start_of_first_list_index,
-    is_start_of_list_index_str,
     is_start_of_paragraf,
     is_start_of_pasal,
     is_start_of_penjelasan,
@@ -47,8 +50,23 @@ from parser_is_start_of_x import (
     is_start_of_perubahan_pasal,
     is_start_of_structure,
     is_start_of_unordered_list_index_str,
+    remove_group_names,
+)
+from parser_checkpoints import CheckpointStore, get_checkpoint_directory, open_atomically
+from parser_decisions import (
+    ask,
+    forget_decisions,
+    is_batch_mode,
+    reset_decision_occurrences,
+)
+from parser_ui import (
+    colored,
+    copy_to_clipboard,
+    print_dashed_line,
+    print_line,
+    print_section_header,
+    print_yes_no,
 )
-from parser_ui import print_dashed_line, print_line, print_section_header, print_yes_no
 
 
 class CleaningStageOrder(IntEnum):
@@ -60,34 +78,26 @@ class CleaningStageOrder(IntEnum):
     INSERT_PERUBAHAN_QUOTES = 6
 
 
-CLEANING_STAGES: Dict[CleaningStageOrder, Dict[str, List[str]]] = {
-    CleaningStageOrder.CLEAN_SQUASHED_PAGE_NUMBERS:
-        {
-            'cleaned_law': []
-        },
-    CleaningStageOrder.CLEAN_MAYBE_LIST_ITEMS:
-        {
-            'cleaned_law': []
-        },
-    CleaningStageOrder.CLEAN_MAYBE_SQUASHED_HEADINGS:
-        {
-            'cleaned_law': []
-        },
-    CleaningStageOrder.CLEAN_SPLIT_PLAINTEXT:
-        {
-            'cleaned_law': []
-        },
-    CleaningStageOrder.CLEAN_SPLIT_PASAL_NUMBER:
-        {
-            'cleaned_law': []
-        },
-    CleaningStageOrder.INSERT_PERUBAHAN_QUOTES:
-        {
-            'cleaned_law': []
-        }
+'''
+The stages (see parser_decisions.ask) of the decisions each cleaning stage asks the user for
+'''
+CLEANING_STAGE_DECISIONS: Dict[CleaningStageOrder, List[str]] = {
+    CleaningStageOrder.CLEAN_SQUASHED_PAGE_NUMBERS: ['clean_squashed_page_numbers'],
+    CleaningStageOrder.CLEAN_MAYBE_LIST_ITEMS: ['get_squashed_list_item'],
+    CleaningStageOrder.CLEAN_MAYBE_SQUASHED_HEADINGS: ['get_squashed_heading'],
+    CleaningStageOrder.CLEAN_SPLIT_PLAINTEXT: ['clean_split_plaintext'],
+    CleaningStageOrder.CLEAN_SPLIT_PASAL_NUMBER: [],
+    CleaningStageOrder.INSERT_PERUBAHAN_QUOTES: [
+        'insert_perubahan_quotes',
+        'insert_perubahan_section_open_quotes',
+        'insert_perubahan_section_close_quotes',
+        'insert_perubahan_section_close_quotes_out_of_bounds',
+        'insert_penjelasan_perubahan_section_open_quotes',
+        'insert_penjelasan_perubahan_section_close_quotes',
+        'insert_penjelasan_perubahan_section_close_quotes_out_of_bounds',
+    ],
 }
 
-
 def ignore_line(line: str) -> bool:
     """Checks if a line should be ignored during parsing. These lines are usually
     extra decorative content added to a PDF that isn't part of the law itself.
@@ -125,6 +135,72 @@ def ignore_line(line: str) -> bool:
         return False
 
 
+class ListIndex(NamedTuple):
+    """A list index string parsed by parse_list_index_str e.g '(12)' ->
+    ListIndex(type=Structure.NUMBER_WITH_BRACKETS, number=12, is_alphanumeric=False)
+
+    number is None for alphanumeric list indexes (e.g '(12a)'), which don't have a
+    numerical value.
+    """
+    type: Structure
+    number: Optional[int]
+    is_alphanumeric: bool
+
+
+'''
+parse_list_index_str is called on the same handful of list index strings (e.g 'a.',
+'(12)', 'Huruf k') tens of thousands of times in list-heavy laws, so its results are
+cached. The cache is bounded since it's also called on the 1st word of arbitrary lines
+while cleaning.
+'''
+LIST_INDEX_CACHE_SIZE = 4096
+
+
+@lru_cache(maxsize=LIST_INDEX_CACHE_SIZE)
+def parse_list_index_str(list_index_str: str) -> Optional[ListIndex]:
+    """Parse list_index_str into its type & numerical value, matching it against each
+    list index in LIST_INDEX_DEFINITIONS only once
+
+    Args:
+        list_index_str: string that maybe represents a list index
+
+    Returns:
+        Optional[ListIndex]: the parsed list index, or None if list_index_str isn't a
+        list index
+
+    Examples:
+        >>> parse_list_index_str('Huruf d')
+        ListIndex(type=Structure.PENJELASAN_HURUF, number=4, is_alphanumeric=False)
+
+        >>> parse_list_index_str('(13a)')
+        ListIndex(type=Structure.NUMBER_WITH_BRACKETS, number=None, is_alphanumeric=True)
+
+        >>> parse_list_index_str('a. cara berpikir kreatif')
+        None
+    """
+    for structure in LIST_INDEX_DEFINITIONS.keys():
+        match = HEADING_PATTERNS[structure].match(list_index_str)
+        if match is None:
+            continue
+
+        capture_groups = match.groupdict()
+        number_string = capture_groups['number']
+        assert isinstance(number_string, str)
+
+        number: Optional[int] = None
+        # e.g '100'
+        if number_string.isnumeric():
+            number = int(number_string)
+        # e.g 'a'
+        elif number_string.isalpha():
+            number = ord(number_string.lower())-96
+
+        is_alphanumeric = capture_groups.get('alphabet') not in [None, '']
+        return ListIndex(structure, number, is_alphanumeric)
+
+    return None
+
+
 def get_list_index_type(list_index_str: str) -> Structure:
     """Identify the type of list index in list_index_str
 
@@ -132,8 +208,8 @@ def get_list_index_type(list_index_str: str) -> Structure:
         list_index_str: string that maybe represents a list index
 
     Returns:
-        Optional[Structure]: the Structure enum that represents the type of list index,
-        or None if no list index is in string
+        Structure: the Structure enum that represents the type of list index; raises
+        an exception if no list index is in string
 
     Examples:
         >>> get_list_index_type('a.')
@@ -155,19 +231,13 @@ def get_list_index_type(list_index_str: str) -> Structure:
         Structure.PENJELASAN_ANGKA
 
         >>> get_list_index_type('cara berpikir kreatif')
-        None
-
-        >>> get_list_index_type('a. cara berpikir kreatif')
-        None
+        Exception('the string "cara berpikir kreatif" is not a LIST_INDEX')
     """
-    for structure, definition in LIST_INDEX_DEFINITIONS.items():
-        regex = definition['regex']
-        assert isinstance(regex, str)
+    list_index = parse_list_index_str(list_index_str)
+    if list_index is None:
+        raise Exception(f'the string "{list_index_str}" is not a LIST_INDEX')
 
-        if is_heading(regex, list_index_str):
-            return structure
-
-    raise Exception(f'the string "{list_index_str}" is not a LIST_INDEX')
+    return list_index.type
 
 
 def get_list_index_as_num(list_index_str: str) -> int:
@@ -192,50 +262,20 @@ def get_list_index_as_num(list_index_str: str) -> int:
         >>> get_list_index_as_num('Huruf d')
         4
     """
-    structure = get_list_index_type(list_index_str)
-    regex = LIST_INDEX_DEFINITIONS[structure]['regex']
-    assert isinstance(regex, str)
-
-    match = re.match(regex, list_index_str)
-    # mypy: https://mypy.readthedocs.io/en/stable/common_issues.html#unexpected-errors-about-none-and-or-optional-types
-    assert match is not None
-
-    number_string = match.groupdict()['number']
-    assert isinstance(number_string, str)
-
-    # e.g '100'
-    if number_string.isnumeric():
-        return int(number_string)
-    # e.g 'a'
-    elif number_string.isalpha():
-        return ord(number_string.lower())-96
-    else:
+    list_index = parse_list_index_str(list_index_str)
+    if list_index is None:
+        raise Exception(f'the string "{list_index_str}" is not a LIST_INDEX')
+
+    if list_index.number is None:
         raise Exception(
             f'Invalid input {list_index_str}: note this function doesnt work on alphanumeric list indexes')
 
+    return list_index.number
 
-def is_alphanumeric_list_index(list_index_str: str) -> bool:
-    for definition in LIST_INDEX_DEFINITIONS.values():
-        regex = definition['regex']
-        assert isinstance(regex, str)
-
-        if not is_heading(regex, list_index_str):
-            continue
-
-        match = re.match(regex, list_index_str)
-        if match == None:
-            continue
-
-        assert match is not None
-        capture_groups = match.groupdict()
-
-        if 'alphabet' not in capture_groups:
-            continue
 
-        if capture_groups['alphabet'] != '':
-            return True
-
-    return False
+def is_alphanumeric_list_index(list_index_str: str) -> bool:
+    list_index = parse_list_index_str(list_index_str)
+    return list_index is not None and list_index.is_alphanumeric
 
 
 def is_next_list_index_number(list_index_a: str, list_index_b: str) -> bool:
@@ -261,23 +301,34 @@ def is_next_list_index_number(list_index_a: str, list_index_b: str) -> bool:
         >>> is_next_list_index_number('a.', '(2)')
         Exception('next_list_index_number: Invalid input')
     """
-    a_type = get_list_index_type(list_index_a)
-    b_type = get_list_index_type(list_index_b)
-
-    if b_type not in LIST_INDEX_STRUCTURES:
+    a = parse_list_index_str(list_index_a)
+    b = parse_list_index_str(list_index_b)
+    if a is None:
+        raise Exception(f'the string "{list_index_a}" is not a LIST_INDEX')
+    if b is None:
+        raise Exception(f'the string "{list_index_b}" is not a LIST_INDEX')
+
+    if b.type not in LIST_INDEX_STRUCTURES:
         raise Exception('next_list_index_number: Invalid input')
-    if not (a_type == None or a_type == b_type):
+    if not (a.type == None or a.type == b.type):
         raise Exception('next_list_index_number: Invalid input')
 
-    if is_alphanumeric_list_index(list_index_a) or is_alphanumeric_list_index(list_index_b):
-        print_line()
-        print(list_index_a)
-        print_dashed_line()
-        print(list_index_b)
-        print_line()
-        print('Are they consecutive list indexes?')
-        print_yes_no()
-        user_input = input()
+    if a.is_alphanumeric or b.is_alphanumeric:
+        def show_question():
+            print_line()
+            print(list_index_a)
+            print_dashed_line()
+            print(list_index_b)
+            print_line()
+            print('Are they consecutive list indexes?')
+            print_yes_no()
+
+        user_input = ask(
+            'is_next_list_index_number',
+            f'{list_index_a}\n{list_index_b}',
+            show_question,
+            valid_answers=['y', 'n'],
+        )
 
         # user_input = 'y'
         if user_input == 'y':
@@ -287,17 +338,18 @@ def is_next_list_index_number(list_index_a: str, list_index_b: str) -> bool:
         else:
             raise Exception('Invalid input; answer y or n')
 
-    if a_type == None:
+    if a.type == None:
         return is_start_of_first_list_index(list_index_b)
 
-    return get_list_index_as_num(list_index_a) + 1 == get_list_index_as_num(list_index_b)
+    assert a.number is not None and b.number is not None
+    return a.number + 1 == b.number
 
 
 def load_clean_law(filename: str) -> List[str]:
     should_clean_law = True
     clean_filename = f'{filename}-clean.txt'
 
-    if path.isfile(clean_filename):
+    if path.isfile(clean_filename) and not is_batch_mode():
         y = colored('y', 'green')
         n = colored('n', 'red')
         print(
@@ -308,13 +360,34 @@ def load_clean_law(filename: str) -> List[str]:
             should_clean_law = False
 
     law: List[str] = []
-    if should_clean_law:
-        file = open(
-            filename + '.txt',
-            mode='r',
-            encoding='utf-8-sig')
-        law = file.read().split("\n")
-        law = clean_law(law)
+    if should_clean_law and is_batch_mode():
+        '''
+        Every decision is replayed from the journal, so every stage runs in a single
+        pass & each line is written out as soon as it's cleaned, instead of the whole
+        cleaned law being held in memory first. The parser needs every line anyway, so
+        the law is only read back once it's been cleaned.
+        '''
+        with open(
+                filename + '.txt',
+                mode='r',
+                encoding='utf-8-sig',
+                newline='\n') as file, \
+                open_atomically(clean_filename) as outfile:
+            write_law_lines(clean_law_stream(file), outfile)
+
+        law = read_clean_law(clean_filename)
+
+    elif should_clean_law:
+        # clean_law strips the '\n' off the end of each line
+        with open(
+                filename + '.txt',
+                mode='r',
+                encoding='utf-8-sig',
+                newline='\n') as file:
+            law = clean_law(
+                file,
+                CheckpointStore(get_checkpoint_directory(filename)),
+            )
 
         save_law_to_file(law, clean_filename)
 
@@ -328,6 +401,24 @@ def load_clean_law(filename: str) -> List[str]:
     return law
 
 
+LAWS_DIRECTORY = path.join(path.dirname(path.abspath(__file__)), 'laws')
+
+
+def get_clean_law_filenames(directory: str = LAWS_DIRECTORY) -> List[str]:
+    """Lists every cleaned law in directory. Cleaned laws are named either
+    e.g 'uu-2008-14-mod-clean.txt' or 'uu_13_2003_clean.txt'
+    """
+    return sorted(
+        glob.glob(path.join(directory, '*-clean.txt')) +
+        glob.glob(path.join(directory, '*_clean.txt'))
+    )
+
+
+def read_clean_law(filename: str) -> List[str]:
+    with open(filename, mode='r', encoding='utf-8-sig', errors='replace') as file:
+        return file.read().split('\n')
+
+
 def clean_law_at_stage(stage: int, law: List[str]) -> List[str]:
     '''
     Picks which function to use on law - a list implementation of a law document -
@@ -341,6 +432,8 @@ def clean_law_at_stage(stage: int, law: List[str]) -> List[str]:
     Returns:
         List[str]: a modified list of strings from law based on which function was implemented
     '''
+    reset_decision_occurrences()
+
     if stage == CleaningStageOrder.CLEAN_SQUASHED_PAGE_NUMBERS.value:
         '''
         Remove _squashed_ semantically meaningless text e.g '. . .' or '1 / 23'
@@ -381,7 +474,7 @@ def clean_law_at_stage(stage: int, law: List[str]) -> List[str]:
         raise Exception(f'Unknown stage {stage}')
 
 
-def clean_law(law: List[str]) -> List[str]:
+def clean_law(law: Iterable[str], checkpoints: Optional[CheckpointStore] = None) -> List[str]:
     """Takes in a law (in the form of an ordered list of strings) and performs transformations
     that makes it easier to parse (while keeping it as a list of strings). The 2 transformations
     we do right now is to a) remove semantically meaningless lines (e.g a page number) and
@@ -390,6 +483,10 @@ def clean_law(law: List[str]) -> List[str]:
     Args:
         law: ordered list of strings that contain the text of the law we want to parse
 
+        checkpoints: where the law is saved after each cleaning stage; if the law has been
+        (partly) cleaned before, the user can carry on from the last stage saved. If None,
+        the checkpoints are only kept in memory
+
     Returns:
         List[str]: the initial list of strings after transformations have been applied to it
 
@@ -408,29 +505,30 @@ def clean_law(law: List[str]) -> List[str]:
             'Informasi adalah keterangan',
         ]
     """
-    law = [line.strip() for line in law]
-    law = [clean_whitespace(line) for line in law]
+    if is_batch_mode():
+        '''
+        Every decision is replayed from the journal, so there's nothing to redo; run
+        every stage in a single pass
+        '''
+        return list(clean_law_stream(law))
 
-    new_law = []
-    squashed_phrase = 'DENGAN RAHMAT TUHAN YANG MAHA ESA'
-    for line in law:
-        if line.endswith(squashed_phrase):
-            new_law.extend([
-                clean_whitespace(line.split(squashed_phrase)[0]),
-                squashed_phrase,
-            ])
-            pass
-        else:
-            new_law.append(line)
-    law = new_law
+    law = list(iter_preclean_law(law))
 
-    law = clean_split_lines_between_pages(law)
-    law = list(filterfalse(ignore_line, law))
+    if checkpoints is None:
+        checkpoints = CheckpointStore(None)
 
-    next_cleaning_stage = 1
     len_cleaning_stage_order = len(CleaningStageOrder)
+    cleaned_laws = checkpoints.load_all(
+        law, [stage.value for stage in CleaningStageOrder])
+
+    last_cleaned_stage = len(cleaned_laws)
+    next_cleaning_stage = min(last_cleaned_stage + 1, len_cleaning_stage_order)
     pick_stage = '1'
 
+    if last_cleaned_stage > 0:
+        print(colored(
+            f'Resuming from the stages saved in {checkpoints.directory}', 'blue'))
+
     '''
     Saving mechanism is created to allow users to redo their inputs in
     specific stages in case there are wrong inputs without needing to redo
@@ -438,7 +536,7 @@ def clean_law(law: List[str]) -> List[str]:
 
     It works by giving an order to each cleaning stages (CleaningStageOrder)
     and saving each subsequent transformation on the previous law (ordered list of strings)
-    into a dictionary in the stage order. With each stage passed, the user is prompted
+    as a checkpoint (see CheckpointStore). With each stage passed, the user is prompted
     to say 'n' which would automatically choose the next stage, or to choose a number
     (int_pick_stage) based on stages that have passed.
 
@@ -455,6 +553,9 @@ def clean_law(law: List[str]) -> List[str]:
 
     This is to ensure that the user can go back to cleaning
     for possible revisions even if all cleaning stages have been completed.
+
+    The checkpoints outlive the process, so if cleaning is interrupted the user picks
+    up from the last stage saved the next time the law is cleaned.
     '''
     while next_cleaning_stage <= len_cleaning_stage_order:
 
@@ -464,7 +565,7 @@ def clean_law(law: List[str]) -> List[str]:
             print("")
             print(colored('SAVED STAGES: ', 'blue'))
             for stage in CleaningStageOrder:
-                if len(CLEANING_STAGES[stage]['cleaned_law']) == 0:
+                if stage.value not in cleaned_laws:
                     break
                 print(f"{stage.value}. {stage.name}")
             print("")
@@ -488,20 +589,18 @@ def clean_law(law: List[str]) -> List[str]:
             continue
 
         int_pick_stage = int(pick_stage)
-        current_stage = CLEANING_STAGES[CleaningStageOrder(int_pick_stage)]
-
-        if int_pick_stage == 1:
-            previous_stage = {'cleaned_law': law}
-        else:
-            previous_stage = CLEANING_STAGES[CleaningStageOrder(
-                int_pick_stage - 1)]
 
-        if int_pick_stage > len_cleaning_stage_order:
+        if int_pick_stage < 1 or int_pick_stage > len_cleaning_stage_order:
             print("")
             print(f"{colored('Invalid number. No stage with that number.', 'red')}")
             continue
 
-        elif (int_pick_stage != 1 and len(previous_stage['cleaned_law']) == 0):
+        if int_pick_stage == 1:
+            previous_law: Optional[List[str]] = law
+        else:
+            previous_law = cleaned_laws.get(int_pick_stage - 1)
+
+        if previous_law is None:
             '''
             Checks whether or not the previous stage from int_pick_stage has a valid law list
             If not, then the stage of int_pick_stage should not be implemented
@@ -512,21 +611,37 @@ def clean_law(law: List[str]) -> List[str]:
                 f"{colored('Invalid stage number. All former stages must be cleaned first.', 'red')}")
             continue
 
+        current_stage = CleaningStageOrder(int_pick_stage)
+
+        if int_pick_stage <= last_cleaned_stage:
+            '''
+            The user is redoing a stage, so the decisions they made in it (and the
+            stages after it) shouldn't be replayed
+            '''
+            forget_decisions([
+                decision_stage
+                for stage in CleaningStageOrder if stage.value >= int_pick_stage
+                for decision_stage in CLEANING_STAGE_DECISIONS[stage]
+            ])
+
         '''
         Uses clean_law_at_stage to find which function to implement
         Read documentation on clean_law_at_stage for more information
         '''
-        if int_pick_stage in range(1, len_cleaning_stage_order + 1):
-            try:
-                current_stage['cleaned_law'] = clean_law_at_stage(
-                    int_pick_stage, previous_stage['cleaned_law'])
-
-                next_cleaning_stage = int_pick_stage + 1
-            except:
-                raise Exception(f'No logic for handling {current_stage}')
+        try:
+            cleaned_laws[int_pick_stage] = clean_law_at_stage(
+                int_pick_stage, previous_law)
+            checkpoints.save(
+                int_pick_stage,
+                current_stage.name,
+                previous_law,
+                cleaned_laws[int_pick_stage],
+            )
 
-        else:
-            raise ValueError("Invalid input.")
+            next_cleaning_stage = int_pick_stage + 1
+            last_cleaned_stage = max(last_cleaned_stage, int_pick_stage)
+        except:
+            raise Exception(f'No logic for handling {current_stage.name}')
 
         if next_cleaning_stage > len_cleaning_stage_order:
             '''
@@ -560,24 +675,79 @@ def clean_law(law: List[str]) -> List[str]:
             Deleting stage n + 1 and subsequent stages to eliminate the chance of
             double-cleaning/wrongful steps of cleaning
             '''
-            for i in range(int_pick_stage + 1, len_cleaning_stage_order):
-                CLEANING_STAGES[CleaningStageOrder(i)]['cleaned_law'].clear()
+            later_stages = range(int_pick_stage + 1, len_cleaning_stage_order + 1)
+            for i in later_stages:
+                cleaned_laws.pop(i, None)
+            checkpoints.delete(list(later_stages))
+
+    return cleaned_laws[len_cleaning_stage_order]
+
+
+def iter_preclean_law(law: Iterable[str]) -> Iterator[str]:
+    '''
+    The transformations applied to the law before any of the cleaning stages, none of
+    which need input from the user
+    '''
+    squashed_phrase = 'DENGAN RAHMAT TUHAN YANG MAHA ESA'
+
+    def iter_clean_lines() -> Iterator[str]:
+        for line in law:
+            line = clean_whitespace(line.strip())
+            if line.endswith(squashed_phrase):
+                yield clean_whitespace(line.split(squashed_phrase)[0])
+                yield squashed_phrase
+            else:
+                yield line
+
+    lines = iter_clean_split_lines_between_pages(iter_clean_lines())
+    return filterfalse(ignore_line, lines)
+
+
+def clean_law_stream(law: Iterable[str]) -> Iterator[str]:
+    '''
+    Runs every cleaning stage (see CleaningStageOrder) on law in a single pass, without
+    the user being able to redo a stage, so it's meant for batch mode where every
+    decision is replayed from the journal.
+
+    Each stage is a generator that pulls lines from the stage before it & only holds on
+    to the few lines around the current one, so the law is never copied as a whole. The
+    exception is inserting the quotes around perubahan sections in an UU Perubahan,
+    which needs the whole law to find where each section ends.
+
+    Args:
+        law: lines of the law we want to clean e.g an open .txt file
+
+    Returns:
+        Iterator[str]: the same lines clean_law returns
+    '''
+    reset_decision_occurrences()
 
-    return CLEANING_STAGES[CleaningStageOrder(len_cleaning_stage_order)]['cleaned_law']
+    lines = iter_preclean_law(law)
+    lines = iter_clean_squashed_page_numbers(lines)
+    lines = iter_clean_maybe_list_items(lines)
+    lines = iter_clean_maybe_squashed_headings(lines)
+    lines = iter_clean_split_plaintext(lines)
+    lines = iter_clean_split_pasal_number(lines)
+
+    if is_uu_perubahan():
+        yield from insert_perubahan_section_quotes(list(lines))
+    else:
+        yield from lines
 
 
 def clean_split_pasal_number(law: List[str]) -> List[str]:
-    new_law = []
+    return list(iter_clean_split_pasal_number(law))
+
+
+def iter_clean_split_pasal_number(law: Iterable[str]) -> Iterator[str]:
     regex = r'(“?Pasal[\s]+[0-9]+[\s]+[A-Z])'
 
     for line in law:
         if is_heading(regex, line):
             pasal, number, letter = line.split()
-            new_law.append(f'{pasal} {number}{letter}')
+            yield f'{pasal} {number}{letter}'
         else:
-            new_law.append(line)
-
-    return new_law
+            yield line
 
 
 def insert_perubahan_section_open_quotes(law: List[str]) -> List[str]:
@@ -594,17 +764,24 @@ def insert_perubahan_section_open_quotes(law: List[str]) -> List[str]:
                 is_heading(BAB_NUMBER_REGEX, line) or \
                 is_heading(BAGIAN_NUMBER_REGEX, line):
 
-            print_line()
-            print(f'[Line] {line}')
-            if i + 1 < len(new_law):
-                print_dashed_line()
-                print(new_law[i+1])
-            print_line()
+            def show_question():
+                print_line()
+                print(f'[Line] {line}')
+                if i + 1 < len(new_law):
+                    print_dashed_line()
+                    print(new_law[i+1])
+                print_line()
 
-            pyperclip.copy(line)
-            print('Add open quote in front of line?')
-            print_yes_no()
-            user_input = input()
+                copy_to_clipboard(line)
+                print('Add open quote in front of line?')
+                print_yes_no()
+
+            user_input = ask(
+                'insert_perubahan_section_open_quotes',
+                line,
+                show_question,
+                valid_answers=['y', 'n'],
+            )
 
             if user_input == 'y':
                 new_law[i] = OPEN_QUOTE_CHAR + line
@@ -625,7 +802,7 @@ def insert_perubahan_section_close_quotes(law: List[str]) -> List[str]:
         if is_start_of_penjelasan(new_law, i):
             break
 
-        if any([is_heading(regex, line) for regex in START_OF_PERUBAHAN_SECTION_REGEXES]):
+        if any([is_heading(pattern, line) for pattern in START_OF_PERUBAHAN_SECTION_PATTERNS]):
             open_quote_indexes.append(i)
 
     best_guess_index = -1
@@ -646,21 +823,35 @@ def insert_perubahan_section_close_quotes(law: List[str]) -> List[str]:
             continue
 
         best_guess_index = next_open_quote_index-3
-        print_line()
-        for j in range(open_quote_index, next_open_quote_index):
-            if j == best_guess_index:
-                print(f"{colored(f'[Line {j}] {new_law[j]}', 'green')}")
-            else:
-                print(f'[Line {j}] {new_law[j]}')
 
-            print_dashed_line()
+        def show_question():
+            print_line()
+            # numbered from the open quote, so the answer is an offset into the section
+            for j in range(open_quote_index, next_open_quote_index):
+                if j == best_guess_index:
+                    print(f"{colored(f'[Line {j - open_quote_index}] {new_law[j]}', 'green')}")
+                else:
+                    print(f'[Line {j - open_quote_index}] {new_law[j]}')
 
-        pyperclip.copy(new_law[open_quote_index])
-        print('For which line should a close quote be added to the end?')
-        if best_guess_index != -1:
-            print(f'Or {colored("y(es)", "green")} to use the best guess line')
+                print_dashed_line()
 
-        user_input = input()
+            copy_to_clipboard(new_law[open_quote_index])
+            print('For which line should a close quote be added to the end?')
+            if best_guess_index != -1:
+                print(f'Or {colored("y(es)", "green")} to use the best guess line')
+
+        '''
+        The answer is the offset of a line from the open quote, so the section is the
+        key & the answer still applies if lines are added or removed before it
+        '''
+        section = '\n'.join(new_law[open_quote_index:next_open_quote_index])
+        user_input = ask(
+            'insert_perubahan_section_close_quotes',
+            section,
+            show_question,
+            valid_answers=get_close_quote_answers(
+                open_quote_index, next_open_quote_index),
+        )
 
         user_input_int = -1
         if user_input == 'y':
@@ -670,11 +861,19 @@ def insert_perubahan_section_close_quotes(law: List[str]) -> List[str]:
                 raise Exception(
                     f"Invalid input {user_input} - expected a number")
 
-            user_input_int = int(user_input)
-            if user_input_int < open_quote_index or user_input_int >= next_open_quote_index:
-                print('This input may be out of bounds. Do you want to proceed?')
-                print_yes_no()
-                user_input = input()
+            user_input_int = open_quote_index + int(user_input)
+            if user_input_int >= next_open_quote_index:
+                def show_out_of_bounds_question():
+                    print('This input may be out of bounds. Do you want to proceed?')
+                    print_yes_no()
+
+                user_input = ask(
+                    'insert_perubahan_section_close_quotes_out_of_bounds',
+                    section,
+                    show_out_of_bounds_question,
+                    offset=user_input_int - open_quote_index,
+                    valid_answers=['y', 'n'],
+                )
                 if user_input == 'y':
                     pass
                 else:
@@ -686,6 +885,22 @@ def insert_perubahan_section_close_quotes(law: List[str]) -> List[str]:
     return new_law
 
 
+def get_close_quote_answers(
+    open_quote_index: int,
+    next_open_quote_index: int,
+    has_best_guess: bool = True,
+) -> List[str]:
+    """The answers to record when asking which line of a perubahan section the close
+    quote goes at the end of: 'y' for the best guess line, or the offset of a line of the
+    section from its open quote. Anything else (e.g a typo) is rejected without being
+    recorded, so it isn't replayed.
+    """
+    answers = [str(i) for i in range(next_open_quote_index - open_quote_index)]
+    if has_best_guess:
+        answers.append('y')
+    return answers
+
+
 def insert_penjelasan_perubahan_section_open_quotes(law: List[str]) -> List[str]:
     new_law = []
     for line in law:
@@ -716,15 +931,22 @@ def insert_penjelasan_perubahan_section_open_quotes(law: List[str]) -> List[str]
                 is_start_of_perubahan_bab(new_law, i) or \
                 is_start_of_perubahan_bagian(new_law, i):
 
-            print()
-            print_line()
-            print(line)
-            print_line()
+            def show_question():
+                print()
+                print_line()
+                print(line)
+                print_line()
 
-            pyperclip.copy(line)
-            print('Add open quote in front of line?')
-            print_yes_no()
-            user_input = input()
+                copy_to_clipboard(line)
+                print('Add open quote in front of line?')
+                print_yes_no()
+
+            user_input = ask(
+                'insert_penjelasan_perubahan_section_open_quotes',
+                line,
+                show_question,
+                valid_answers=['y', 'n'],
+            )
 
             if user_input == 'y':
                 new_law[i] = OPEN_QUOTE_CHAR + line
@@ -749,7 +971,7 @@ def insert_penjelasan_perubahan_section_close_quotes(law: List[str]) -> List[str
         if not in_penjelasan_pasal_demi_pasal:
             continue
 
-        if any([is_heading(regex, line) for regex in START_OF_PERUBAHAN_SECTION_REGEXES]):
+        if any([is_heading(pattern, line) for pattern in START_OF_PERUBAHAN_SECTION_PATTERNS]):
             open_quote_indexes.append(i)
 
     for i, _ in enumerate(open_quote_indexes):
@@ -759,25 +981,42 @@ def insert_penjelasan_perubahan_section_close_quotes(law: List[str]) -> List[str
         else:
             next_open_quote_index = open_quote_indexes[i+1]
 
-        print()
-        print()
-        print_line()
         best_guess_index = -1
         for j in range(open_quote_index, next_open_quote_index):
             # heuristic for guessing which line to add close quote to
             if j+1 < len(law) and is_start_of_structure(Structure.PENJELASAN_ANGKA, new_law, j+1):
                 best_guess_index = j
-                print(f"{colored(f'[Line {j}] {new_law[j]}', 'green')}")
-            else:
-                print(f'[Line {j}] {new_law[j]}')
 
-            print_dashed_line()
+        def show_question():
+            print()
+            print()
+            print_line()
+            # numbered from the open quote, so the answer is an offset into the section
+            for j in range(open_quote_index, next_open_quote_index):
+                if j == best_guess_index:
+                    print(f"{colored(f'[Line {j - open_quote_index}] {new_law[j]}', 'green')}")
+                else:
+                    print(f'[Line {j - open_quote_index}] {new_law[j]}')
 
-        pyperclip.copy(new_law[open_quote_index])
-        print('For which line should a close quote be added to the end?')
-        if best_guess_index != -1:
-            print(f'Or {colored("y(es)", "green")} to use the best guess line')
-        user_input = input()
+                print_dashed_line()
+
+            copy_to_clipboard(new_law[open_quote_index])
+            print('For which line should a close quote be added to the end?')
+            if best_guess_index != -1:
+                print(f'Or {colored("y(es)", "green")} to use the best guess line')
+
+        # See insert_perubahan_section_close_quotes
+        section = '\n'.join(new_law[open_quote_index:next_open_quote_index])
+        user_input = ask(
+            'insert_penjelasan_perubahan_section_close_quotes',
+            section,
+            show_question,
+            valid_answers=get_close_quote_answers(
+                open_quote_index,
+                next_open_quote_index,
+                has_best_guess=best_guess_index != -1,
+            ),
+        )
 
         if user_input == 'y':
             if best_guess_index == -1:
@@ -787,11 +1026,19 @@ def insert_penjelasan_perubahan_section_close_quotes(law: List[str]) -> List[str
         elif not user_input.isnumeric():
             raise Exception(f"Invalid input {user_input} - expected a number")
         else:
-            close_quote_index = int(user_input)
-            if close_quote_index < open_quote_index or close_quote_index >= next_open_quote_index:
-                print('This input may be out of bounds. Do you want to proceed?')
-                print_yes_no()
-                user_input = input()
+            close_quote_index = open_quote_index + int(user_input)
+            if close_quote_index >= next_open_quote_index:
+                def show_out_of_bounds_question():
+                    print('This input may be out of bounds. Do you want to proceed?')
+                    print_yes_no()
+
+                user_input = ask(
+                    'insert_penjelasan_perubahan_section_close_quotes_out_of_bounds',
+                    section,
+                    show_out_of_bounds_question,
+                    offset=close_quote_index - open_quote_index,
+                    valid_answers=['y', 'n'],
+                )
                 if user_input == 'y':
                     pass
                 else:
@@ -806,23 +1053,39 @@ def insert_penjelasan_perubahan_section_close_quotes(law: List[str]) -> List[str
 def insert_perubahan_quotes(law: List[str]) -> List[str]:
     print_section_header('INSERT PERUBAHAN SECTION QUOTES...')
 
-    print('Is this UU an UU Perubahan?')
-    print_yes_no()
-    user_input = input()
-    if user_input == 'n':
+    if not is_uu_perubahan():
         return law
+
+    return insert_perubahan_section_quotes(law)
+
+
+def is_uu_perubahan() -> bool:
+    def show_question():
+        print('Is this UU an UU Perubahan?')
+        print_yes_no()
+
+    # The question is about the whole law rather than a line
+    user_input = ask(
+        'insert_perubahan_quotes',
+        '',
+        show_question,
+        valid_answers=['y', 'n'],
+    )
+    if user_input == 'n':
+        return False
     elif user_input != 'y':
         raise Exception(f'Invalid input {user_input}')
 
+    return True
+
+
+def insert_perubahan_section_quotes(law: List[str]) -> List[str]:
     '''
     helper functions MUST be called in this order
     '''
     law = insert_perubahan_section_open_quotes(law)
-    save_law_to_file(law, 'g1.txt')
     law = insert_perubahan_section_close_quotes(law)
-    save_law_to_file(law, 'g2.txt')
     law = insert_penjelasan_perubahan_section_open_quotes(law)
-    save_law_to_file(law, 'g3.txt')
     law = insert_penjelasan_perubahan_section_close_quotes(law)
 
     return law
@@ -830,8 +1093,12 @@ def insert_perubahan_quotes(law: List[str]) -> List[str]:
 
 def clean_squashed_page_numbers(law: List[str]) -> List[str]:
     print_section_header('CLEANING SQUASHED PAGE NUMBER...')
+    return list(iter_clean_squashed_page_numbers(law, len(law)))
 
-    new_law = []
+
+def iter_clean_squashed_page_numbers(law: Iterable[str], approx_len: Optional[int] = None) -> Iterator[str]:
+    """See clean_squashed_page_numbers; approx_len is only shown to the user
+    """
     for idx, line in enumerate(law):
         result = re.split(PAGE_NUMBER_REGEX, line)
 
@@ -840,41 +1107,52 @@ def clean_squashed_page_numbers(law: List[str]) -> List[str]:
              '')  # page number not at end of line
 
         if no_page_numbers:
-            new_law.append(line)
+            yield clean_whitespace(line)
         elif len(result) > 1:
-            print_line()
-            print(f'{idx} / {len(law)}')
-            print(line)
-            print_line()
+            def show_question():
+                print_line()
+                print(format_progress(idx, approx_len))
+                print(line)
+                print_line()
+
+                copy_to_clipboard(line)
+                print('Does this line have a page number squashed onto the end?')
+                print_yes_no()
 
-            pyperclip.copy(line)
-            print('Does this line have a page number squashed onto the end?')
-            print_yes_no()
-            user_input = input()
+            user_input = ask(
+                'clean_squashed_page_numbers',
+                line,
+                show_question,
+                valid_answers=['y', 'n'],
+            )
 
             # user_input = 'y'
             if user_input == 'y':
-                new_law.append(''.join(result[:-2]))
+                yield clean_whitespace(''.join(result[:-2]))
             elif user_input == 'n':
-                new_law.append(line)
+                yield clean_whitespace(line)
             else:
                 raise Exception(f'Input "{user_input}" is invalid')
 
-    new_law = [clean_whitespace(line) for line in new_law]
-
-    return new_law
-
 
 def clean_split_plaintext(law: List[str]) -> List[str]:
     '''
     Stitch together plaintext lines that get separated into 2 lines due to page breaks
     '''
     print_section_header('CLEANING SPLIT PLAINTEXT...')
+    return list(iter_clean_split_plaintext(law, len(law)))
 
-    skip_heuristics: List[Callable[[str, str], bool]] = [
+
+def iter_clean_split_plaintext(law: Iterable[str], approx_len: Optional[int] = None) -> Iterator[str]:
+    '''
+    See clean_split_plaintext. Each line is only compared to the line before it, so we
+    only need to hold on to the previous input line & the output line that the current
+    line may be combined into.
+    '''
+    skip_heuristics: List[Callable[[Line, Line], bool]] = [
         lambda _, curr: curr in ['Mengingat:', 'Mengingat :'],
 
-        lambda _, curr: curr.lower() in [
+        lambda _, curr: curr.lowercase in [
             'dengan persetujuan:',
             'dengan persetujuan',
             'dengan persetujuan bersama',
@@ -882,18 +1160,18 @@ def clean_split_plaintext(law: List[str]) -> List[str]:
         ],
 
         lambda prev, curr:
-            prev.lower() == 'undang-undang ini mulai berlaku pada tanggal diundangkan.' and
-            curr.lower() == 'agar setiap orang mengetahuinya, memerintahkan pengundangan undang-undang ini dengan penempatannya dalam lembaran negara republik indonesia.',
+            prev.lowercase == 'undang-undang ini mulai berlaku pada tanggal diundangkan.' and
+            curr.lowercase == 'agar setiap orang mengetahuinya, memerintahkan pengundangan undang-undang ini dengan penempatannya dalam lembaran negara republik indonesia.',
 
         lambda prev, curr:
-            prev.lower() == 'agar setiap orang mengetahuinya, memerintahkan pengundangan undang-undang ini dengan penempatannya dalam lembaran negara republik indonesia.' and
-            curr.lower() == 'disahkan di jakarta,',
+            prev.lowercase == 'agar setiap orang mengetahuinya, memerintahkan pengundangan undang-undang ini dengan penempatannya dalam lembaran negara republik indonesia.' and
+            curr.lowercase == 'disahkan di jakarta,',
 
         lambda prev, curr:
-            prev.lower() == 'diundangkan di jakarta,' and
+            prev.lowercase == 'diundangkan di jakarta,' and
             re.match(
                 r'^pada tanggal [0-9]+ (januari|februari|maret|april|mei|juni|juli|agustus|september|oktober|november|december) [0-9]{4}$',
-                curr.lower()
+                curr.lowercase
         ) != None,
 
         lambda prev, curr:
@@ -903,8 +1181,11 @@ def clean_split_plaintext(law: List[str]) -> List[str]:
             curr.endswith('.')
     ]
 
-    new_law: List[str] = []
-    for i, line in enumerate(law):
+    # the previous line is kept as a Line, so it doesn't have to be lowercased again
+    # when it's compared to the line after it
+    previous_line = Line('')
+    pending_line: Optional[str] = None
+    for i, line in enumerate(map(Line.of, law)):
         '''
         the line length check is a heuristic to filter out false positives from the
         lowercase check due to list indexes e.g 'e.'
@@ -912,14 +1193,14 @@ def clean_split_plaintext(law: List[str]) -> List[str]:
         The logic below is imprecise; it's just all heuristics & hands off to the user
         to make a decision
         '''
-        really_long = len(law[i]) > 75
-        long_enough = len(law[i]) > 5
-        starts_with_lowercase = law[i][0].islower()
-        starts_with_number = law[i][0].isnumeric()
+        really_long = len(line) > 75
+        long_enough = len(line) > 5
+        starts_with_lowercase = line.starts_with_lowercase
+        starts_with_number = line[0].isnumeric()
 
-        previous_line_long = i > 0 and len(law[i-1]) > 20
-        previous_line_not_all_caps = i > 0 and not law[i-1].isupper()
-        not_all_caps = not law[i].isupper()
+        previous_line_long = i > 0 and len(previous_line) > 20
+        previous_line_not_all_caps = i > 0 and not previous_line.is_all_caps
+        not_all_caps = not line.is_all_caps
 
         is_curr_line_maybe_split_plaintext = really_long or \
             (
@@ -930,62 +1211,72 @@ def clean_split_plaintext(law: List[str]) -> List[str]:
                         previous_line_long and
                         previous_line_not_all_caps and
                         not_all_caps and
-                        not is_start_of_pasal(law, i) and
-                        not is_start_of_perubahan_pasal(law, i) and
-                        not is_start_of_penjelasan_list_index_str(law[i]) and
-                        not is_start_of_bagian(law, i) and
-                        not is_start_of_paragraf(law, i)
+                        not is_start_of_pasal([line], 0) and
+                        not is_start_of_perubahan_pasal([line], 0) and
+                        not is_start_of_penjelasan_list_index_str(line) and
+                        not is_start_of_bagian([line], 0) and
+                        not is_start_of_paragraf([line], 0)
                     )
                 )
             )
 
-        is_prev_line_maybe_split_plaintext = i > 0 and len(law[i-1]) > 10
+        is_prev_line_maybe_split_plaintext = i > 0 and len(previous_line) > 10
 
         does_not_match_heuristics = True
         if i > 0:
             does_not_match_heuristics = not any(
-                [is_match(law[i-1], line) for is_match in skip_heuristics]
+                [is_match(previous_line, line) for is_match in skip_heuristics]
             )
 
+        should_combine = False
         if is_curr_line_maybe_split_plaintext and \
                 is_prev_line_maybe_split_plaintext and \
                 does_not_match_heuristics:
 
-            print('---------------------------------')
-            print(f'{i} / {len(law)}')
-            print(f'{law[i-1]}')
-            print('- - - - - - - - - - - - - - - - -')
-            print(f'{law[i]}')
-            print('---------------------------------')
+            def show_question():
+                print('---------------------------------')
+                print(format_progress(i, approx_len))
+                print(f'{previous_line}')
+                print('- - - - - - - - - - - - - - - - -')
+                print(f'{line}')
+                print('---------------------------------')
 
-            pyperclip.copy(law[i])
-            print("Combine lines into one?")
-            print_yes_no()
-            user_input = input()
+                copy_to_clipboard(line)
+                print("Combine lines into one?")
+                print_yes_no()
 
-            if user_input.lower() == 'y':
-                new_law[-1] += (' '+line)
-            else:
-                new_law.append(line)
+            user_input = ask(
+                'clean_split_plaintext',
+                f'{previous_line}\n{line}',
+                show_question,
+            )
+
+            should_combine = user_input.lower() == 'y'
+
+        if should_combine and pending_line is not None:
+            pending_line += (' '+line)
         else:
-            new_law.append(line)
+            if pending_line is not None:
+                yield pending_line
+            pending_line = line
 
-    return new_law
+        previous_line = line
+
+    if pending_line is not None:
+        yield pending_line
 
 
 def clean_maybe_list_items(law: List[str]) -> List[str]:
     print_section_header('CLEANING MAYBE LIST ITEMS...')
+    return list(iter_clean_maybe_list_items(law, len(law)))
 
-    approx_len = len(law)
-    new_law = []
-    for idx, line in enumerate(law):
-        list_item = clean_maybe_list_item(line, approx_len, idx)
-        new_law.extend(list_item)
 
-    return new_law
+def iter_clean_maybe_list_items(law: Iterable[str], approx_len: Optional[int] = None) -> Iterator[str]:
+    for idx, line in enumerate(law):
+        yield from clean_maybe_list_item(line, approx_len, idx)
 
 
-def clean_maybe_list_item(line: str, approx_len: int, approx_index: int) -> List[str]:
+def clean_maybe_list_item(line: str, approx_len: Optional[int], approx_index: int) -> List[str]:
     """There are 2 transformations that we apply to clean lines that may have list items
     in the form that the parsing algorithm receives as a .txt
 
@@ -1016,7 +1307,8 @@ def clean_maybe_list_item(line: str, approx_len: int, approx_index: int) -> List
 
         approx_len: approximate no. of lines in law; used only for UI display to the user
         to show how far from the end of the law they are; the length is approximate
-        because this function itself will change the no. of lines in the law
+        because this function itself will change the no. of lines in the law. None if
+        the no. of lines isn't known e.g the law is being cleaned as a stream
 
         approx_idx: approximate line # currently being worked on; see approx_len
 
@@ -1026,29 +1318,74 @@ def clean_maybe_list_item(line: str, approx_len: int, approx_index: int) -> List
 
     Examples:
     """
-    line_split = line.split()
-    if is_start_of_list_index_str(line_split[0]) or \
-            is_start_of_unordered_list_index_str(line_split[0]):
-        return [
-            line_split[0].strip(),
-            *clean_maybe_list_item(' '.join(line_split[1:]), approx_len, approx_index)
-        ]
+    # a loop rather than recursing on what's left of the line after each split, since a
+    # long squashed line can be split many times
+    lines = []
+    line = Line.of(line)
+    while True:
+        line_split = line.tokens
+        if parse_list_index_str(line_split[0]) is not None or \
+                is_start_of_unordered_list_index_str(line_split[0]):
+            lines.append(line_split[0].strip())
+            line = Line.from_tokens(line_split[1:])
+            continue
+
+        start_index = get_squashed_list_item(line, approx_len, approx_index)
+        if start_index != None:
+            lines.append(line[:start_index-1].strip())
+            line = Line(line[start_index:])
+            continue
+
+        lines.append(line.strip())
+        return lines
+
+
+def compile_squashed_pattern(start_regexes: List[str]) -> Pattern:
+    """Combines LINE_ENDING_REGEXES & start_regexes into 1 regex that matches any line
+    ending followed by any start regex (e.g '; ' followed by '3.'), so the earliest
+    squashed structure in a line is found in a single scan instead of 1 re.search per
+    (line ending, start regex) pair.
+
+    The alternatives are tried in the same order the pairs used to be searched in (line
+    ending first, then start regex), so if several pairs match at the same index the
+    1st pair still wins. The start regex is captured in the group named 'start'.
+    """
+    line_ending_regex = '|'.join(remove_group_names(regex) for regex in LINE_ENDING_REGEXES)
+    start_regex = '|'.join(remove_group_names(regex) for regex in start_regexes)
+    return re.compile(
+        group(line_ending_regex, 'line_ending') + r'\s+' + group(start_regex, 'start'))
+
+
+def find_squashed_start(pattern: Pattern, line: str) -> Optional[int]:
+    """Returns the index at which the earliest squashed structure matched by pattern
+    (see compile_squashed_pattern) starts in line, or None if there isn't one
+
+    Examples:
+        >>> find_squashed_start(SQUASHED_LIST_ITEM_PATTERN, 'nasi goreng; 3. bakmie ayam;')
+        13
+    """
+    match = pattern.search(line)
+    if match is None:
+        return None
+
+    return match.start('start')
 
-    start_index = get_squashed_list_item(line, approx_len, approx_index)
-    if start_index != None:
-        return [
-            line[:start_index-1].strip(),
-            *clean_maybe_list_item(
-                line[start_index:],
-                approx_len,
-                approx_index
-            ),
-        ]
 
-    return [line.strip()]
+SQUASHED_LIST_ITEM_START_REGEXES = [
+    r'\u2212 ',
+    r'- ',
+    *[str(definition['regex']) for definition in LIST_INDEX_DEFINITIONS.values()],
+]
+SQUASHED_LIST_ITEM_PATTERN = compile_squashed_pattern(SQUASHED_LIST_ITEM_START_REGEXES)
+
+
+def find_squashed_list_item_start(line: str) -> Optional[int]:
+    """See get_squashed_list_item; doesn't ask the user whether to split the line
+    """
+    return find_squashed_start(SQUASHED_LIST_ITEM_PATTERN, line)
 
 
-def get_squashed_list_item(line: str, approx_len: int, approx_index: int):
+def get_squashed_list_item(line: str, approx_len: Optional[int], approx_index: int):
     '''
     Find if line contains a squashed list item.
 
@@ -1064,54 +1401,14 @@ def get_squashed_list_item(line: str, approx_len: int, approx_index: int):
         >>> get_squashed_list_item('nasi goreng; 3. bakmie ayam;')
         13
     '''
-    list_index_regexes = [
-        group(r'\u2212 ', 'full'),
-        group(r'- ', 'full'),
-    ]
-    for definition in LIST_INDEX_DEFINITIONS.values():
-        regex = definition['regex']
-        assert isinstance(regex, str)
-
-        list_index_regexes.append(regex)
-
-    regexes: List[str] = []
-    for i in LINE_ENDING_REGEXES:
-        for j in list_index_regexes:
-            regexes.append(i + r'\s+' + j)
-
     '''
     There may be multiple squashed list items on a single line; we want to identify
     the squashed list item that comes first. See parser_test for more details.
     '''
-    earliest_match = None
-    for regex in regexes:
-        match = re.search(regex, line)
-        if match is None:
-            continue
-
-        if (earliest_match is None) or match.start(0) < earliest_match.start(0):
-            earliest_match = match
-
-    if earliest_match is None:
+    start_of_squashed_list_item_idx = find_squashed_list_item_start(line)
+    if start_of_squashed_list_item_idx is None:
         return None
 
-    if 'full' not in earliest_match.groupdict():
-        print_line()
-        print(f'Cannot find start of list index in string "{line}"')
-        print_line()
-        print('Treat this as a single line?')
-        print()
-        print_yes_no()
-        user_input = input()
-
-        if user_input == 'y':
-            return None
-        else:
-            raise Exception(
-                f'Cannot find start of list index in string "{line}"')
-
-    start_of_squashed_list_item_idx = earliest_match.start('full')
-
     previous_line = line[:start_of_squashed_list_item_idx-1].strip()
     current_line = line[start_of_squashed_list_item_idx:]
 
@@ -1127,17 +1424,24 @@ def get_squashed_list_item(line: str, approx_len: int, approx_index: int):
     if any([is_match(previous_line, current_line) for is_match in skip_heuristics]):
         return None
 
-    print_line()
-    print(f'{approx_index} / {approx_len}')
-    print(f'{previous_line}')
-    print_dashed_line()
-    print(f'{current_line}')
-    print_line()
+    def show_question():
+        print_line()
+        print(format_progress(approx_index, approx_len))
+        print(f'{previous_line}')
+        print_dashed_line()
+        print(f'{current_line}')
+        print_line()
 
-    pyperclip.copy(line[start_of_squashed_list_item_idx:])
-    print('Split line?')
-    print_yes_no()
-    user_input = input()
+        copy_to_clipboard(line[start_of_squashed_list_item_idx:])
+        print('Split line?')
+        print_yes_no()
+
+    user_input = ask(
+        'get_squashed_list_item',
+        line,
+        show_question,
+        offset=start_of_squashed_list_item_idx,
+    )
 
     # user_input = 'y'
     if user_input == 'y':
@@ -1148,92 +1452,92 @@ def get_squashed_list_item(line: str, approx_len: int, approx_index: int):
 
 def clean_maybe_squashed_headings(law: List[str]) -> List[str]:
     print_section_header('CLEANING MAYBE SQUASHED HEADINGS...')
+    return list(iter_clean_maybe_squashed_headings(law, len(law)))
 
+
+def iter_clean_maybe_squashed_headings(law: Iterable[str], approx_len: Optional[int] = None) -> Iterator[str]:
     skip_heuristics = [
         'II. PASAL DEMI PASAL'
     ]
 
-    approx_len = len(law)
-    new_law = []
     for index, line in enumerate(law):
         if line in skip_heuristics:
-            new_law.append(line)
+            yield line
         else:
-            list_item = clean_maybe_squashed_heading(line, approx_len, index)
-            new_law.extend(list_item)
-
-    return new_law
+            yield from clean_maybe_squashed_heading(line, approx_len, index)
 
 
-def clean_maybe_squashed_heading(line: str, approx_len: int, approx_index: int) -> List[str]:
+def clean_maybe_squashed_heading(line: str, approx_len: Optional[int], approx_index: int) -> List[str]:
+    lines = []
     start_index = get_squashed_heading(line, approx_len, approx_index)
-    if start_index != None:
-        return [
-            line[:start_index-1].strip(),
-            *clean_maybe_squashed_heading(
-                line[start_index:],
-                approx_len,
-                approx_index
-            ),
-        ]
+    while start_index != None:
+        assert start_index is not None  # mypy type hint
+        lines.append(line[:start_index-1].strip())
+        line = line[start_index:]
+        start_index = get_squashed_heading(line, approx_len, approx_index)
 
-    return [line.strip()]
+    lines.append(line.strip())
+    return lines
 
 
-def get_squashed_heading(line: str, approx_len: int, approx_index: int):
-    heading_regex = [
-        PASAL_NUMBER_REGEX,
-        PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
-        BAB_NUMBER_REGEX,
-        BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
-        BAGIAN_NUMBER_REGEX,
-        BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
-        PENJELASAN_PASAL_DEMI_PASAL_REGEX,
-        *PENJELASAN_LIST_INDEX_REGEXES,
-    ]
+SQUASHED_HEADING_START_REGEXES = [
+    PASAL_NUMBER_REGEX,
+    PASAL_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    BAB_NUMBER_REGEX,
+    BAB_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    BAGIAN_NUMBER_REGEX,
+    BAGIAN_NUMBER_WITH_OPEN_QUOTE_CHAR_REGEX,
+    PENJELASAN_PASAL_DEMI_PASAL_REGEX,
+    *PENJELASAN_LIST_INDEX_REGEXES,
+]
+SQUASHED_HEADING_PATTERN = compile_squashed_pattern(SQUASHED_HEADING_START_REGEXES)
+# the rest of the line after a squashed heading must be just the heading
+SQUASHED_HEADING_REST_OF_LINE_PATTERN = compile_heading('(' + '|'.join([
+    '(' + remove_group_names(regex) + ')' for regex in SQUASHED_HEADING_START_REGEXES
+]) + ')')
+
+
+def find_squashed_heading_start(line: str) -> Optional[int]:
+    """See get_squashed_heading; doesn't ask the user whether to split the line
+    """
+    return find_squashed_start(SQUASHED_HEADING_PATTERN, line)
 
-    regexes = []
-    for i in LINE_ENDING_REGEXES:
-        for j in heading_regex:
-            regexes.append(i + r'\s+' + j)
 
+def get_squashed_heading(line: str, approx_len: Optional[int], approx_index: int):
     '''
     There may be multiple squashed headings on a single line; we want to identify
     the squashed heading that comes first.
     '''
-    earliest_match = None
-    for regex in regexes:
-        match = re.search(regex, line)
-        if match is None:
-            continue
-
-        if (earliest_match is None) or match.start(0) < earliest_match.start(0):
-            earliest_match = match
-
-    if earliest_match is None:
+    start_of_squashed_heading_idx = find_squashed_heading_start(line)
+    if start_of_squashed_heading_idx is None:
         return None
 
-    start_of_squashed_heading_idx = earliest_match.start(2)
-
     rest_of_line = line[start_of_squashed_heading_idx:]
 
     if len(rest_of_line) > 200:
         return None
 
-    if not any([is_heading(regex, rest_of_line) for regex in heading_regex]):
+    if not is_heading(SQUASHED_HEADING_REST_OF_LINE_PATTERN, rest_of_line):
         return None
 
-    print_line()
-    print(f'{approx_index} / {approx_len}')
-    print(f"{line[:start_of_squashed_heading_idx-1].strip()}")
-    print_dashed_line()
-    print(f"{line[start_of_squashed_heading_idx:]}")
-    print_line()
+    def show_question():
+        print_line()
+        print(format_progress(approx_index, approx_len))
+        print(f"{line[:start_of_squashed_heading_idx-1].strip()}")
+        print_dashed_line()
+        print(f"{line[start_of_squashed_heading_idx:]}")
+        print_line()
 
-    pyperclip.copy(line[start_of_squashed_heading_idx:])
-    print('Split line?')
-    print_yes_no()
-    user_input = input()
+        copy_to_clipboard(line[start_of_squashed_heading_idx:])
+        print('Split line?')
+        print_yes_no()
+
+    user_input = ask(
+        'get_squashed_heading',
+        line,
+        show_question,
+        offset=start_of_squashed_heading_idx,
+    )
 
     # user_input = 'n'
     if user_input == 'y':
@@ -1264,55 +1568,285 @@ Below are lines {i} and the lines right before & after
     ''')
 
 
+class TermLinker:
+    '''
+    Finds the terms defined in a law's ketentuan umum in a string & wraps them in ${...},
+    so the web app can link them to their definition. All the terms are matched in a
+    single scan of the string using an Aho-Corasick automaton, rather than searching
+    for each term in turn.
+
+    Terms are matched case-insensitively & only as whole words. Where matches overlap,
+    the leftmost is used, and the longest of those starting at the same place e.g
+    assume "Lorem ipsum" and "ipsum" exist in the dictionary
+
+    "Lorem ipsum dolor sit amet" -> "${Lorem ipsum} dolor sit amet"
+    "Ipsum dolor sit amet" -> "${Ipsum} dolor sit amet"
+    "Lorem ipsum ipsum lorem" -> "${Lorem ipsum} ${ipsum} lorem"
+
+    Text that is already wrapped in ${...} is left as is.
+    '''
+
+    def __init__(self, terms: List[str]):
+        # goto[state][char] is the state after reading char in state; state 0 is the root
+        self.goto: List[Dict[str, int]] = [{}]
+        # fail[state] is the state for the longest proper suffix of state that is a prefix of some term
+        self.fail: List[int] = [0]
+        # lengths of the terms that end at each state
+        self.outputs: List[List[int]] = [[]]
+
+        for term in set(term.upper() for term in terms):
+            if len(term) == 0:
+                continue
+
+            state = 0
+            for char in term:
+                if char not in self.goto[state]:
+                    self.goto.append({})
+                    self.fail.append(0)
+                    self.outputs.append([])
+                    self.goto[state][char] = len(self.goto) - 1
+                state = self.goto[state][char]
+            self.outputs[state].append(len(term))
+
+        # Breadth-first, so a state's fail state is always done before the state itself
+        queue = list(self.goto[0].values())
+        for state in queue:
+            for char, next_state in self.goto[state].items():
+                fail_state = self.fail[state]
+                while fail_state != 0 and char not in self.goto[fail_state]:
+                    fail_state = self.fail[fail_state]
+                self.fail[next_state] = self.goto[fail_state].get(char, 0)
+                self.outputs[next_state] = self.outputs[next_state] + \
+                    self.outputs[self.fail[next_state]]
+                queue.append(next_state)
+
+    def is_empty(self) -> bool:
+        return len(self.goto[0]) == 0
+
+    def find_terms(self, text: str) -> List[Tuple[int, int]]:
+        '''
+        Returns the (start, end) index of each term to link in text, in order
+        '''
+        candidates: List[Tuple[int, int]] = []
+
+        state = 0
+        i = 0
+        while i < len(text):
+            # skip over terms that are already linked
+            if text.startswith('${', i):
+                end_of_link = text.find('}', i)
+                if end_of_link != -1:
+                    state = 0
+                    i = end_of_link + 1
+                    continue
+
+            char = text[i].upper()
+            # e.g 'ß'.upper() == 'SS'; no term can match it
+            if len(char) != 1:
+                char = text[i]
+
+            while state != 0 and char not in self.goto[state]:
+                state = self.fail[state]
+            state = self.goto[state].get(char, 0)
+
+            for length in self.outputs[state]:
+                start = i + 1 - length
+                if is_word_part_of_text(text, text[start:i+1], start):
+                    candidates.append((start, i + 1))
+
+            i += 1
+
+        # leftmost first, then longest first
+        candidates.sort(key=lambda candidate: (candidate[0], -candidate[1]))
+
+        terms: List[Tuple[int, int]] = []
+        for start, end in candidates:
+            if len(terms) == 0 or start >= terms[-1][1]:
+                terms.append((start, end))
+
+        return terms
+
+    def link(self, text: str) -> str:
+        if self.is_empty():
+            return text
+
+        linked_text: List[str] = []
+        previous_end = 0
+        for start, end in self.find_terms(text):
+            linked_text.append(text[previous_end:start])
+            linked_text.append(f'${{{text[start:end]}}}')
+            previous_end = end
+        linked_text.append(text[previous_end:])
+
+        return ''.join(linked_text)
+
+
+def link_ketentuan_umum(node: PrimitiveNode, term_linker: TermLinker) -> None:
+    """Links the terms defined in the law's ketentuan umum in a PLAINTEXT node's text
+    (see TermLinker), unless the node is in Pasal 1 where the terms are defined
+    """
+    if term_linker.is_empty():
+        return
+
+    if node.type == Structure.PLAINTEXT and get_parent_node(node, Structure.BAB) is not None:
+        pasal_node = get_parent_node(node, Structure.PASAL)
+        is_definition = get_id(pasal_node) == 'pasal-1'
+
+        if not is_definition:
+            node.text = term_linker.link(node.text)
+
+
+def get_ketentuan_umum_list(metadata: Dict[str, Any]) -> List[str]:
+    """Returns the terms defined in the law's ketentuan umum, longest first so that
+    e.g 'Pemerintah Daerah' is linked before 'Pemerintah'
+    """
+    if 'ketentuan_umum' not in metadata:
+        return []
+
+    return sorted(metadata['ketentuan_umum'].keys(), key=lambda x: len(x), reverse=True)
+
+
 def convert_tree_to_json(node: Union[ComplexNode, PrimitiveNode], ketentuan_umum_list: List[str]) -> Dict[str, Any]:
-    if isinstance(node, PrimitiveNode):
-        if get_parent_node(node, Structure.BAB) is not None and node.type == Structure.PLAINTEXT:
-            for title in ketentuan_umum_list:
-                index = node.text.upper().find(title)
-
-                pasal_node = get_parent_node(node, Structure.PASAL)
-                is_definition = get_id(pasal_node) == 'pasal-1'
-
-                if is_word_part_of_text(node.text, title, index) and not is_definition:
-                    text = node.text[index:index+len(title)]
-                    '''
-                    Determine if the word is actually a part of a bigger definition,
-                        and if such case happens, opt for the longer word
-
-                    Ex:
-                    assume "Lorem ipsum" and "ipsum" exist in the dictionary
-
-                    "Lorem ipsum dolor sit amet" -> "${Lorem ipsum} dolor sit amet"
-                    "Ipsum dolor sit amet" -> "${Ipsum} dolor sit amet"
-                    "Lorem ipsum ipsum lorem" -> "${Lorem ipsum} ${ipsum} lorem"
-                    '''
-                    match = re.findall(
-                        r'\$\{[^\}]*' + text + '[^\$]*\}', node.text)
-                    is_part_of_other_definition = len(match) > 0
-
-                    if not is_part_of_other_definition:
-                        node.text = node.text.replace(text, f'${{{text}}}')
-
-        return {
-            'type': node.type.value,
-            'text': node.text,
-        }
+    '''
+    Converts the tree rooted at node into nested dicts. The tree is walked with an
+    explicit stack rather than recursively, since laws can nest deeply enough to hit
+    Python's recursion limit.
+    '''
+    term_linker = TermLinker(ketentuan_umum_list)
+
+    def convert_node(node: Union[ComplexNode, PrimitiveNode]) -> Dict[str, Any]:
+        if isinstance(node, PrimitiveNode):
+            link_ketentuan_umum(node, term_linker)
+            return {
+                'type': node.type.value,
+                'text': node.text,
+            }
+        else:
+            return {
+                'type': node.type.value,
+                'id': get_id(node),
+                'children': [],
+            }
+
+    root_json = convert_node(node)
+    stack = [(node, root_json)]
+    while len(stack) > 0:
+        complex_node, complex_node_json = stack.pop()
+        if not isinstance(complex_node, ComplexNode):
+            continue
+
+        for child in complex_node.children:
+            child_json = convert_node(child)
+            complex_node_json['children'].append(child_json)
+            stack.append((child, child_json))
+
+    return root_json
+
+
+'''
+The JSON written by write_law_json is flushed to the file in chunks of this many characters
+'''
+JSON_WRITE_BUFFER_SIZE = 1 << 16
+
+'''
+Shorter names for the keys repeated in every node of the law tree, used when writing
+laws with short_keys=True. Metadata keys are left as is.
+'''
+JSON_SHORT_KEYS: Dict[str, str] = {
+    'type': 't',
+    'id': 'i',
+    'children': 'c',
+    'text': 'x',
+}
+
+
+def write_law_json(
+    outfile: TextIO,
+    metadata: Dict[str, Any],
+    root: ComplexNode,
+    ketentuan_umum_list: List[str],
+    compact: bool = False,
+    short_keys: bool = False,
+) -> None:
+    '''
+    Writes {'metadata': metadata, 'content': convert_tree_to_json(root, ketentuan_umum_list)}
+    to outfile, byte-for-byte the same as json.dump(..., indent=2), but without building
+    the nested dicts or the whole JSON string in memory. The tree is walked with an
+    explicit stack & each node's JSON is written as soon as it's reached.
+
+    If compact is True, the output is minified i.e the same as
+    json.dump(..., separators=(',', ':')). If short_keys is True, the keys of each node
+    are renamed according to JSON_SHORT_KEYS.
+    '''
+    term_linker = TermLinker(ketentuan_umum_list)
+    buffer: List[str] = []
+    buffer_size = 0
+
+    def write(string: str):
+        nonlocal buffer_size
+        buffer.append(string)
+        buffer_size += len(string)
+        if buffer_size >= JSON_WRITE_BUFFER_SIZE:
+            outfile.write(''.join(buffer))
+            buffer.clear()
+            buffer_size = 0
+
+    def indent(level: int) -> str:
+        return '' if compact else '\n' + '  ' * level
+
+    def key(name: str) -> str:
+        return '"' + (JSON_SHORT_KEYS[name] if short_keys else name) + ('":' if compact else '": ')
+
+    # Every line of the metadata's JSON after the 1st needs to be indented 1 level
+    write('{' + indent(1) + ('"metadata":' if compact else '"metadata": '))
+    if compact:
+        write(json.dumps(metadata, separators=(',', ':')))
     else:
-        return {
-            'type': node.type.value,
-            'id': get_id(node),
-            'children': [convert_tree_to_json(child, ketentuan_umum_list) for child in node.children],
-        }
+        write(json.dumps(metadata, indent=2).replace('\n', indent(1)))
+    write(',' + indent(1) + ('"content":' if compact else '"content": '))
 
+    '''
+    Each item in the stack is either a string to write, or a node to write
+    (along with its indentation level)
+    '''
+    stack: List[Union[str, Tuple[Union[ComplexNode, PrimitiveNode], int]]] = [(root, 1)]
+    while len(stack) > 0:
+        item = stack.pop()
+        if isinstance(item, str):
+            write(item)
+            continue
 
-def get_parent_node(node: Union[ComplexNode, PrimitiveNode], structure: Structure):
-    if node.parent:
-        if node.parent.type == structure:
-            return node.parent
+        node, level = item
+        write('{' + indent(level + 1) + key('type') + json.dumps(node.type.value) + ',')
+        if isinstance(node, PrimitiveNode):
+            link_ketentuan_umum(node, term_linker)
+            write(indent(level + 1) + key('text') +
+                  json.dumps(node.text) + indent(level) + '}')
+            continue
 
-        return get_parent_node(node.parent, structure)
+        write(indent(level + 1) + key('id') + json.dumps(get_id(node)) + ',')
+        write(indent(level + 1) + key('children'))
+        if len(node.children) == 0:
+            write('[]' + indent(level) + '}')
+            continue
 
-    return None
+        write('[')
+        stack.append(indent(level + 1) + ']' + indent(level) + '}')
+        for i in reversed(range(len(node.children))):
+            if i != len(node.children) - 1:
+                stack.append(',')
+            stack.append((node.children[i], level + 2))
+            stack.append(indent(level + 2))
+
+    write(indent(0) + '}')
+    outfile.write(''.join(buffer))
+
+
+def get_parent_node(node: Union[ComplexNode, PrimitiveNode], structure: Structure):
+    if node.parent is None:
+        return None
+
+    return node.parent.get_ancestor(structure)
 
 
 def is_word_part_of_text(string: str, substring: str, start_index) -> bool:
@@ -1616,22 +2150,28 @@ def get_id(node: ComplexNode) -> str:
 
 
 def gen_plaintext_in_list_item_scenario_from_user(law: List[str], i: int) -> PlaintextInListItemScenario:
-    print_line()
-    print(f'{law[i-2]}')
-    print_dashed_line()
-    print(f'{law[i-1]}')
-    print_line()
-    print()
-    print(f'{law[i]}')
-    print_line()
-
-    pyperclip.copy(law[i])
-    print('This line is the 3rd line of a LIST_INDEX. Is it:')
-    print('- a sibling of the LIST this LIST_ITEM is in? (s)')
-    print('- a PLAINTEXT child of the LIST ITEM? (c)')
-    print('- a FORMATTED_MATH_ROW child of the LIST ITEM? (cm)')
-
-    user_input = input()
+    def show_question():
+        print_line()
+        print(f'{law[i-2]}')
+        print_dashed_line()
+        print(f'{law[i-1]}')
+        print_line()
+        print()
+        print(f'{law[i]}')
+        print_line()
+
+        copy_to_clipboard(law[i])
+        print('This line is the 3rd line of a LIST_INDEX. Is it:')
+        print('- a sibling of the LIST this LIST_ITEM is in? (s)')
+        print('- a PLAINTEXT child of the LIST ITEM? (c)')
+        print('- a FORMATTED_MATH_ROW child of the LIST ITEM? (cm)')
+
+    user_input = ask(
+        'gen_plaintext_in_list_item_scenario_from_user',
+        f'{law[i-2]}\n{law[i-1]}\n{law[i]}',
+        show_question,
+        valid_answers=['s', 'c', 'cm', 'S', 'C', 'CM', 'Cm', 'cM'],
+    )
 
     user_input = user_input.lower()
     if user_input == 's':
@@ -1648,13 +2188,7 @@ def is_x_an_ancestor(
     node: Union[ComplexNode, PrimitiveNode],
     ancestor_structure: Structure
 ):
-    if node.parent is not None:
-        if node.parent.type == ancestor_structure:
-            return True
-        else:
-            return is_x_an_ancestor(node.parent, ancestor_structure)
-
-    return False
+    return get_parent_node(node, ancestor_structure) is not None
 
 
 def get_perubahan_section_end_index(
@@ -1700,68 +2234,96 @@ def clean_perubahan_section_quotes(perubahan_section_node: ComplexNode):
 
 def save_law_to_file(law: List[str], filename: str):
     with open(filename, 'w') as outfile:
-        txt_law = []
-        for i, line in enumerate(law):
-            if i < len(law) - 1:
-                txt_law.append(f'{line}\n')
-            else:
-                txt_law.append(f'{line}')
-        outfile.writelines(txt_law)
+        write_law_lines(law, outfile)
+
+
+def write_law_lines(law: Iterable[str], outfile: TextIO):
+    """Writes the lines of law to outfile separated by newlines (so no newline after the
+    last line), as they're read from law rather than all at once
+    """
+    for i, line in enumerate(law):
+        if i > 0:
+            outfile.write('\n')
+        outfile.write(line)
 
 
 def clean_whitespace(l):
     return ' '.join(l.split())
 
 
+def format_progress(index: int, approx_len: Optional[int]) -> str:
+    """e.g '12 / 340', or just '12' if the no. of lines isn't known
+    """
+    if approx_len is None:
+        return f'{index}'
+    return f'{index} / {approx_len}'
+
+
 def clean_split_lines_between_pages(law: List[str]) -> List[str]:
-    new_law: List[str] = []
-    i = 0
+    return list(iter_clean_split_lines_between_pages(law))
 
-    while i < len(law):
-        if i >= len(law)-3:
-            new_law.append(law[i])
-            i += 1
+
+def iter_clean_split_lines_between_pages(law: Iterable[str]) -> Iterator[str]:
+    '''
+    A line split by a page break is followed by the page number & the website of the
+    next page, so we only ever need to look at the next 4 lines
+    '''
+    window: Deque[str] = deque()
+
+    for line in map(Line.of, law):
+        window.append(line)
+        if len(window) < 4:
+            continue
+
+        if is_split_line_between_pages(window[0], window[1], window[2], window[3]):
+            yield clean_whitespace(f"{window[0]} {window[3]}")
+
+            # print_line()
+            # print(window[0])
+            # print_dashed_line()
+            # print(window[3])
+            # print_line()
+            # print()
+            # pyperclip.copy(window[0])
+
+            window.clear()
         else:
-            '''
-            Currently, the heuristic chosen is fairly conservative (i.e there are known
-            false negatives) since it needs to be 100% reliable to be automated
-            '''
-            before_break_words = law[i].split()
-            after_break_words = law[i+3].split()
-
-            if (
-                is_page_number(law[i+1]) and
-                law[i+2] == "www.hukumonline.com" and
-                len(before_break_words) >= 5 and
-                (
-                    before_break_words[0].istitle() or
-                    is_start_of_list_index_str(before_break_words[0])
-                ) and
-                before_break_words[-1].islower() and
-                before_break_words[-1].isalpha() and
-                len(after_break_words) >= 2 and
-                not(is_start_of_list_index_str(after_break_words[0])) and
-                after_break_words[0].islower() and
-                after_break_words[-1].islower() and
-                after_break_words[-1][-1] in ['.', ':', ';']
-            ):
-                new_law.append(clean_whitespace(f"{law[i]} {law[i+3]}"))
-
-                # print_line()
-                # print(law[i])
-                # print_dashed_line()
-                # print(law[i+3])
-                # print_line()
-                # print()
-                # pyperclip.copy(law[i])
-
-                i += 4
+            yield window.popleft()
 
-            else:
-                new_law.append(law[i])
-                i += 1
+    yield from window
 
-    return new_law
+
+def is_split_line_between_pages(
+    before_break: str,
+    page_number: str,
+    website: str,
+    after_break: str,
+) -> bool:
+    '''
+    Currently, the heuristic chosen is fairly conservative (i.e there are known
+    false negatives) since it needs to be 100% reliable to be automated
+    '''
+    if not is_page_number(page_number) or website != "www.hukumonline.com":
+        return False
+
+    # the lines are only split into words if there's a page break between them
+    before_break = Line.of(before_break)
+    after_break = Line.of(after_break)
+
+    return (
+        len(before_break.tokens) >= 5 and
+        (
+            before_break.first_token.istitle() or
+            parse_list_index_str(before_break.first_token) is not None
+        ) and
+        before_break.last_token.islower() and
+        before_break.last_token.isalpha() and
+        len(after_break.tokens) >= 2 and
+        parse_list_index_str(after_break.first_token) is None and
+        after_break.first_token.islower() and
+        after_break.last_token.islower() and
+        after_break.trailing_punctuation in ['.', ':', ';']
+    )
 
 
 def is_page_number(line):